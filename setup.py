@@ -152,7 +152,12 @@ setup(
     entry_points={'console_scripts': [
         'wft4galaxy = wft4galaxy.app.runner:main',
         'wft4galaxy-wizard = wft4galaxy.app.wizard:main',
-        'wft4galaxy-docker = wft4galaxy.app.docker_runner:main'
+        'wft4galaxy-docker = wft4galaxy.app.docker_runner:main',
+        'wft4galaxy-bench = wft4galaxy.app.bench:main',
+        'wft4galaxy-stats = wft4galaxy.app.stats:main',
+        'wft4galaxy-merge-reports = wft4galaxy.app.merge_reports:main',
+        'wft4galaxy-cleanup = wft4galaxy.app.cleanup:main',
+        'wft4galaxy-attach = wft4galaxy.app.attach:main'
     ]},
     cmdclass={
         "build_py": BuildCommand,
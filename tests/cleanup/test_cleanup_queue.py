@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance, cleanup_leftovers, load_cleanup_leftovers, CleanupQueue
+from wft4galaxy.mock_galaxy import MockGalaxy
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestCleanupQueue(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.leftovers = os.path.join(self.folder, "leftovers.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _galaxy_instance(self, galaxy):
+        gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+        gi.cleanup_queue.leftovers_filename = self.leftovers
+        gi.cleanup_queue.batch_size = 3
+        return gi
+
+    def test_delete(self):
+        with MockGalaxy() as galaxy:
+            gi = self._galaxy_instance(galaxy)
+            histories = [gi.histories.create("test{0}".format(i)) for i in range(5)]
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            for h in histories:
+                gi.cleanup_queue.delete_history(h.id, purge=True)
+            gi.cleanup_queue.delete_workflow(workflow.id)
+            self.assertEqual(gi.cleanup_queue.drain(), [])
+            self.assertEqual(gi.cleanup_queue.pending, 0)
+            self.assertTrue(all(gi.gi.histories.show_history(h.id)["purged"] for h in histories))
+            self.assertEqual(gi.gi.workflows.get_workflows(), [])
+            self.assertFalse(os.path.exists(self.leftovers))
+
+    def test_shared_queue(self):
+        with MockGalaxy() as galaxy:
+            gi1 = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            gi2 = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            self.assertIs(gi1.cleanup_queue, gi2.cleanup_queue)
+            self.assertIsNot(gi1.cleanup_queue, get_galaxy_instance(galaxy.url, "other-key").cleanup_queue)
+
+    def test_drain_timeout(self):
+        deleting = threading.Event()
+        resume = threading.Event()
+
+        def delete(history_id, purge=False):
+            deleting.set()
+            resume.wait()
+
+        galaxy_instance = _Object(histories=_Object(delete=delete), gi=_Object(base_url="http://galaxy"))
+        queue = CleanupQueue(galaxy_instance, workers=1, batch_size=1, leftovers_filename=self.leftovers)
+        queue.delete_history("running")
+        self.assertTrue(deleting.wait(5))
+        queue.delete_history("pending")
+        try:
+            # only the deletion not started yet is recorded: the running one is left to the worker
+            self.assertEqual([item["id"] for item in queue.drain(timeout=0.1)], ["pending"])
+            self.assertEqual([item["id"] for item in load_cleanup_leftovers(self.leftovers)], ["pending"])
+        finally:
+            resume.set()
+        self.assertEqual(queue.drain(timeout=5), [])
+
+    def test_leftovers(self):
+        with MockGalaxy() as galaxy:
+            gi = self._galaxy_instance(galaxy)
+            history = gi.histories.create("test")
+            gi.cleanup_queue.delete_history("unknown")
+            leftovers = gi.cleanup_queue.drain()
+            self.assertEqual([item["id"] for item in leftovers], ["unknown"])
+            # the failed deletions are recorded and retried by `cleanup_leftovers`
+            recorded = load_cleanup_leftovers(self.leftovers)
+            self.assertEqual(recorded[0]["galaxy_url"], gi.gi.base_url)
+            recorded.append(dict(recorded[0], id=history.id))
+            recorded.append(dict(recorded[0], galaxy_url="http://other.galaxy"))
+            with open(self.leftovers, "w") as f:
+                json.dump(recorded, f)
+            self.assertEqual(cleanup_leftovers(galaxy.url, galaxy.api_key, filename=self.leftovers), (1, 1))
+            self.assertTrue(gi.gi.histories.show_history(history.id)["deleted"])
+            self.assertEqual(sorted(item.get("galaxy_url") for item in load_cleanup_leftovers(self.leftovers)),
+                             sorted([gi.gi.base_url, "http://other.galaxy"]))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestCleanupQueue)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import sys
+import json
+import unittest
+
+import requests
+from requests.adapters import BaseAdapter
+
+from wft4galaxy.common import ConnectionManager, GalaxyInstance
+
+
+class _RecordingAdapter(BaseAdapter):
+    """ Transport adapter which records requests and replies with an empty JSON list """
+
+    def __init__(self):
+        super(_RecordingAdapter, self).__init__()
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps([]).encode("utf-8")
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = ConnectionManager(pool_size=2)
+
+    def tearDown(self):
+        self.manager.close()
+
+    def test_same_server_same_session(self):
+        s1 = self.manager.get_session("http://galaxy:8080/", "key")
+        s2 = self.manager.get_session("http://galaxy:8080", "key")
+        self.assertIs(s1, s2)
+
+    def test_different_users_different_sessions(self):
+        s1 = self.manager.get_session("http://galaxy:8080", "key1")
+        s2 = self.manager.get_session("http://galaxy:8080", "key2")
+        self.assertIsNot(s1, s2)
+
+    def test_pool_size_grows(self):
+        session = self.manager.get_session("http://galaxy:8080", "key")
+        self.manager.ensure_pool_size(8)
+        self.assertEqual(self.manager.pool_size, 8)
+        self.assertEqual(session.get_adapter("http://galaxy:8080")._pool_maxsize, 8)
+        self.manager.ensure_pool_size(4)
+        self.assertEqual(self.manager.pool_size, 8)
+
+    def test_galaxy_instances_share_session(self):
+        gi1 = GalaxyInstance("http://galaxy-test:8080", "key")
+        gi2 = GalaxyInstance("http://galaxy-test:8080", "key")
+        self.assertIs(gi1.gi.session, gi2.gi.session)
+        # the object wrappers send their requests through the pooled client too
+        self.assertIs(gi1.histories.gi, gi1.gi)
+        self.assertIs(gi1.workflows.gi, gi1.gi)
+        adapter = _RecordingAdapter()
+        gi1.gi.session.mount("http://galaxy-test:8080", adapter)
+        gi1.gi.histories.get_histories()
+        gi2.gi.histories.get_histories()
+        self.assertEqual(len(adapter.requests), 2)
+        self.assertEqual(adapter.requests[0].headers["x-api-key"], "key")
+        self.assertIn("gzip", adapter.requests[0].headers["Accept-Encoding"])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestConnectionManager)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+
+import sys
+import time
+import unittest
+
+from wft4galaxy.common import RateLimiter, AdmissionController
+
+
+class _FakeJobClient(object):
+    """ Fake ``jobs`` client which reports a decreasing number of active jobs """
+
+    def __init__(self, active_jobs):
+        self.active_jobs = list(active_jobs)
+        self.params = None
+
+    def get_jobs(self, **params):
+        self.params = params
+        return [{}] * min(self.active_jobs.pop(0), params["limit"])
+
+
+class _FakeDatasetClient(object):
+    """ Fake ``datasets`` client which reports the states of the datasets set by the test """
+
+    def __init__(self):
+        self.states = {}
+
+    def show_dataset(self, dataset_id):
+        return {"id": dataset_id, "state": self.states.get(dataset_id, "new")}
+
+
+class _Dataset(object):
+    def __init__(self, dataset_id):
+        self.id = dataset_id
+
+
+class _FakeGalaxyInstance(object):
+    def __init__(self, jobs, datasets=None):
+        self.gi = type("gi", (object,), {"jobs": jobs, "datasets": datasets or _FakeDatasetClient()})()
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_disabled(self):
+        limiter = RateLimiter()
+        start = time.time()
+        for _ in range(100):
+            limiter.acquire()
+        self.assertLess(time.time() - start, 0.1)
+
+    def test_rate(self):
+        limiter = RateLimiter(rate=50, burst=1)
+        start = time.time()
+        for _ in range(6):
+            limiter.acquire()
+        # the first request is sent immediately, the others every 1/50 s
+        self.assertGreaterEqual(time.time() - start, 0.09)
+
+    def test_burst(self):
+        limiter = RateLimiter(rate=1, burst=5)
+        start = time.time()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.time() - start, 0.5)
+
+    def test_invalid_rate(self):
+        self.assertRaises(ValueError, RateLimiter, -1)
+
+
+class TestAdmissionController(unittest.TestCase):
+    def test_unlimited(self):
+        jobs = _FakeJobClient([])
+        self.assertEqual(AdmissionController(_FakeGalaxyInstance(jobs)).wait(), 0.0)
+        self.assertIsNone(jobs.params)
+
+    def test_wait_for_jobs(self):
+        jobs = _FakeJobClient([5, 4, 2])
+        controller = AdmissionController(_FakeGalaxyInstance(jobs), max_active_jobs=3, polling_interval=0.01)
+        controller.wait()
+        self.assertEqual(len(jobs.active_jobs), 0)
+        self.assertEqual(jobs.params["state"], list(AdmissionController.ACTIVE_JOB_STATES))
+
+    def test_admitted_invocations(self):
+        jobs = _FakeJobClient([1] * 100)
+        controller = AdmissionController(_FakeGalaxyInstance(jobs), max_active_jobs=2, polling_interval=0.01)
+        controller.wait()
+        # the jobs of the admitted invocation are not visible yet, but they are counted as active
+        self.assertEqual(controller.admitted, 1)
+        self.assertRaises(RuntimeError, controller.wait, 0.02)
+        self.assertEqual(jobs.params["limit"], 2)
+        controller.release()
+        self.assertEqual(controller.admitted, 0)
+        controller.wait()
+        self.assertEqual(controller.admitted, 1)
+
+    def test_weighted_invocations(self):
+        jobs = _FakeJobClient([1] * 100)
+        controller = AdmissionController(_FakeGalaxyInstance(jobs), max_active_jobs=4, polling_interval=0.01)
+        controller.wait(weight=3)
+        self.assertEqual(controller.admitted, 3)
+        self.assertRaises(RuntimeError, controller.wait, 0.02, 1)
+        controller.release(3)
+        # an invocation heavier than the threshold is admitted only when no job is active
+        self.assertRaises(RuntimeError, controller.wait, 0.02, 5)
+        jobs.active_jobs = [0]
+        controller.wait(weight=5)
+        self.assertEqual(controller.admitted, 5)
+
+    def test_held_invocations(self):
+        jobs = _FakeJobClient([0] * 100)
+        datasets = _FakeDatasetClient()
+        controller = AdmissionController(_FakeGalaxyInstance(jobs, datasets), max_active_jobs=2,
+                                         polling_interval=0.01)
+        controller.wait(weight=2)
+        controller.release(2, datasets=[_Dataset("a"), _Dataset("b")])
+        # the admission is held until the outputs of the invocation leave the `new` state
+        self.assertEqual(controller.admitted, 2)
+        datasets.states["b"] = "queued"
+        self.assertRaises(RuntimeError, controller.wait, 0.02)
+        datasets.states["a"] = "running"
+        controller.wait()
+        self.assertEqual(controller.admitted, 1)
+        # failed invocations are released at once
+        controller.release(datasets=None)
+        self.assertEqual(controller.admitted, 0)
+
+    def test_timeout(self):
+        jobs = _FakeJobClient([5] * 100)
+        controller = AdmissionController(_FakeGalaxyInstance(jobs), max_active_jobs=3, polling_interval=0.01)
+        self.assertRaises(RuntimeError, controller.wait, 0.02)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestRateLimiter),
+                               loader.loadTestsFromTestCase(TestAdmissionController)])
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
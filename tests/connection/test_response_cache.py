@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+import requests
+
+from wft4galaxy.cache import ResponseCache
+from wft4galaxy.common import ConnectionManager, get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy
+from wft4galaxy.wrapper import History
+
+URL = "http://localhost:8080/api"
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+def _response(data, status_code=200):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps(data).encode("utf-8")
+    return response
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_cacheable_responses(self):
+        cache = ResponseCache()
+        self.assertFalse(cache.put(URL + "/jobs/1", None, _response({"state": "running"})))
+        self.assertTrue(cache.put(URL + "/jobs/1", None, _response({"state": "ok"})))
+        self.assertTrue(cache.put(URL + "/datasets/2", None, _response({"state": "ok"})))
+        self.assertFalse(cache.put(URL + "/histories/3", None, _response({"state": "ok"})))
+        self.assertFalse(cache.put(URL + "/tools/cat1", {"io_details": True}, _response({})))
+        self.assertTrue(cache.put(URL + "/tools/cat1", {"io_details": True, "tool_version": "1.0"}, _response({})))
+        self.assertEqual(cache.get(URL + "/jobs/1").json(), {"state": "ok"})
+        self.assertIsNone(cache.get(URL + "/jobs/1", scope="another-user"))
+        self.assertEqual(cache.stats["hits"], 1)
+        self.assertEqual(cache.stats["stores"], 3)
+
+    def test_lru(self):
+        cache = ResponseCache(max_entries=2)
+        for i in range(3):
+            cache.put(URL + "/jobs/{}".format(i), None, _response({"state": "ok"}))
+        self.assertIsNone(cache.get(URL + "/jobs/0"))
+        self.assertIsNotNone(cache.get(URL + "/jobs/2"))
+        self.assertEqual(cache.stats["evictions"], 1)
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=-1)
+        cache.put(URL + "/jobs/1", None, _response({"state": "ok"}))
+        self.assertIsNone(cache.get(URL + "/jobs/1"))
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        cache.put(URL + "/histories/1/contents/2", None, _response({"state": "ok"}))
+        cache.invalidate(URL + "/histories/1")
+        self.assertIsNone(cache.get(URL + "/histories/1/contents/2"))
+
+    def test_invalidate_dataset(self):
+        filename = os.path.join(self.tmp_dir, "cache.sqlite")
+        cache = ResponseCache(filename=filename)
+        cache.put(URL + "/datasets/2", None, _response({"state": "ok"}))
+        cache.put(URL + "/histories/1/contents/2", None, _response({"state": "ok"}))
+        cache.put(URL + "/datasets/3", None, _response({"state": "ok"}))
+        # a dataset deleted through the history contents URL is invalidated under both URLs
+        cache.invalidate(URL + "/histories/1/contents/2")
+        self.assertIsNone(cache.get(URL + "/datasets/2"))
+        self.assertIsNotNone(cache.get(URL + "/datasets/3"))
+        cache.put(URL + "/histories/1/contents/2", None, _response({"state": "ok"}))
+        cache.invalidate(URL + "/datasets/2")
+        cache.close()
+        cache = ResponseCache(filename=filename)
+        self.assertIsNone(cache.get(URL + "/histories/1/contents/2"))
+        self.assertIsNone(cache.get(URL + "/datasets/2"))
+        self.assertIsNotNone(cache.get(URL + "/datasets/3"))
+        cache.close()
+
+    def test_tool_versions(self):
+        manager = ConnectionManager.get_instance()
+        cache = manager.response_cache = ResponseCache()
+        try:
+            with MockGalaxy() as galaxy:
+                gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+                history = gi.histories.create("wft4galaxy-tools")
+                with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                    gi.workflows.import_new(json.load(f))
+                # the details of a tool requested with its version are cached across histories
+                for _ in range(2):
+                    tool = History(history.id, galaxy_instance=gi)._get_tool("ChangeCase", "1.0.0")
+                    self.assertEqual(tool.version, "1.0.0")
+                    self.assertEqual([i["name"] for i in tool.wrapped["inputs"]], ["input"])
+                self.assertEqual((cache.stats["stores"], cache.stats["hits"]), (1, 1))
+        finally:
+            manager.response_cache = None
+
+    def test_persistence(self):
+        filename = os.path.join(self.tmp_dir, "cache.sqlite")
+        cache = ResponseCache(filename=filename)
+        cache.put(URL + "/jobs/1", None, _response({"state": "error"}))
+        cache.close()
+        cache = ResponseCache(filename=filename)
+        self.assertEqual(cache.get(URL + "/jobs/1").json(), {"state": "error"})
+        cache.close()
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestResponseCache)])
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
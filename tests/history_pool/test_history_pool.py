@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.metrics import collect_job_metrics
+from wft4galaxy.mock_galaxy import MockGalaxy
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+class TestHistoryPool(unittest.TestCase):
+    def test_disabled(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            self.assertFalse(gi.history_pool.enabled)
+            gi.history_pool_size = 2
+            self.assertTrue(gi.history_pool.enabled)
+
+    def test_reuse(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key, history_pool_size=1)
+            pool = gi.history_pool
+            history = pool.lease("test")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            self.assertEqual(pool.leased, 1)
+            pool.release(history)
+            self.assertEqual(pool.leased, 0)
+            # the released history is cleared and reused
+            self.assertTrue(gi.gi.histories.show_dataset(history.id, dataset.id)["deleted"])
+            self.assertEqual(gi.gi.histories.show_history(history.id, contents=True, deleted=False), [])
+            self.assertEqual(pool.lease("other").id, history.id)
+
+    def test_job_metrics(self):
+        with MockGalaxy(job_duration=0.05) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key, history_pool_size=1)
+            pool = gi.history_pool
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            collected = []
+            for i in range(2):
+                history = pool.lease("test{0}".format(i))
+                dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+                result = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                                "ds_map": {"0": {"src": "hda", "id": dataset.id}}})
+                gi.gi.datasets.wait_for_dataset(result["outputs"][0], interval=0.05)
+                collected.append(collect_job_metrics(gi, history.id,
+                                                     exclude_job_ids=pool.get_previous_jobs(history.id)))
+                pool.release(history)
+            # both tests ran in the same history, but each one only reports its own job
+            self.assertEqual(len(pool.get_previous_jobs(history.id)), 4)
+            self.assertEqual([len(m) for m in collected], [1, 1])
+            self.assertEqual(list(collected[0].keys()), list(collected[1].keys()))
+            self.assertNotEqual(list(collected[0].values())[0]["job_id"], list(collected[1].values())[0]["job_id"])
+
+    def test_close(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key, history_pool_size=1)
+            pool = gi.history_pool
+            histories = [pool.lease("test{0}".format(i)) for i in range(3)]
+            self.assertEqual(len(set(h.id for h in histories)), 3)
+            for h in histories:
+                pool.release(h)
+            # the histories exceeding the pool size are deleted too
+            self.assertEqual(pool.close(), 3)
+            self.assertEqual(gi.cleanup_queue.drain(), [])
+            self.assertTrue(all(gi.gi.histories.show_history(h.id)["deleted"] for h in histories))
+            self.assertEqual(pool.close(), 0)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestHistoryPool)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
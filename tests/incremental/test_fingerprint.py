@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import copy
+import json
+import shutil
+import tempfile
+import unittest
+
+import wft4galaxy.runner as runner
+from wft4galaxy.core import WorkflowTestCase
+from wft4galaxy.incremental import ResultCache, fingerprint
+
+_WORKFLOW = {
+    "name": "change_case", "uuid": "a1",
+    "steps": {
+        "0": {"id": 0, "type": "data_input", "tool_id": None, "position": {"left": 10, "top": 10}},
+        "1": {"id": 1, "type": "tool", "tool_id": "ChangeCase", "tool_version": "1.0.0",
+              "position": {"left": 200, "top": 10}, "tool_state": "{\"casing\": \"up\"}"}
+    }
+}
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self._write("workflow.ga", json.dumps(_WORKFLOW))
+        self._write("input", "abc\n")
+        self._write("expected", "ABC\n")
+        self.config = WorkflowTestCase(name="change_case", base_path=self.folder,
+                                       inputs={"Input Dataset": {"file": "input"}},
+                                       expected_outputs={"output1": {"file": "expected"}})
+        self.tools = {"ChangeCase": ["1.0.0"], "cat1": ["1.0.0"]}
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.folder, filename), "w") as f:
+            f.write(content)
+
+    def test_fingerprint(self):
+        reference = fingerprint(self.config, self.tools)
+        self.assertEqual(fingerprint(self.config, self.tools), reference)
+        # the layout of the workflow and the versions of unused tools don't matter
+        workflow = copy.deepcopy(_WORKFLOW)
+        workflow["uuid"] = "a2"
+        workflow["steps"]["1"]["position"] = {"left": 0, "top": 0}
+        self._write("workflow.ga", json.dumps(workflow))
+        self.assertEqual(fingerprint(self.config, dict(self.tools, cat1=["1.0.1"])), reference)
+        # a new version of a workflow tool
+        self.assertNotEqual(fingerprint(self.config, dict(self.tools, ChangeCase=["1.0.0", "1.1.0"])), reference)
+        # new params, comparator, input or expected output
+        self.config.set_params({1: {"casing": "down"}})
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+        self.config.set_params({})
+        self.config.get_expected_output("output1")["comparator"] = "filecmp.cmp"
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+        self.config.get_expected_output("output1").pop("comparator")
+        self._write("input", "abcd\n")
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+
+    def test_performance_settings(self):
+        reference = fingerprint(self.config, self.tools)
+        # tighter budgets must be checked again
+        self.config.max_wall_time = 60
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+        self.config.max_wall_time = None
+        self.assertEqual(fingerprint(self.config, self.tools), reference)
+        self.config.max_step_runtime = 10
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+        self.config.max_step_runtime = None
+        self.config.reuse_cached_jobs = True
+        self.assertNotEqual(fingerprint(self.config, self.tools), reference)
+        self.config.reuse_cached_jobs = None
+        # the settings of the metrics baseline
+        baseline = _Object(threshold=0.2, fail_on_regression=False)
+        with_baseline = fingerprint(self.config, self.tools, metrics_baseline=baseline)
+        self.assertNotEqual(with_baseline, reference)
+        baseline.fail_on_regression = True
+        self.assertNotEqual(fingerprint(self.config, self.tools, metrics_baseline=baseline), with_baseline)
+
+    def test_result_cache(self):
+        filename = os.path.join(self.folder, "results", "passed.json")
+        cache = ResultCache(filename)
+        cache.set_passed("a", "f1")
+        cache.set_passed("b", "f2")
+        cache.remove("b")
+        cache.save()
+        cache = ResultCache(filename)
+        self.assertTrue(cache.is_passed("a", "f1"))
+        self.assertFalse(cache.is_passed("a", "f2"))
+        self.assertFalse(cache.is_passed("b", "f2"))
+
+    def test_cached_pass(self):
+        galaxy_instance = _Object(tools=_Object(list=lambda: [_Object(id="ChangeCase", version="1.0.0")]))
+        cache = ResultCache()
+        test_runner = runner.WorkflowTestCaseRunner(galaxy_instance, None, self.config, result_cache=cache)
+        cache.set_passed("change_case", fingerprint(self.config, {"ChangeCase": ["1.0.0"]}))
+        # the workflow is not loaded (no workflow loader is available)
+        result = test_runner.run_test(disable_assertions=True, disable_cleanup=True)
+        self.assertTrue(result.cached)
+        self.assertTrue(result.passed())
+        with self.assertRaises(unittest.SkipTest):
+            test_runner.run_test(disable_cleanup=True)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestFingerprint)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
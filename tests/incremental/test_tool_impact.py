@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.core import WorkflowTestCase
+from wft4galaxy.mock_galaxy import MockGalaxy
+from wft4galaxy.incremental import build_tool_index, diff_tool_inventories, get_tool_inventory, \
+    is_selection_complete, load_tool_snapshot, save_tool_snapshot, select_affected_tests
+from wft4galaxy.sharding import Shard
+
+EXAMPLES_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples")
+
+
+class TestToolImpact(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tests = {name: WorkflowTestCase(name=name, base_path=EXAMPLES_FOLDER,
+                                             workflow_filename=os.path.join(name, "workflow.ga"))
+                      for name in ("change_case", "multivariate", "sacurine")}
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_diff(self):
+        old = {"cat1": ["1.0.0"], "ChangeCase": ["1.0.0"], "Univariate": ["2.2.0"]}
+        new = {"cat1": ["1.0.0"], "ChangeCase": ["1.0.0", "1.1.0"], "biosigner": ["2.2.7"]}
+        self.assertEqual(diff_tool_inventories(old, new), ["ChangeCase", "Univariate", "biosigner"])
+        self.assertEqual(diff_tool_inventories(old, old), [])
+
+    def test_index(self):
+        index, unindexed = build_tool_index(self.tests)
+        self.assertEqual(index["ChangeCase"], ["change_case"])
+        self.assertEqual(index["biosigner"], ["sacurine"])
+        self.assertEqual(unindexed, [])
+
+    def test_select(self):
+        self.assertEqual(select_affected_tests(self.tests, ["biosigner", "Multivariate"]),
+                         ["multivariate", "sacurine"])
+        self.assertEqual(select_affected_tests(self.tests, ["cat1"]), [])
+        # tests whose workflow cannot be read are always selected
+        self.tests["missing"] = WorkflowTestCase(name="missing", base_path=self.folder)
+        self.assertEqual(select_affected_tests(self.tests, []), ["missing"])
+
+    def test_snapshot(self):
+        filename = os.path.join(self.folder, "results", "tools.json")
+        self.assertIsNone(load_tool_snapshot(filename))
+        with MockGalaxy(tools=[("ChangeCase", "1.0.0"), ("cat1", "1.0.0")]) as galaxy:
+            inventory = get_tool_inventory(get_galaxy_instance(galaxy.url, galaxy.api_key))
+        self.assertEqual(inventory["ChangeCase"], ["1.0.0"])
+        self.assertEqual(inventory["cat1"], ["1.0.0"])
+        save_tool_snapshot(filename, inventory)
+        self.assertEqual(load_tool_snapshot(filename), inventory)
+
+    def test_selection_complete(self):
+        affected_tests = select_affected_tests(self.tests, ["Multivariate"])
+        self.assertTrue(is_selection_complete(affected_tests, ["change_case", "multivariate", "sacurine"]))
+        self.assertTrue(is_selection_complete([], []))
+        # the test filter or the shard exclude some affected tests: the snapshot must not be updated
+        self.assertFalse(is_selection_complete(affected_tests, ["multivariate"]))
+        self.assertFalse(is_selection_complete(affected_tests, []))
+        self.assertFalse(is_selection_complete(affected_tests, ["multivariate", "sacurine"], shard=Shard(1, 2)))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestToolImpact)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
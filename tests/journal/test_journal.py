@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.core import WorkflowTestCase, WorkflowTestResult
+from wft4galaxy.journal import RunJournal
+from wft4galaxy.mock_galaxy import MockGalaxy
+import wft4galaxy.runner as runner
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+def _result(results, errors=None):
+    result = WorkflowTestResult("id", None, {}, [], None, {}, [], results, {}, errors=errors)
+    result.duration = 3.5
+    return result
+
+
+class TestRunJournal(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, "results", "journal.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_checkpoints(self):
+        journal = RunJournal(self.filename)
+        journal.set_scheduled("first", "wf", "history", ["out1", "out2"])
+        journal.set_completed("second", _result({"output": False}, errors=["error"]), "failed")
+        # the checkpoints are written immediately
+        resumed = RunJournal(self.filename, resume=True)
+        self.assertEqual(resumed.get("first")["output_ids"], ["out1", "out2"])
+        self.assertFalse(resumed.is_completed("first"))
+        self.assertEqual(resumed.get_scheduled_tests(), ["first"])
+        self.assertTrue(resumed.is_completed("second"))
+        result = resumed.get_result("second", "id", WorkflowTestCase(name="second"))
+        self.assertTrue(result.failed())
+        self.assertTrue(result.resumed)
+        self.assertEqual((result.failed_outputs, result.errors, result.duration), ({"output": False}, ["error"], 3.5))
+        self.assertIsNone(resumed.get_result("first", "id", WorkflowTestCase(name="first")))
+        # a new run discards the journal of the previous one
+        self.assertIsNone(RunJournal(self.filename).get("first"))
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_resume_completed(self):
+        journal = RunJournal(self.filename)
+        journal.set_completed("passed", _result({"output": True}))
+        journal.set_completed("failed", _result({"output": False}), "The actual output 'output' differs")
+        journal = RunJournal(self.filename, resume=True)
+        # completed tests are not executed again: the Galaxy instance is never used
+        test = runner.WorkflowTestCaseRunner(None, None, WorkflowTestCase(name="passed"), journal=journal)
+        result = test.run_test()
+        self.assertTrue(result.passed() and result.resumed)
+        test = runner.WorkflowTestCaseRunner(None, None, WorkflowTestCase(name="failed"), journal=journal)
+        with self.assertRaises(AssertionError) as context:
+            test.run_test()
+        self.assertIn("differs", str(context.exception))
+
+    def test_fingerprint(self):
+        journal = RunJournal(self.filename)
+        journal.set_completed("test", _result({"output": True}), fingerprint="old")
+        resumed = RunJournal(self.filename, resume=True)
+        self.assertTrue(resumed.is_completed("test", "old"))
+        # the checkpoints of a test whose configuration has changed are ignored
+        self.assertFalse(resumed.is_completed("test", "new"))
+        self.assertIsNone(resumed.get("test", "new"))
+        self.assertIsNone(resumed.get_result("test", "id", WorkflowTestCase(name="test"), fingerprint="new"))
+
+    def test_resume_changed_test(self):
+        config = WorkflowTestCase(name="change_case", base_path=EXAMPLE_FOLDER,
+                                  inputs={"InputText": {"file": ["input"]}},
+                                  expected_outputs={"OutputText": {"file": "expected_output"}})
+        test = runner.WorkflowTestCaseRunner(None, None, config)
+        fingerprint = test._get_journal_fingerprint()
+        self.assertIsNotNone(fingerprint)
+        journal = RunJournal(self.filename)
+        journal.set_completed("change_case", _result({"OutputText": True}), fingerprint=fingerprint)
+        test = runner.WorkflowTestCaseRunner(None, None, config, journal=RunJournal(self.filename, attach_only=True))
+        self.assertTrue(test.run_test().resumed)
+        # the configuration has changed: the result of the interrupted run is not reused
+        config.max_wall_time = 60
+        test = runner.WorkflowTestCaseRunner(None, None, config, journal=RunJournal(self.filename, attach_only=True))
+        with self.assertRaises(AssertionError) as context:
+            test.run_test()
+        self.assertIn("attach", str(context.exception))
+
+    def test_attach_only(self):
+        journal = RunJournal(self.filename, attach_only=True)
+        self.assertTrue(journal.resume)
+        # a test without a scheduled invocation is never submitted
+        test = runner.WorkflowTestCaseRunner(None, None, WorkflowTestCase(name="test"), journal=journal)
+        with self.assertRaises(AssertionError) as context:
+            test.run_test()
+        self.assertIn("attach", str(context.exception))
+        self.assertTrue(test.test_result.failed())
+
+    def test_reattach(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            history = gi.histories.create("test")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            RunJournal(self.filename).set_scheduled("test", workflow.id, history.id, [dataset.id])
+            test = runner.WorkflowTestCaseRunner(gi, None, WorkflowTestCase(name="test"),
+                                                 journal=RunJournal(self.filename, resume=True))
+            outputs, output_history = test._reattach()
+            self.assertEqual((output_history.id, [o.id for o in outputs]), (history.id, [dataset.id]))
+            # the workflow of the invocation is reused
+            self.assertEqual(test.get_galaxy_workflow().id, workflow.id)
+            # the invocation cannot be reattached once its history is deleted
+            gi.histories.delete(history.id)
+            self.assertIsNone(test._reattach())
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestRunJournal)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+import sys
+import threading
+import unittest
+
+from wft4galaxy.core import WorkflowTestCase
+import wft4galaxy.runner as runner
+from wft4galaxy.loadtest import Invocation, LoadTestResult, percentile
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Dataset(object):
+    def __init__(self, name, state="ok"):
+        self.id = self.name = name
+        self.state = state
+
+    def refresh(self):
+        pass
+
+
+class _Workflow(object):
+    id = name = "wf"
+    steps = {}
+
+    def __init__(self, fail_every=None):
+        self.fail_every = fail_every
+        self.invocations = 0
+        self._lock = threading.Lock()
+
+    def run(self, datamap, history, params=None, wait=True):
+        with self._lock:
+            self.invocations += 1
+            n = self.invocations
+        if self.fail_every and n % self.fail_every == 0:
+            raise RuntimeError("invocation rejected")
+        return [_Dataset("out_{0}".format(n))], history
+
+
+class _History(object):
+    id = name = "history"
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_dataset(self, filename, file_type=None):
+        self.uploads.append(filename)
+        return _Dataset(filename)
+
+
+class _WorkflowLoader(object):
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.unloaded = []
+
+    def load_workflow(self, *args, **kwargs):
+        return self.workflow
+
+    def unload_workflow(self, workflow_id):
+        self.unloaded.append(workflow_id)
+
+
+class _GalaxyInstance(object):
+    polling_interval = 0.01
+
+    def __init__(self):
+        self.history = _History()
+        self.deleted = []
+        self.tools = _Object(list=lambda: [])
+        self.histories = _Object(create=lambda name: self.history, delete=self.deleted.append)
+        self.admission_controller = _Object(wait=lambda timeout=None, weight=1: 0.0,
+                                            release=lambda weight=1, datasets=None: None)
+        self.history_pool = _Object(enabled=False)
+        self.cleanup_queue = _Object(delete_history=self.deleted.append, drain=lambda timeout=None: [])
+
+
+class TestLoadTest(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_result(self):
+        invocations = [Invocation(i, 0.0, 0.1 * i, 1.0 * i, None) for i in range(1, 10)]
+        invocations.append(Invocation(0, 0.0, None, None, "error"))
+        result = LoadTestResult("test", 10, 2, invocations, 3.0)
+        self.assertEqual(result.invocations[0].index, 0)
+        self.assertEqual(result.throughput, 3.0)
+        self.assertEqual(result.error_rate, 0.1)
+        self.assertEqual(list(result.percentiles("completion").values()), [5.0, 9.0, 9.0])
+        self.assertEqual(result.to_dict()["errors"], 1)
+
+    def _run_load_test(self, workflow, repeat, concurrency):
+        gi = _GalaxyInstance()
+        loader = _WorkflowLoader(workflow)
+        config = WorkflowTestCase(name="load", inputs={"input": {"file": "input.txt"}})
+        test_runner = runner.WorkflowTestCaseRunner(gi, loader, config)
+        return test_runner.run_load_test(repeat, concurrency), gi, loader
+
+    def test_run_load_test(self):
+        workflow = _Workflow()
+        result, gi, loader = self._run_load_test(workflow, 20, 4)
+        self.assertEqual(workflow.invocations, 20)
+        self.assertEqual(len(result.invocations), 20)
+        self.assertEqual(result.errors, [])
+        self.assertIsNotNone(result.percentiles("scheduling")["p99"])
+        # inputs are uploaded once and resources are cleaned up
+        self.assertEqual(len(gi.history.uploads), 1)
+        self.assertEqual(gi.deleted, ["history"])
+        self.assertEqual(loader.unloaded, ["wf"])
+
+    def test_run_load_test_errors(self):
+        result, _, _ = self._run_load_test(_Workflow(fail_every=4), 8, 2)
+        self.assertEqual(len(result.errors), 2)
+        self.assertEqual(result.error_rate, 0.25)
+        self.assertEqual(result.errors[0].error, "invocation rejected")
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestLoadTest)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+
+from wft4galaxy.core import WorkflowTestCase
+from wft4galaxy.common import get_galaxy_instance, SpanRecorder, AdmissionController
+from wft4galaxy.mock_galaxy import MockGalaxy
+import wft4galaxy.runner as runner
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+class _Object(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class _Workflow(object):
+    id = name = "wf"
+    steps = {}
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.invocations = []
+        self._lock = threading.Lock()
+
+    def run(self, datamap, history, params=None, wait=True):
+        if params == self.fail_on:
+            raise RuntimeError("invocation rejected")
+        with self._lock:
+            self.invocations.append(params)
+        return [_Object(id=str(params), name="output")], history
+
+
+class _History(object):
+    id = name = "history"
+
+    def __init__(self):
+        self.uploads = []
+
+    def upload_dataset(self, filename, file_type=None):
+        self.uploads.append(filename)
+        return _Object(id=filename, name=filename)
+
+
+class _WorkflowLoader(object):
+    def __init__(self, workflow):
+        self.workflow = workflow
+        self.loaded = 0
+        self.unloaded = []
+
+    def load_workflow(self, *args, **kwargs):
+        self.loaded += 1
+        return self.workflow
+
+    def unload_workflow(self, workflow_id):
+        self.unloaded.append(workflow_id)
+
+
+class _GalaxyInstance(object):
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+        self.histories = _Object(create=self._create_history, delete=self.deleted.append)
+        self.admission_controller = _Object(wait=lambda timeout=None, weight=1: 0.0,
+                                            release=lambda weight=1, datasets=None: None)
+        self.history_pool = _Object(enabled=False)
+        self.cleanup_queue = _Object(delete_history=self.deleted.append, drain=lambda timeout=None: [])
+
+    def _create_history(self, name):
+        self.created.append(_History())
+        return self.created[-1]
+
+
+def _sweep_test(**kwargs):
+    return WorkflowTestCase(name="sweep", output_folder="results",
+                            inputs={"input": {"file": "input.txt"}}, params={3: {"scale": "none"}},
+                            expected_outputs={"output": {"file": "expected_{predI}_{orthoI}.tsv"}},
+                            matrix={3: {"predI": [1, 2], "orthoI": [0, 1]}}, **kwargs)
+
+
+class TestParameterSweep(unittest.TestCase):
+    def test_expand_matrix(self):
+        cases = _sweep_test().expand_matrix()
+        self.assertEqual([c.name for c in cases],
+                         ["sweep[orthoI=0,predI=1]", "sweep[orthoI=0,predI=2]",
+                          "sweep[orthoI=1,predI=1]", "sweep[orthoI=1,predI=2]"])
+        case = cases[1]
+        self.assertEqual(case.params, {3: {"scale": "none", "orthoI": 0, "predI": 2}})
+        self.assertEqual(case.expected_outputs["output"]["file"], "expected_2_0.tsv")
+        self.assertEqual(case.output_folder, os.path.join("results", "orthoI=0,predI=2"))
+        self.assertEqual(case.parameter_sweep, "sweep")
+        self.assertIsNone(case.matrix)
+        # the params of the expanded test are not modified
+        self.assertEqual(_sweep_test().expand_matrix()[0].params[3]["predI"], 1)
+        self.assertEqual(WorkflowTestCase(name="single").expand_matrix()[0].name, "single")
+
+    def test_invalid_matrix(self):
+        with self.assertRaises(ValueError):
+            WorkflowTestCase(matrix={1: {"p": [1]}, 2: {"p": [2]}}).expand_matrix()
+        test = _sweep_test()
+        test.add_expected_output("other", "expected_{unknown}.tsv")
+        with self.assertRaises(ValueError):
+            test.expand_matrix()
+
+    def _make_runners(self, workflow):
+        gi = _GalaxyInstance()
+        loader = _WorkflowLoader(workflow)
+        sweep = runner._ParameterSweep("sweep")
+        runners = [runner.WorkflowTestCaseRunner(gi, loader, case, parameter_sweep=sweep)
+                   for case in _sweep_test().expand_matrix()]
+        return gi, loader, sweep, runners
+
+    def test_shared_invocations(self):
+        workflow = _Workflow()
+        gi, loader, sweep, runners = self._make_runners(workflow)
+        outputs = [sweep.get_invocation(r)[0][0].id for r in runners]
+        # one import, one history and one upload for all the cases
+        self.assertEqual(loader.loaded, 1)
+        self.assertEqual(len(gi.created), 1)
+        self.assertEqual(gi.created[0].uploads, ["./input.txt"])
+        self.assertEqual(len(workflow.invocations), 4)
+        self.assertEqual(len(set(outputs)), 4)
+        # the shared resources are removed when all the cases are done
+        for r in runners[:-1]:
+            r.cleanup()
+        self.assertEqual((gi.deleted, loader.unloaded), ([], []))
+        runners[-1].cleanup()
+        self.assertEqual((gi.deleted, loader.unloaded), (["history"], ["wf"]))
+
+    def test_max_active_jobs(self):
+        workflow = _Workflow()
+        gi, loader, sweep, runners = self._make_runners(workflow)
+        states = {}
+        # the jobs of the invocations are not visible until their outputs leave the `new` state
+        gi.gi = _Object(jobs=_Object(get_jobs=lambda **params: []),
+                        datasets=_Object(show_dataset=lambda d: {"id": d, "state": states.get(d, "new")}))
+        gi.admission_controller = AdmissionController(gi, max_active_jobs=2, polling_interval=0.01)
+        thread = threading.Thread(target=sweep.get_invocation, args=(runners[0],))
+        thread.start()
+        try:
+            time.sleep(0.2)
+            self.assertEqual(len(workflow.invocations), 2)
+        finally:
+            for params in [c.params for c in _sweep_test().expand_matrix()]:
+                states[str(params)] = "queued"
+            thread.join()
+        self.assertEqual(len(workflow.invocations), 4)
+
+    def test_failed_invocation(self):
+        workflow = _Workflow(fail_on={3: {"scale": "none", "orthoI": 1, "predI": 1}})
+        gi, loader, sweep, runners = self._make_runners(workflow)
+        self.assertRaises(RuntimeError, sweep.get_invocation, runners[2])
+        self.assertEqual(len(sweep.get_invocation(runners[3])[0]), 1)
+
+    def test_job_metrics(self):
+        with MockGalaxy(job_duration=0.05) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            history = gi.histories.create("wft4galaxy-sweep")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            sweep = runner._ParameterSweep("sweep")
+            cases = _sweep_test().expand_matrix()[:2]
+            runners, results = [], []
+            for case in cases:
+                runners.append(runner.WorkflowTestCaseRunner(gi, _WorkflowLoader(workflow), case,
+                                                             parameter_sweep=sweep))
+                runners[-1]._span_recorder = SpanRecorder()
+                # the invocations of the cases share the same history
+                invocation = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                                    "ds_map": {"0": {"src": "hda", "id": dataset.id}}})
+                results.append(_Object(outputs=[history.get_dataset(i) for i in invocation["outputs"]],
+                                       job_metrics=None))
+            for r, result in zip(runners, results):
+                for output in result.outputs:
+                    gi.gi.datasets.wait_for_dataset(output.id, interval=0.05)
+                r._check_job_metrics(result, history)
+            for result in results:
+                self.assertEqual(list(result.job_metrics), ["ChangeCase"])
+                job_id = result.job_metrics["ChangeCase"]["job_id"]
+                self.assertEqual(gi.gi.histories.show_dataset(history.id, result.outputs[0].id)["creating_job"],
+                                 job_id)
+            self.assertNotEqual(results[0].job_metrics["ChangeCase"]["job_id"],
+                                results[1].job_metrics["ChangeCase"]["job_id"])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestParameterSweep)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy
+from wft4galaxy.metrics import MetricsBaseline, parse_job_metrics, collect_job_metrics
+from wft4galaxy.metrics import parse_size, check_step_runtimes, check_output_sizes
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+def _job(runtime, memory=None, state="ok"):
+    metrics = {"runtime": runtime}
+    if memory is not None:
+        metrics["memory"] = memory
+    return {"job_id": "1", "tool_id": "tool", "state": state, "metrics": metrics}
+
+
+class TestJobMetrics(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parse(self):
+        metrics = parse_job_metrics([
+            {"name": "runtime_seconds", "raw_value": "12.0000000"},
+            {"name": "galaxy_memory_mb", "raw_value": "2"},
+            {"name": "start_epoch", "raw_value": "not a number"}])
+        self.assertEqual(metrics, {"runtime_seconds": 12.0, "runtime": 12.0,
+                                   "galaxy_memory_mb": 2.0, "memory_allocated": 2.0 * (1 << 20)})
+
+    def test_compare(self):
+        baseline = MetricsBaseline(threshold=50)
+        baseline.set("test", {"tool": _job(10.0, 1 << 30), "other": _job(1.0)})
+        regressions = baseline.compare("test", {"tool": _job(30.0, 1 << 30), "other": _job(1.9)})
+        # the increase of `other` is below the noise level
+        self.assertEqual([(r.step, r.metric) for r in regressions], [("tool", "runtime")])
+        self.assertAlmostEqual(regressions[0].increase, 200.0)
+        self.assertEqual(baseline.compare("new_test", {"tool": _job(30.0)}), [])
+
+    def test_save_and_load(self):
+        filename = os.path.join(self.folder, "baseline.json")
+        baseline = MetricsBaseline(filename, update=True)
+        baseline.set("test", {"tool": _job(10.0), "failed": _job(1.0, state="error")})
+        baseline.save()
+        self.assertEqual(MetricsBaseline(filename).get("test"), {"tool": {"runtime": 10.0}})
+
+    def test_collect(self):
+        with MockGalaxy(job_duration=0.1) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            history = gi.histories.create("wft4galaxy-metrics")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            result = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                            "ds_map": {"0": {"src": "hda", "id": dataset.id}}})
+            gi.gi.datasets.wait_for_dataset(result["outputs"][0], interval=0.05)
+            job_metrics = collect_job_metrics(gi, history.id)
+        self.assertEqual(len(job_metrics), 1)
+        job = list(job_metrics.values())[0]
+        self.assertEqual(job["state"], "ok")
+        self.assertAlmostEqual(job["metrics"]["runtime"], 0.1, places=3)
+        self.assertEqual(job["metrics"]["cores"], 1.0)
+        self.assertFalse(job["cached"])
+
+    def test_cached_jobs(self):
+        with MockGalaxy(job_duration=0.1) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            history = gi.histories.create("wft4galaxy-job-cache")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            for _ in range(2):
+                result = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                                "ds_map": {"0": {"src": "hda", "id": dataset.id}},
+                                                "use_cached_job": True})
+                gi.gi.datasets.wait_for_dataset(result["outputs"][0], interval=0.05)
+            job_metrics = collect_job_metrics(gi, history.id)
+        self.assertEqual([job["cached"] for job in job_metrics.values()], [False, True])
+        # the metrics of cached jobs are not stored in the baseline
+        baseline = MetricsBaseline()
+        baseline.set("test", job_metrics)
+        self.assertEqual(list(baseline.get("test")), ["ChangeCase"])
+
+
+class TestBudgets(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size(100), 100)
+        self.assertEqual(parse_size("10M"), 10 << 20)
+        self.assertEqual(parse_size("1.5kb"), 1536)
+        self.assertRaises(ValueError, parse_size, "ten")
+
+    def test_step_runtimes(self):
+        job_metrics = {"cat1": _job(10.0), "sort1": _job(100.0)}
+        self.assertEqual([v.subject for v in check_step_runtimes(50, job_metrics)], ["sort1"])
+        violations = check_step_runtimes({"cat1": 5}, job_metrics)
+        self.assertEqual([(v.budget, v.subject, v.value, v.limit) for v in violations],
+                         [("max_step_runtime", "cat1", 10.0, 5)])
+
+    def test_output_sizes(self):
+        folder = tempfile.mkdtemp()
+        try:
+            output_file_map = {}
+            for name, size in (("small", 10), ("large", 2048)):
+                output_file_map[name] = {"filename": os.path.join(folder, name)}
+                with open(output_file_map[name]["filename"], "w") as f:
+                    f.write("x" * size)
+            self.assertEqual([v.subject for v in check_output_sizes("1K", output_file_map)], ["large"])
+            self.assertEqual(check_output_sizes({"small": 100}, output_file_map), [])
+        finally:
+            shutil.rmtree(folder)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestJobMetrics),
+                               loader.loadTestsFromTestCase(TestBudgets)])
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
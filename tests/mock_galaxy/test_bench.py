@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+import yaml
+from bioblend.galaxy.objects.wrappers import Workflow
+
+from wft4galaxy.app import bench
+from wft4galaxy.common import SpanRecorder
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.core import WorkflowTestResult
+from wft4galaxy.mock_galaxy import MockGalaxy
+
+
+class _TestResult(WorkflowTestResult):
+    def __init__(self, spans):
+        self.spans = spans
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def _check_suite(self, output_size=None):
+        filename = bench.generate_suite(self.folder, tests=2, inputs=3, input_size=100, output_size=output_size)
+        with open(filename) as f:
+            workflows = yaml.safe_load(f)["workflows"]
+        self.assertEqual(len(workflows), 2)
+        test = workflows["bench_1"]
+        with MockGalaxy(output_size=output_size) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            history = gi.histories.create("bench")
+            with open(os.path.join(self.folder, test["file"])) as f:
+                workflow = gi.workflows.import_new(json.load(f))
+            ds_map = {}
+            for step_id, step in workflow.inputs.items():
+                dataset = history.upload_dataset(os.path.join(self.folder, test["inputs"][step["label"]]))
+                ds_map[step_id] = {"src": "hda", "id": dataset.id}
+            result = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                            "ds_map": ds_map})
+            output = history.get_dataset(result["outputs"][0])
+            actual = io.BytesIO()
+            output.download(actual)
+        self.assertIn(output.name, test["expected"])
+        with open(os.path.join(self.folder, test["expected"][output.name]), "rb") as f:
+            self.assertEqual(actual.getvalue(), f.read())
+
+    def test_identity_outputs(self):
+        self._check_suite()
+
+    def test_synthetic_outputs(self):
+        self._check_suite(output_size=500)
+
+    @unittest.skipIf(not hasattr(Workflow, "run"), "the installed bioblend cannot run workflow tests")
+    def test_run_benchmark(self):
+        filename = bench.generate_suite(self.folder, tests=2, input_size=100)
+        runs = bench.run_benchmark(filename, os.path.join(self.folder, "results"), polling_interval=0.05)
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(runs[0]["tests"], {"total": 2, "passed": 2, "failed": 0})
+        phases = runs[0]["phases"]
+        self.assertEqual(list(phases.keys()), list(bench.PHASES.keys()))
+        self.assertTrue(all(phases[p] > 0 for p in ("setup", "upload", "invocation", "polling", "download")))
+
+    def test_phases(self):
+        spans = SpanRecorder()
+        for name, key in (("import_workflow", None), ("upload_input", "input_0"), ("upload_input", "input_1"),
+                          ("wait_jobs", None), ("unknown", None)):
+            with spans.span(name, key=key):
+                pass
+        test_result = _TestResult(spans.spans)
+        phases = bench.group_by_phase([test_result, test_result])
+        self.assertEqual(list(phases.keys()), list(bench.PHASES.keys()) + ["other"])
+        timings = test_result.get_timings()
+        self.assertAlmostEqual(phases["upload"], 2 * (timings["upload_input[input_0]"] +
+                                                      timings["upload_input[input_1]"]))
+        self.assertAlmostEqual(phases["polling"], 2 * timings["wait_jobs"])
+        self.assertEqual(phases["cleanup"], 0.0)
+
+    def test_summary(self):
+        runs = [{"wall_time": t, "peak_rss": None,
+                 "http": {"requests": 10, "bytes_uploaded": 1, "bytes_downloaded": 2}} for t in (3.0, 1.0, 2.0, 4.0)]
+        summary = bench.summarize(runs)
+        self.assertEqual(summary["wall_time"]["median"], 2.5)
+        self.assertEqual(summary["wall_time"]["min"], 1.0)
+        self.assertNotIn("peak_rss", summary)
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestBenchmarkSuite)])
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import json
+import time
+import unittest
+
+from bioblend import ConnectionError
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy, make_synthetic_content
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+class TestMockGalaxy(unittest.TestCase):
+    def _run_workflow(self, galaxy):
+        gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+        history = gi.histories.create("wft4galaxy-mock")
+        dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+        with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+            workflow = gi.workflows.import_new(json.load(f))
+        # legacy API used by `Workflow.run`
+        result = gi.gi.workflows._post({"workflow_id": workflow.id, "history": "hist_id=" + history.id,
+                                        "ds_map": {"0": {"src": "hda", "id": dataset.id}}})
+        return gi, dataset, history.get_dataset(result["outputs"][0])
+
+    def test_run_workflow(self):
+        with MockGalaxy(job_duration=0.2, seed=1) as galaxy:
+            gi, dataset, output = self._run_workflow(galaxy)
+            self.assertEqual(output.name, "OutputText")
+            self.assertIn(output.state, ("queued", "running"))
+            gi.gi.datasets.wait_for_dataset(output.id, interval=0.05)
+            output.refresh()
+            self.assertEqual(output.state, "ok")
+            actual, expected = io.BytesIO(), io.BytesIO()
+            output.download(actual)
+            dataset.download(expected)
+            self.assertEqual(actual.getvalue(), expected.getvalue())
+            job = gi.jobs.get(output.wrapped["creating_job"], full_details=True)
+            self.assertEqual(job.wrapped["inputs"]["input"]["id"], dataset.id)
+            self.assertGreater(galaxy.stats["requests"], 0)
+
+    def test_failures(self):
+        with MockGalaxy(failure_rate=1.0) as galaxy:
+            _, _, output = self._run_workflow(galaxy)
+            self.assertEqual(output.state, "error")
+
+    def test_synthetic_outputs(self):
+        with MockGalaxy(output_size=1000) as galaxy:
+            _, _, output = self._run_workflow(galaxy)
+            self.assertEqual(output.wrapped["file_size"], 1000)
+        self.assertEqual(make_synthetic_content(500, "a"), make_synthetic_content(500, "a"))
+        self.assertNotEqual(make_synthetic_content(500, "a"), make_synthetic_content(500, "b"))
+
+    def test_invalid_api_key(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, "wrong-key")
+            self.assertRaises(ConnectionError, gi.histories.create, "wft4galaxy-mock")
+
+
+def suite():
+    loader = unittest.TestLoader()
+    return unittest.TestSuite([loader.loadTestsFromTestCase(TestMockGalaxy)])
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
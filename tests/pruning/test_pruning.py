@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import sys
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy
+from wft4galaxy.core import WorkflowGraph
+from wft4galaxy.pruning import prune_workflow
+from wft4galaxy.pruning import get_removed_inputs, remap_params
+
+
+def _input_step(step_id, label):
+    return {"id": step_id, "type": "data_input", "label": label, "tool_id": None,
+            "inputs": [{"name": label}], "input_connections": {}}
+
+
+def _tool_step(step_id, output_label, *inputs):
+    return {"id": step_id, "type": "tool", "tool_id": "ChangeCase", "tool_version": "1.0.0",
+            "input_connections": {"input{0}".format(i): {"id": input_id, "output_name": "output"}
+                                  for i, input_id in enumerate(inputs)},
+            "outputs": [{"name": "out_file1", "type": "tabular"}],
+            "post_job_actions": {},
+            "workflow_outputs": [{"label": output_label, "output_name": "out_file1"}]}
+
+
+def _workflow():
+    # two independent branches: A -> OutA -> Final and B -> OutB
+    return WorkflowGraph({"name": "branches", "steps": {
+        "0": _input_step(0, "A"),
+        "1": _input_step(1, "B"),
+        "2": _tool_step(2, "OutA", 0),
+        "3": _tool_step(3, "OutB", 1),
+        "4": _tool_step(4, "Final", 2)}})
+
+
+class TestPruning(unittest.TestCase):
+    def test_closure(self):
+        workflow = _workflow()
+        self.assertEqual(workflow.find_output_steps(["Final", "Missing"]), ({4}, ["Missing"]))
+        self.assertEqual(workflow.upstream({4}), {0, 2, 4})
+        self.assertEqual(workflow.upstream({3, 4}), {0, 1, 2, 3, 4})
+
+    def test_prune(self):
+        workflow = _workflow()
+        pruned, step_map = prune_workflow(workflow, ["Final"])
+        self.assertEqual(step_map, {0: 0, 2: 1, 4: 2})
+        self.assertEqual(sorted(pruned["steps"]), ["0", "1", "2"])
+        self.assertEqual(pruned["steps"]["2"]["id"], 2)
+        self.assertEqual(pruned["steps"]["2"]["input_connections"]["input0"]["id"], 1)
+        self.assertEqual(pruned["steps"]["1"]["input_connections"]["input0"]["id"], 0)
+        self.assertEqual(get_removed_inputs(workflow, step_map), {"B"})
+        # the original definition is not modified
+        self.assertEqual(len(workflow.definition["steps"]), 5)
+        self.assertEqual(workflow.definition["steps"]["4"]["input_connections"]["input0"]["id"], 2)
+
+    def test_unmatched_outputs(self):
+        self.assertEqual(prune_workflow(_workflow(), ["Final", "Missing"]), (None, None))
+
+    def test_remap_params(self):
+        params = {2: {"casing": "up"}, "3": {"casing": "down"}, "ChangeCase": {"cols": "c1"}}
+        self.assertEqual(remap_params(params, {0: 0, 2: 1, 4: 2}),
+                         {1: {"casing": "up"}, "ChangeCase": {"cols": "c1"}})
+
+    def test_import(self):
+        pruned, _ = prune_workflow(_workflow(), ["OutB"])
+        with MockGalaxy(tools=[("ChangeCase", "1.0.0")]) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            workflow = gi.workflows.import_new(pruned)
+            self.assertEqual(len(workflow.steps), 2)
+            self.assertEqual([s.tool_id for s in workflow.steps.values() if s.tool_id], ["ChangeCase"])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestPruning)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import unittest
+
+from wft4galaxy.common import get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy
+import wft4galaxy.runner as runner
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+class _Workflow(object):
+    """ The subset of the workflow wrapper used to invoke a workflow with ``use_cached_job``. """
+
+    def __init__(self, workflow):
+        self.id = workflow.id
+        self.name = workflow.name
+
+    def convert_input_map(self, datamap):
+        return {input_id: {"id": dataset.id, "src": "hda"} for input_id, dataset in datamap.items()}
+
+
+class TestRunWorkflow(unittest.TestCase):
+    def test_use_cached_job(self):
+        with MockGalaxy(job_duration=0.05) as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            gi.polling_interval = 0.05
+            history = gi.histories.create("wft4galaxy-cached-jobs")
+            dataset = history.upload_dataset(os.path.join(EXAMPLE_FOLDER, "input"), file_type="txt")
+            with open(os.path.join(EXAMPLE_FOLDER, "workflow.ga")) as f:
+                workflow = _Workflow(gi.workflows.import_new(json.load(f)))
+            jobs = []
+            for _ in range(2):
+                outputs, output_history = runner._run_workflow(gi, workflow, {"0": dataset}, history,
+                                                               use_cached_job=True)
+                self.assertEqual(output_history.id, history.id)
+                self.assertEqual(len(outputs), 1)
+                gi.gi.datasets.wait_for_dataset(outputs[0].id, interval=0.05)
+                jobs.append(gi.gi.jobs.show_job(
+                    gi.gi.datasets.show_dataset(outputs[0].id)["creating_job"], full_details=True))
+        # the second invocation reuses the job of the first one
+        self.assertIsNone(jobs[0]["copied_from_job_id"])
+        self.assertEqual(jobs[1]["copied_from_job_id"], jobs[0]["id"])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestRunWorkflow)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
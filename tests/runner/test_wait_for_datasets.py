@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+import sys
+import unittest
+
+from wft4galaxy.core import WorkflowTestCase
+import wft4galaxy.runner as runner
+
+
+class _Dataset(object):
+    """ A dataset which goes through the given ``states``, one per refresh. """
+
+    def __init__(self, name, *states):
+        self.id = self.name = name
+        self._states = list(states)
+        self.state = self._states.pop(0)
+
+    def refresh(self):
+        if self._states:
+            self.state = self._states.pop(0)
+
+
+class TestWaitForDatasets(unittest.TestCase):
+    def setUp(self):
+        self.runner = runner.WorkflowTestCaseRunner(None, None, WorkflowTestCase(name="test"))
+
+    def _wait(self, *datasets):
+        self.runner._wait_for_datasets(list(datasets), 0)
+
+    def test_ready(self):
+        datasets = [_Dataset("a", "queued", "running", "ok"), _Dataset("b", "ok")]
+        self._wait(*datasets)
+        self.assertEqual([d.state for d in datasets], ["ok", "ok"])
+
+    def test_initial_error(self):
+        # an output already failed when the invocation is scheduled
+        with self.assertRaises(RuntimeError) as context:
+            self._wait(_Dataset("a", "queued", "ok"), _Dataset("b", "error"))
+        self.assertIn("'error' state", str(context.exception))
+
+    def test_error_states(self):
+        for state in ("error", "failed_metadata", "paused", "deferred"):
+            with self.assertRaises(RuntimeError) as context:
+                self._wait(_Dataset("a", "ok"), _Dataset("b", "new", "running", state))
+            self.assertIn("'{0}' state".format(state), str(context.exception))
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestWaitForDatasets)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from xml.dom.minidom import parse
+
+from wft4galaxy.core import WorkflowTestResult
+from wft4galaxy.timings import TimingDatabase
+from wft4galaxy.app.merge_reports import merge_reports
+from wft4galaxy.sharding import Shard, parse_shard, partition, select_shard, get_durations, partition_digest
+
+_XUNIT_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<testsuite name="{0}" tests="{1}" failures="{2}" errors="0" skipped="0" time="{3}">
+    {4}
+    <testcase classname="wft4galaxy" name="test_{0}" time="{3}"/>
+</testsuite>
+"""
+
+_SHARD_PROPERTIES = """<properties>
+        <property name="shard" value="{0}"/>
+        <property name="shard.partition_digest" value="{1}"/>
+    </properties>"""
+
+
+def _result(duration):
+    result = WorkflowTestResult("id", None, {}, [], None, {}, [], {"out": True}, {})
+    result.duration = duration
+    return result
+
+
+class TestSharding(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.tests = ["test_{0:02d}".format(i) for i in range(10)]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), Shard(2, 4))
+        self.assertEqual(str(parse_shard(" 1 / 3 ")), "1/3")
+        for value in ("0/4", "5/4", "1/0", "1-4", "a/b"):
+            self.assertRaises(ValueError, parse_shard, value)
+
+    def test_partition(self):
+        shards = partition(self.tests, 3)
+        self.assertEqual(sorted(sum(shards, [])), self.tests)
+        # the partition doesn't depend on the order of the tests
+        self.assertEqual(partition(list(reversed(self.tests)), 3), shards)
+        self.assertEqual([len(s) for s in shards], [4, 3, 3])
+        # more shards than tests
+        self.assertEqual(partition(["a"], 2), [["a"], []])
+
+    def test_balanced_partition(self):
+        durations = {"a": 10.0, "b": 6.0, "c": 5.0, "d": 4.0, "e": None}
+        shards = partition(list(durations), 2, durations)
+        loads = [sum(durations[t] or 5.0 for t in s) for s in shards]
+        self.assertEqual(sorted(loads), [15.0, 15.0])
+
+    def test_select_shard(self):
+        selected = [select_shard(self.tests, "{0}/3".format(i)) for i in (1, 2, 3)]
+        self.assertEqual(sorted(sum(selected, [])), self.tests)
+        for s in selected:
+            self.assertEqual(s, [t for t in self.tests if t in s])
+
+    def test_select_balanced_shard(self):
+        db = TimingDatabase(os.path.join(self.folder, "timings.sqlite"))
+        try:
+            db.record_run({"long": _result(100.0), "a": _result(30.0), "b": _result(30.0), "c": _result(30.0)})
+            tests = ["a", "b", "c", "long"]
+            self.assertEqual(select_shard(tests, Shard(1, 2, True), db), ["long"])
+            self.assertEqual(select_shard(tests, Shard(2, 2, True), db), ["a", "b", "c"])
+        finally:
+            db.close()
+
+    def test_partition_digest(self):
+        durations = {"a": 10.0, "b": 5.0}
+        digest = partition_digest(["a", "b"], 2, durations)
+        self.assertEqual(partition_digest(["b", "a"], 2, dict(durations)), digest)
+        self.assertNotEqual(partition_digest(["a", "b"], 2, {"a": 10.0, "b": 20.0}), digest)
+        self.assertNotEqual(partition_digest(["a", "b"], 2), digest)
+        self.assertNotEqual(partition_digest(["a", "b"], 3, durations), digest)
+        self.assertIsNone(get_durations(["a"], Shard(1, 2)))
+
+    def _write_reports(self, reports):
+        filenames = []
+        for name, tests, failures, time, properties in reports:
+            filenames.append(os.path.join(self.folder, "{0}-{1}.xml".format(name, len(filenames))))
+            with open(filenames[-1], "w") as f:
+                f.write(_XUNIT_REPORT.format(name, tests, failures, time, properties))
+        return filenames
+
+    def test_merge_mismatched_reports(self):
+        output = os.path.join(self.folder, "merged.xml")
+        # shards of different partitions
+        filenames = self._write_reports([("a", 1, 0, 1.0, _SHARD_PROPERTIES.format("1/2", "x")),
+                                         ("b", 1, 0, 1.0, _SHARD_PROPERTIES.format("2/2", "y"))])
+        self.assertRaises(ValueError, merge_reports, filenames, output)
+        # the same test in two shards
+        filenames = self._write_reports([("a", 1, 0, 1.0, _SHARD_PROPERTIES.format("1/2", "x")),
+                                         ("a", 1, 0, 1.0, _SHARD_PROPERTIES.format("2/2", "x"))])
+        self.assertRaises(ValueError, merge_reports, filenames, output)
+        filenames = self._write_reports([("a", 1, 0, 1.0, _SHARD_PROPERTIES.format("1/2", "x")),
+                                         ("b", 1, 0, 1.0, _SHARD_PROPERTIES.format("2/2", "x"))])
+        merge_reports(filenames, output)
+        self.assertEqual(parse(output).documentElement.getAttribute("tests"), "2")
+
+    def test_merge_xunit_reports(self):
+        filenames = self._write_reports([("a", 1, 0, 1.5, ""), ("b", 1, 1, 2.5, "")])
+        output = os.path.join(self.folder, "merged.xml")
+        merge_reports(filenames, output)
+        root = parse(output).documentElement
+        self.assertEqual(root.tagName, "testsuites")
+        self.assertEqual(root.getAttribute("tests"), "2")
+        self.assertEqual(root.getAttribute("failures"), "1")
+        self.assertEqual(float(root.getAttribute("time")), 4.0)
+        self.assertEqual(len(root.getElementsByTagName("testcase")), 2)
+
+    def test_merge_timing_databases(self):
+        filenames = []
+        for i, name in enumerate(("a", "b")):
+            filenames.append(os.path.join(self.folder, "{0}.sqlite".format(name)))
+            db = TimingDatabase(filenames[-1])
+            db.record_run({name: _result(i + 1.0)})
+            db.close()
+        output = os.path.join(self.folder, "merged.sqlite")
+        merge_reports(filenames, output)
+        db = TimingDatabase(output)
+        try:
+            self.assertEqual(db.get_durations("a"), [1.0])
+            self.assertEqual(db.get_durations("b"), [2.0])
+        finally:
+            db.close()
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestSharding)
+
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    result = runner.run(suite())
+    return len(result.errors) + len(result.failures)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
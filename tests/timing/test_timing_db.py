@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.common import TimingSpan
+from wft4galaxy.core import WorkflowTestResult
+from wft4galaxy.timings import TimingDatabase
+
+
+def _result(duration, passed=True, phases=None):
+    spans = [TimingSpan(name, start_time=0.0, end_time=d) for name, d in (phases or {}).items()]
+    result = WorkflowTestResult("id", None, {}, [], None, {}, [], {"out": passed}, {}, spans=spans)
+    result.duration = duration
+    return result
+
+
+class TestTimingDatabase(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.db = TimingDatabase(os.path.join(self.folder, "results", "timings.sqlite"), history=3)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.folder)
+
+    def test_expected_duration(self):
+        for d in (10.0, 20.0, 30.0, 40.0):
+            self.db.record_run({"a": _result(d)})
+        self.db.record_run({"a": _result(1.0, passed=False)})
+        # median of the last 3 passed runs
+        self.assertEqual(self.db.expected_duration("a"), 30.0)
+        self.assertIsNone(self.db.expected_duration("unknown"))
+
+    def test_lpt_order(self):
+        self.db.record_run({"short": _result(1.0), "long": _result(100.0), "medium": _result(10.0)})
+        self.assertEqual(self.db.order_tests(["short", "new", "medium", "long"]),
+                         ["new", "long", "medium", "short"])
+
+    def test_stats(self):
+        self.db.record_run({"a": _result(10.0, phases={"wait_jobs": 8.0, "upload_input": 1.0})})
+        self.db.record_run({"a": _result(15.0, phases={"wait_jobs": 12.0, "upload_input": 1.0}),
+                            "b": _result(1.0, passed=False)})
+        stats = self.db.get_stats()
+        self.assertEqual([s["test"] for s in stats], ["a", "b"])
+        self.assertEqual(stats[0]["runs"], 2)
+        self.assertEqual(stats[0]["recent"], [10.0, 15.0])
+        self.assertAlmostEqual(stats[0]["trend"], 50.0)
+        self.assertEqual(list(stats[0]["phases"]), ["wait_jobs", "upload_input"])
+        self.assertEqual(stats[1]["failures"], 1)
+        self.assertEqual(len(self.db.get_stats(limit=1)), 1)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestTimingDatabase)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
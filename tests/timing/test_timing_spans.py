@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import sys
+import time
+import unittest
+
+from wft4galaxy.common import SpanRecorder
+from wft4galaxy.core import WorkflowTestResult
+
+
+class TestSpanRecorder(unittest.TestCase):
+    def test_span(self):
+        recorder = SpanRecorder()
+        with recorder.span("upload_input", key="DataMatrix", filename="data.tsv") as span:
+            time.sleep(0.01)
+        self.assertEqual(recorder.spans, [span])
+        self.assertEqual(span.label, "upload_input[DataMatrix]")
+        self.assertEqual(span.attributes, {"filename": "data.tsv"})
+        self.assertGreaterEqual(span.duration, 0.01)
+
+    def test_span_on_error(self):
+        recorder = SpanRecorder()
+        with self.assertRaises(RuntimeError):
+            with recorder.span("wait_jobs"):
+                raise RuntimeError("job failed")
+        span = recorder.spans[0]
+        self.assertIsNotNone(span.duration)
+        self.assertEqual(span.attributes["error"], "job failed")
+
+    def test_result_timings(self):
+        recorder = SpanRecorder()
+        for name in ("create_history", "upload_input", "upload_input", "cleanup"):
+            with recorder.span(name, key="input" if name == "upload_input" else None):
+                pass
+        result = WorkflowTestResult("id", None, {}, [], None, {}, [], {}, {}, spans=recorder.spans)
+        timings = result.get_timings()
+        self.assertEqual(list(timings), ["create_history", "upload_input[input]", "cleanup"])
+        self.assertAlmostEqual(timings["upload_input[input]"],
+                               recorder.spans[1].duration + recorder.spans[2].duration)
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestSpanRecorder)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
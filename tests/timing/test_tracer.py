@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.common import Tracer, SpanRecorder, get_galaxy_instance
+from wft4galaxy.mock_galaxy import MockGalaxy
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer.get_instance()
+        self.tracer.clear()
+        self.tracer.enable()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.tracer.disable()
+        self.tracer.clear()
+        shutil.rmtree(self.folder)
+
+    def test_disabled(self):
+        self.tracer.disable()
+        with self.tracer.span("run") as span:
+            self.assertIsNone(span)
+        with SpanRecorder().span("create_history"):
+            pass
+        self.assertEqual(self.tracer.spans, [])
+
+    def test_http_spans(self):
+        with MockGalaxy() as galaxy:
+            gi = get_galaxy_instance(galaxy.url, galaxy.api_key)
+            recorder = SpanRecorder()
+            with recorder.span("create_history"):
+                gi.histories.create("wft4galaxy-trace")
+        spans = self.tracer.spans
+        self.assertIn("create_history", [s.label for s in spans])
+        http_spans = [s for s in spans if s.category == "http"]
+        self.assertIn("http[POST /api/histories]", [s.label for s in http_spans])
+        self.assertTrue(all(s.attributes["status_code"] == 200 for s in http_spans))
+
+    def test_chrome_trace(self):
+        with self.tracer.span("run", category="runner"):
+            with SpanRecorder().span("upload_input", key="input", filename="input.txt"):
+                pass
+        filename = os.path.join(self.folder, "trace.json")
+        self.tracer.save(filename, "chrome")
+        with open(filename) as f:
+            events = [e for e in json.load(f)["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual([e["name"] for e in events], ["run", "upload_input[input]"])
+        self.assertEqual(events[1]["args"], {"filename": "input.txt"})
+        self.assertEqual(events[0]["tid"], events[1]["tid"])
+
+    def test_otlp_trace(self):
+        with self.tracer.span("run", category="runner"):
+            with self.tracer.span("load_workflow"):
+                pass
+            with self.assertRaises(RuntimeError):
+                with self.tracer.span("wait_jobs"):
+                    raise RuntimeError("job failed")
+        filename = os.path.join(self.folder, "trace.json")
+        self.tracer.save(filename, "otlp")
+        with open(filename) as f:
+            spans = json.load(f)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        run, load, wait = spans
+        self.assertNotIn("parentSpanId", run)
+        self.assertEqual(load["parentSpanId"], run["spanId"])
+        self.assertEqual(wait["parentSpanId"], run["spanId"])
+        self.assertEqual(wait["status"], {"code": 2, "message": "job failed"})
+        self.assertEqual(len(set(s["traceId"] for s in spans)), 1)
+
+    def test_unsupported_format(self):
+        self.assertRaises(ValueError, self.tracer.save, os.path.join(self.folder, "trace"), "xml")
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestTracer)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from wft4galaxy.core import WorkflowGraph, WorkflowTestCase
+
+EXAMPLE_FOLDER = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "examples", "change_case")
+
+
+def _step(step_id, tool_id=None, *inputs):
+    step = {"id": step_id, "type": "tool" if tool_id else "data_input", "tool_id": tool_id,
+            "label": None if tool_id else "input{0}".format(step_id),
+            "input_connections": {"input{0}".format(i): [{"id": input_id, "output_name": "output"}]
+                                  for i, input_id in enumerate(inputs)}}
+    if tool_id:
+        step["tool_version"] = "1.0"
+        step["workflow_outputs"] = [{"label": "out{0}".format(step_id), "output_name": "output"}]
+    return step
+
+
+class TestWorkflowGraph(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        WorkflowGraph.clear_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_indexes(self):
+        # step IDs don't follow the dependencies: 3 -> 1 -> 2 and 0 -> 2
+        graph = WorkflowGraph({"steps": {"0": _step(0), "3": _step(3),
+                                         "1": _step(1, "cat1", 3), "2": _step(2, "cat1", 1, 0)}})
+        self.assertEqual(graph.topological_order, [0, 3, 1, 2])
+        self.assertEqual(list(graph.input_steps.items()), [("input0", 0), ("input3", 3)])
+        self.assertEqual(graph.tool_steps, {"cat1": [1, 2]})
+        self.assertEqual(graph.output_steps, {"out1": [1], "out2": [2]})
+        self.assertEqual(graph.dependencies[2], [0, 1])
+        self.assertEqual(graph.get_tools(), {"cat1": "1.0"})
+        self.assertEqual(graph.find_unknown_params({1: {}, "2": {}, "cat1": {}, 7: {}, "other": {}}), [7, "other"])
+
+    def test_cycle(self):
+        with self.assertRaises(ValueError):
+            WorkflowGraph({"steps": {"0": _step(0, "cat1", 1), "1": _step(1, "cat1", 0)}})
+
+    def test_example(self):
+        config = WorkflowTestCase(base_path=EXAMPLE_FOLDER, workflow_filename="workflow.ga")
+        graph = config.workflow_graph
+        self.assertEqual(graph.get_tools(), {"ChangeCase": "1.0.0"})
+        self.assertEqual(graph.output_steps, {"OutputText": [1]})
+        self.assertEqual(list(graph.input_steps.values()), [0])
+
+    def test_cache(self):
+        filename = os.path.join(self.folder, "workflow.ga")
+        with open(filename, "w") as f:
+            json.dump({"name": "first", "steps": {"0": _step(0)}}, f)
+        graph = WorkflowGraph.load(filename)
+        self.assertIs(WorkflowGraph.load(filename), graph)
+        # copies of the definition don't affect the cached graph
+        graph.get_definition()["name"] = "changed"
+        self.assertEqual(WorkflowGraph.load(filename).name, "first")
+        # the file is parsed again when modified
+        with open(filename, "w") as f:
+            json.dump({"name": "second", "steps": {"0": _step(0)}}, f)
+        os.utime(filename, (time.time() + 10, time.time() + 10))
+        self.assertEqual(WorkflowGraph.load(filename).name, "second")
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(TestWorkflowGraph)
+
+
+def main():
+    result = unittest.TextTestRunner(verbosity=2).run(suite())
+    return 0 if result.wasSuccessful() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+from __future__ import print_function
+
+import os as _os
+import sys as _sys
+import logging as _logging
+import argparse as _argparse
+
+# wft4galaxy dependencies
+import wft4galaxy.core as _core
+import wft4galaxy.common as _common
+import wft4galaxy.journal as _journal
+import wft4galaxy.app.runner as _runner
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+
+def _make_parser():
+    parser = _argparse.ArgumentParser(description="Wait for and check the outputs of the workflow invocations "
+                                                  "scheduled by an interrupted run of wft4galaxy, "
+                                                  "without submitting them again")
+    parser.add_argument("test", help="Workflow Test Name", nargs="*")
+    parser.add_argument('--server', help='Galaxy server URL', dest="galaxy_url")
+    parser.add_argument('--api-key', help='Galaxy server API KEY', dest="galaxy_api_key")
+    parser.add_argument('-f', '--file', default=_core.WorkflowTestCase.DEFAULT_CONFIG_FILENAME,
+                        help='YAML configuration file of workflow tests (default is {0})'.format(
+                            _core.WorkflowTestCase.DEFAULT_CONFIG_FILENAME))
+    parser.add_argument('-o', '--output', dest="output_folder", metavar="PATH", help='Path of the output folder')
+    parser.add_argument('--journal', default=_journal.DEFAULT_FILENAME, metavar="FILE",
+                        help='Journal of the interrupted run (absolute or relative to the output folder, '
+                             'default is {0})'.format(_journal.DEFAULT_FILENAME))
+    parser.add_argument('--xunit-file', default=None, metavar="FILE_PATH",
+                        help='Write an xUnit report to FILE_PATH (absolute or relative to the output folder)')
+    parser.add_argument('--disable-cleanup', help='Disable cleanup', action='store_true', default=None)
+    parser.add_argument('--enable-logger', help='Enable log messages', action='store_true', default=None)
+    parser.add_argument('--debug', help='Enable debug mode', action='store_true', default=None)
+    return parser
+
+
+def main(args=None):
+    parser = _make_parser()
+    options = parser.parse_args(args if args is not None else _sys.argv[1:])
+    _common.LoggerManager.configure_logging(
+        _logging.DEBUG if options.debug else _logging.INFO if options.enable_logger else _logging.ERROR)
+
+    if not _os.path.isfile(options.file):
+        parser.error("Test file {} doesn't exist or isn't a file".format(options.file))
+    try:
+        return _runner.run_tests(filename=options.file,
+                                 galaxy_url=options.galaxy_url,
+                                 galaxy_api_key=options.galaxy_api_key,
+                                 output_folder=options.output_folder,
+                                 enable_logger=options.enable_logger,
+                                 enable_debug=options.debug,
+                                 disable_cleanup=options.disable_cleanup,
+                                 xunit_file=options.xunit_file,
+                                 tests=options.test,
+                                 journal=options.journal, attach=True)
+    except Exception as e:
+        _logger.error(e)
+        if options.debug:
+            _logger.exception(e)
+        return 1
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
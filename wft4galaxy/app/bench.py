@@ -0,0 +1,344 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import sys as _sys
+import json as _json
+import time as _time
+import shutil as _shutil
+import logging as _logging
+import platform as _platform
+import argparse as _argparse
+import tempfile as _tempfile
+import collections as _collections
+
+from yaml import dump as _yaml_dump
+
+try:
+    import resource as _resource
+except ImportError:
+    _resource = None
+
+# wft4galaxy dependencies
+import wft4galaxy.core as _core
+import wft4galaxy.common as _common
+import wft4galaxy.mock_galaxy as _mock_galaxy
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# version of the format of the benchmark results
+RESULTS_FORMAT_VERSION = 2
+
+# ID of the tool of the synthetic workflow
+BENCH_TOOL_ID = "wft4galaxy_bench"
+BENCH_TOOL_OUTPUT = "out_file1"
+
+# default settings
+DEFAULT_TESTS = 10
+DEFAULT_INPUTS = 1
+DEFAULT_INPUT_SIZE = 1024
+DEFAULT_REPEAT = 1
+DEFAULT_POLLING_INTERVAL = 0.1
+
+# phases of the workflow tests (see :meth:`wft4galaxy.core.WorkflowTestResult.get_timings`)
+# grouped by the runner phase they belong to
+PHASES = _collections.OrderedDict([
+    ("setup", ("import_workflow", "check_tools", "fingerprint", "create_history")),
+    ("upload", ("upload_input", "wait_inputs")),
+    ("invocation", ("schedule_workflow",)),
+    ("polling", ("wait_jobs", "collect_job_metrics")),
+    ("download", ("download_output",)),
+    ("comparison", ("compare_output",)),
+    ("cleanup", ("cleanup",)),
+])
+
+
+def generate_suite(folder, tests=DEFAULT_TESTS, inputs=DEFAULT_INPUTS,
+                   input_size=DEFAULT_INPUT_SIZE, output_size=None):
+    """
+    Generate a synthetic test suite: ``tests`` tests of a workflow which has ``inputs`` inputs
+    and a single tool step producing one output.
+
+    :type folder: str
+    :param folder: the folder where the suite is written
+
+    :type input_size: int
+    :param input_size: size (in bytes) of every input dataset
+
+    :type output_size: int
+    :param output_size: size (in bytes) of the output dataset;
+        if ``None``, the output is a copy of the first input
+
+    :rtype: str
+    :return: the path of the suite definition file
+    """
+    _common.makedirs(_os.path.join(folder, "inputs"))
+    _common.makedirs(_os.path.join(folder, "expected"))
+
+    # workflow definition
+    with open(_os.path.join(folder, "workflow.ga"), "w") as f:
+        _json.dump(_make_workflow(inputs), f, indent=2)
+
+    # shared expected output
+    if output_size is not None:
+        with open(_os.path.join(folder, "expected", "output"), "wb") as f:
+            f.write(_mock_galaxy.make_synthetic_content(
+                output_size, "{0}:{1}".format(BENCH_TOOL_ID, BENCH_TOOL_OUTPUT)))
+
+    workflows = {}
+    for t in range(tests):
+        test_inputs = {}
+        for i in range(inputs):
+            filename = _os.path.join("inputs", "test_{0}_input_{1}.txt".format(t, i))
+            with open(_os.path.join(folder, filename), "wb") as f:
+                f.write(_mock_galaxy.make_synthetic_content(input_size, "{0}:{1}".format(t, i)))
+            test_inputs["input_{0}".format(i)] = filename
+        workflows["bench_{0}".format(t)] = {
+            "file": "workflow.ga", "inputs": test_inputs,
+            # the output of the identity tool is a copy of the first input
+            "expected": {"output": _os.path.join("expected", "output") if output_size is not None
+                         else test_inputs["input_0"]}
+        }
+
+    filename = _os.path.join(folder, "workflow-test-suite.yml")
+    with open(filename, "w") as f:
+        _yaml_dump({"workflows": workflows}, f, default_flow_style=False)
+    return filename
+
+
+def _make_workflow(inputs):
+    steps = {}
+    for i in range(inputs):
+        name = "input_{0}".format(i)
+        steps[str(i)] = {"id": i, "type": "data_input", "name": "Input dataset", "label": None,
+                         "annotation": "", "tool_id": None, "tool_version": None,
+                         "tool_state": _json.dumps({"name": name}), "inputs": [{"name": name, "description": ""}],
+                         "input_connections": {}, "outputs": [], "post_job_actions": {},
+                         "workflow_outputs": [{"label": None, "output_name": "output"}],
+                         "position": {"left": 10, "top": 10 + 100 * i}}
+    steps[str(inputs)] = {
+        "id": inputs, "type": "tool", "name": "wft4galaxy benchmark tool", "label": None, "annotation": "",
+        "tool_id": BENCH_TOOL_ID, "tool_version": "1.0", "tool_state": _json.dumps({"__page__": 0}),
+        "inputs": [{"name": "input_{0}".format(i), "description": ""} for i in range(inputs)],
+        "input_connections": {"input_{0}".format(i): {"id": i, "output_name": "output"} for i in range(inputs)},
+        "outputs": [{"name": BENCH_TOOL_OUTPUT, "type": "txt"}],
+        "post_job_actions": {"RenameDatasetAction" + BENCH_TOOL_OUTPUT: {
+            "action_type": "RenameDatasetAction", "output_name": BENCH_TOOL_OUTPUT,
+            "action_arguments": {"newname": "output"}}},
+        "workflow_outputs": [{"label": "output", "output_name": BENCH_TOOL_OUTPUT}],
+        "position": {"left": 300, "top": 10}}
+    return {"a_galaxy_workflow": "true", "format-version": "0.1", "name": "wft4galaxy-benchmark",
+            "annotation": "", "uuid": "00000000-0000-0000-0000-000000000000", "steps": steps}
+
+
+def run_benchmark(suite_filename, output_folder, repeat=DEFAULT_REPEAT,
+                  polling_interval=DEFAULT_POLLING_INTERVAL, max_active_jobs=None, **server_options):
+    """
+    Run a test suite ``repeat`` times against a :class:`wft4galaxy.mock_galaxy.MockGalaxy` server.
+
+    :type server_options: dict
+    :param server_options: options of the :class:`wft4galaxy.mock_galaxy.MockGalaxy` server
+        (e.g., ``job_duration``, ``failure_rate``, ``seed``)
+
+    :rtype: list
+    :return: the measurements of every run
+    """
+    runs = []
+    with _mock_galaxy.MockGalaxy(**server_options) as galaxy:
+        for r in range(repeat):
+            _logger.info("Benchmark run %d of %d...", r + 1, repeat)
+            # clear the connections and caches shared across runs
+            _common.ConnectionManager.get_instance().close()
+            suite = _core.WorkflowTestSuite.load(suite_filename,
+                                                 output_folder=_os.path.join(output_folder, "run_{0}".format(r)))
+            galaxy.reset_stats()
+            start_time = _time.time()
+            result = suite.run(galaxy_url=galaxy.url, galaxy_api_key=galaxy.api_key,
+                               polling_interval=polling_interval, max_active_jobs=max_active_jobs,
+                               disable_assertions=True)
+            wall_time = _time.time() - start_time
+            stats = galaxy.stats
+            test_results = result.test_case_results if result is not None else []
+            runs.append({
+                "wall_time": wall_time,
+                "tests": {"total": len(suite.workflow_tests),
+                          "passed": len([t for t in test_results if t.passed()]),
+                          "failed": len([t for t in test_results if t.failed()])},
+                "http": {"requests": stats["requests"],
+                         "bytes_uploaded": stats["bytes_received"],
+                         "bytes_downloaded": stats["bytes_sent"],
+                         "endpoints": stats["endpoints"]},
+                "phases": group_by_phase(test_results),
+                "peak_rss": _peak_rss()
+            })
+            _logger.info("Benchmark run %d of %d: %.3f s, %d requests",
+                         r + 1, repeat, wall_time, stats["requests"])
+    return runs
+
+
+def group_by_phase(test_results):
+    """
+    Sum up the durations of the phases of ``test_results`` by runner phase (see ``PHASES``).
+
+    :type test_results: list
+    :param test_results: a list of :class:`wft4galaxy.core.WorkflowTestResult` instances
+
+    :rtype: :class:`collections.OrderedDict`
+    :return: map <PHASE>:<DURATION>, where <DURATION> is the total time (in seconds) spent in <PHASE>
+        by all the tests
+    """
+    phases = _collections.OrderedDict((phase, 0.0) for phase in PHASES)
+    for test_result in test_results:
+        for label, duration in _iteritems(test_result.get_timings()):
+            # strip the key of the phase, e.g. ``upload_input[DataMatrix]``
+            name = label.split("[", 1)[0]
+            phase = [p for p, names in _iteritems(PHASES) if name in names]
+            phase = phase[0] if phase else "other"
+            phases[phase] = phases.get(phase, 0.0) + duration
+    return phases
+
+
+def _peak_rss():
+    """ Return the peak resident set size (in bytes) of this process (mock server included). """
+    if _resource is None:
+        return None
+    peak = _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is expressed in bytes on macOS and in kilobytes elsewhere
+    return peak if _sys.platform == "darwin" else peak * 1024
+
+
+def summarize(runs):
+    """
+    Compute ``min``, ``mean``, ``median`` and ``max`` of the main metrics of a list of runs.
+
+    :rtype: dict
+    """
+    metrics = {
+        "wall_time": [r["wall_time"] for r in runs],
+        "requests": [r["http"]["requests"] for r in runs],
+        "bytes_uploaded": [r["http"]["bytes_uploaded"] for r in runs],
+        "bytes_downloaded": [r["http"]["bytes_downloaded"] for r in runs],
+        "peak_rss": [r["peak_rss"] for r in runs if r["peak_rss"] is not None]
+    }
+    summary = {}
+    for name, values in _iteritems(metrics):
+        if values:
+            values = sorted(values)
+            middle = len(values) // 2
+            summary[name] = {"min": values[0], "max": values[-1], "mean": float(sum(values)) / len(values),
+                             "median": values[middle] if len(values) % 2
+                             else (values[middle - 1] + values[middle]) / 2.0}
+    return summary
+
+
+def compare(results, baseline, stream=_sys.stdout):
+    """
+    Print the relative change of the median metrics of ``results`` with respect to ``baseline``.
+    """
+    print("{0:<20}{1:>16}{2:>16}{3:>10}".format("metric", "baseline", "current", "change"), file=stream)
+    for name, values in sorted(_iteritems(results["summary"])):
+        if name in baseline.get("summary", {}):
+            old, new = baseline["summary"][name]["median"], values["median"]
+            change = "{0:+.1f}%".format(100.0 * (new - old) / old) if old else "n/a"
+            print("{0:<20}{1:>16.3f}{2:>16.3f}{3:>10}".format(name, old, new, change), file=stream)
+
+
+def _version_info():
+    try:
+        path = _os.path.join(_os.path.dirname(_os.path.dirname(_os.path.abspath(__file__))),
+                             "wft4galaxy.properties")
+        with open(path) as fp:
+            return _json.load(fp).get("Repository")
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _check_non_negative_float(value):
+    float_value = float(value)
+    if float_value < 0:
+        raise _argparse.ArgumentTypeError("%s is an invalid non-negative float value" % value)
+    return float_value
+
+
+def _check_positive(value):
+    int_value = int(value)
+    if int_value <= 0:
+        raise _argparse.ArgumentTypeError("%s is an invalid positive int value" % value)
+    return int_value
+
+
+def _make_parser():
+    parser = _argparse.ArgumentParser(description="Benchmark the wft4galaxy runner against a local mock Galaxy")
+    parser.add_argument('--debug', help='Enable debug mode', action='store_true', default=False)
+    parser.add_argument('--tests', type=_check_positive, default=DEFAULT_TESTS, metavar="N",
+                        help='Number of tests of the synthetic suite (default is {0})'.format(DEFAULT_TESTS))
+    parser.add_argument('--inputs', type=_check_positive, default=DEFAULT_INPUTS, metavar="M",
+                        help='Number of inputs of every test (default is {0})'.format(DEFAULT_INPUTS))
+    parser.add_argument('--input-size', type=int, default=DEFAULT_INPUT_SIZE, metavar="BYTES",
+                        help='Size of every input dataset (default is {0})'.format(DEFAULT_INPUT_SIZE))
+    parser.add_argument('--output-size', type=int, default=None, metavar="BYTES",
+                        help='Size of every output dataset (default is the size of the first input)')
+    parser.add_argument('--job-duration', type=_check_non_negative_float, default=0.0, metavar="SECONDS",
+                        help='Running time of every mock Galaxy job')
+    parser.add_argument('--failure-rate', type=_check_non_negative_float, default=0.0, metavar="RATE",
+                        help='Probability that a mock Galaxy job fails')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the mock Galaxy random generator')
+    parser.add_argument('--polling-interval', type=_check_non_negative_float, default=DEFAULT_POLLING_INTERVAL,
+                        metavar="SECONDS", help='Delay between polling requests (default is {0})'
+                        .format(DEFAULT_POLLING_INTERVAL))
+    parser.add_argument('--max-active-jobs', type=_check_positive, default=None, metavar="N",
+                        help='Hold back new workflow invocations while N or more jobs are active')
+    parser.add_argument('--repeat', type=_check_positive, default=DEFAULT_REPEAT, metavar="R",
+                        help='Number of runs of the suite (default is {0})'.format(DEFAULT_REPEAT))
+    parser.add_argument('--label', default=None, help='A label which identifies this benchmark (e.g., a version)')
+    parser.add_argument('--baseline', default=None, metavar="FILE",
+                        help='Results of a previous benchmark to compare with')
+    parser.add_argument('--suite-folder', default=None, metavar="PATH",
+                        help='Folder where the synthetic suite is generated and kept (default is a temporary folder)')
+    parser.add_argument('-o', '--output', default=None, metavar="FILE",
+                        help='JSON file where the results are written (default is the standard output)')
+    return parser
+
+
+def main(args=None):
+    options = _make_parser().parse_args(args if args is not None else _sys.argv[1:])
+    _common.LoggerManager.configure_logging(_logging.DEBUG if options.debug else _logging.INFO)
+
+    folder = options.suite_folder or _tempfile.mkdtemp(prefix="wft4galaxy-bench-")
+    try:
+        _logger.info("Generating the synthetic suite in %s...", folder)
+        suite_filename = generate_suite(folder, tests=options.tests, inputs=options.inputs,
+                                        input_size=options.input_size, output_size=options.output_size)
+        config = {"tests": options.tests, "inputs": options.inputs, "input_size": options.input_size,
+                  "output_size": options.output_size, "job_duration": options.job_duration,
+                  "failure_rate": options.failure_rate, "seed": options.seed,
+                  "polling_interval": options.polling_interval, "max_active_jobs": options.max_active_jobs,
+                  "repeat": options.repeat}
+        runs = run_benchmark(suite_filename, _os.path.join(folder, "results"), repeat=options.repeat,
+                             polling_interval=options.polling_interval, max_active_jobs=options.max_active_jobs,
+                             job_duration=options.job_duration, failure_rate=options.failure_rate,
+                             seed=options.seed, output_size=options.output_size)
+        results = {"format_version": RESULTS_FORMAT_VERSION, "label": options.label,
+                   "timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S"), "wft4galaxy": _version_info(),
+                   "python": _platform.python_version(), "platform": _platform.platform(),
+                   "config": config, "runs": runs, "summary": summarize(runs)}
+    finally:
+        if not options.suite_folder:
+            _shutil.rmtree(folder, ignore_errors=True)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            _json.dump(results, f, indent=2)
+        _logger.info("Benchmark results written to %s", options.output)
+    else:
+        print(_json.dumps(results, indent=2))
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            compare(results, _json.load(f), stream=_sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -0,0 +1,64 @@
+from __future__ import print_function
+
+import sys as _sys
+import logging as _logging
+import argparse as _argparse
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+import wft4galaxy.runner as _runner
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+
+def _check_positive(value):
+    int_value = int(value)
+    if int_value <= 0:
+        raise _argparse.ArgumentTypeError("%s is an invalid positive int value" % value)
+    return int_value
+
+
+def _make_parser():
+    parser = _argparse.ArgumentParser(description="Delete the Galaxy histories and workflows left over "
+                                                  "by previous runs of wft4galaxy")
+    parser.add_argument('--server', help='Galaxy server URL', dest="galaxy_url")
+    parser.add_argument('--api-key', help='Galaxy server API KEY', dest="galaxy_api_key")
+    parser.add_argument('--leftovers', default=_common.CLEANUP_LEFTOVERS_FILENAME, metavar="FILE",
+                        help='File of the deletions not completed by previous runs (default is {0})'
+                        .format(_common.CLEANUP_LEFTOVERS_FILENAME))
+    parser.add_argument('--all', action='store_true', default=False,
+                        help='Also delete all the histories and workflows of the Galaxy user created by wft4galaxy')
+    parser.add_argument('--purge', action='store_true', default=False,
+                        help='Purge the histories deleted by --all')
+    parser.add_argument('--timeout', type=_check_positive, default=_common.CLEANUP_DRAIN_TIMEOUT, metavar="SECONDS",
+                        help='Max time spent waiting for the deletions (default is {0})'
+                        .format(_common.CLEANUP_DRAIN_TIMEOUT))
+    parser.add_argument('--debug', help='Enable debug mode', action='store_true', default=False)
+    return parser
+
+
+def main(args=None):
+    parser = _make_parser()
+    options = parser.parse_args(args if args is not None else _sys.argv[1:])
+    _common.LoggerManager.configure_logging(_logging.DEBUG if options.debug else _logging.INFO)
+
+    try:
+        deleted, leftovers = _common.cleanup_leftovers(options.galaxy_url, options.galaxy_api_key,
+                                                       filename=options.leftovers, timeout=options.timeout)
+        _logger.info("Deleted %d left over resources (%d still to delete)", deleted, leftovers)
+        if options.all:
+            _logger.info("Deleted %d workflows", _runner.cleanup_test_workflows(
+                options.galaxy_url, options.galaxy_api_key, timeout=options.timeout))
+            _logger.info("Deleted %d histories", _runner.cleanup_test_workflow_data(
+                options.galaxy_url, options.galaxy_api_key, purge=options.purge, timeout=options.timeout))
+    except Exception as e:
+        _logger.error(e)
+        if options.debug:
+            _logger.exception(e)
+        return 1
+    return 0 if not leftovers else 1
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -0,0 +1,72 @@
+from __future__ import print_function
+
+import os as _os
+import sys as _sys
+import logging as _logging
+import argparse as _argparse
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+import wft4galaxy.timings as _timings
+import wft4galaxy.sharding as _sharding
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+
+def merge_reports(filenames, output_filename):
+    """
+    Merge the reports of the shards of a test suite: either xUnit reports, merged into a single xUnit report,
+    or timing databases, whose runs are imported into the ``output_filename`` database.
+
+    :type filenames: list
+    :param filenames: the paths of the reports to merge (all of the same kind)
+
+    :type output_filename: str
+    :param output_filename: the path of the merged report
+    """
+    kinds = set(_sharding.is_sqlite_file(f) for f in filenames)
+    if len(kinds) > 1:
+        raise ValueError("Cannot merge xUnit reports with timing databases")
+    if kinds.pop():
+        db = _timings.TimingDatabase(output_filename)
+        try:
+            for filename in filenames:
+                _logger.info("Imported %d runs from %s", db.import_runs(filename), filename)
+        finally:
+            db.close()
+    else:
+        totals = _sharding.merge_xunit_reports(filenames, output_filename)
+        _logger.info("Merged report: %d tests, %d failures, %d errors, %d skipped",
+                     totals["tests"], totals["failures"], totals["errors"], totals["skipped"])
+
+
+def _make_parser():
+    parser = _argparse.ArgumentParser(description="Merge the xUnit reports (or the timing databases) "
+                                                  "written by the shards of a wft4galaxy test suite")
+    parser.add_argument("report", help="xUnit report or timing database of a shard", nargs="+")
+    parser.add_argument('-o', '--output', required=True, metavar="FILE", help='Path of the merged report')
+    parser.add_argument('--debug', help='Enable debug mode', action='store_true', default=False)
+    return parser
+
+
+def main(args=None):
+    parser = _make_parser()
+    options = parser.parse_args(args if args is not None else _sys.argv[1:])
+    _common.LoggerManager.configure_logging(_logging.DEBUG if options.debug else _logging.INFO)
+
+    for filename in options.report:
+        if not _os.path.isfile(filename):
+            parser.error("Report {0} doesn't exist or isn't a file".format(filename))
+    try:
+        merge_reports(options.report, options.output)
+    except Exception as e:
+        _logger.error(e)
+        if options.debug:
+            _logger.exception(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
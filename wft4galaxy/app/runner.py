@@ -2,11 +2,19 @@ from __future__ import print_function
 
 import os as _os
 import sys as _sys
+import json as _json
 import argparse as _argparse
 import logging as _logging
 
 import wft4galaxy.core as _core
+import wft4galaxy.cache as _cache
 import wft4galaxy.common as _common
+import wft4galaxy.metrics as _metrics
+import wft4galaxy.timings as _timings
+import wft4galaxy.sharding as _sharding
+import wft4galaxy.loadtest as _loadtest
+import wft4galaxy.incremental as _incremental
+import wft4galaxy.journal as _journal
 from wft4galaxy.core import OutputFormat
 
 # set logger
@@ -27,6 +35,20 @@ def _check_positive(value):
     return int_value
 
 
+def _check_positive_float(value):
+    float_value = float(value)
+    if float_value <= 0:
+        raise _argparse.ArgumentTypeError("%s is an invalid positive float value" % value)
+    return float_value
+
+
+def _check_shard(value):
+    try:
+        return _sharding.parse_shard(value)
+    except ValueError as e:
+        raise _argparse.ArgumentTypeError(str(e))
+
+
 def _make_parser():
     parser = _argparse.ArgumentParser(add_help=True, formatter_class=_CustomFormatter)
     parser.add_argument("test", help="Workflow Test Name", nargs="*")
@@ -43,10 +65,78 @@ def _make_parser():
     parser.add_argument('--xunit-file', default=None, metavar="FILE_PATH",
                         help='Set the path of the xUnit report file (absolute or relative to the output folder)')
     parser.add_argument('-o', '--output', dest="output_folder", metavar="PATH", help='Path of the output folder')
+    parser.add_argument('--trace', default=None, metavar="FILE",
+                        help='Write a trace of the run (tests, HTTP requests, uploads, downloads, comparisons) to FILE')
+    parser.add_argument('--trace-format', choices=_common.Tracer.FORMATS, default=_common.Tracer.FORMATS[0],
+                        help='Format of the trace file: Chrome Trace Event or OTLP JSON (default is {0})'
+                        .format(_common.Tracer.FORMATS[0]))
 
     parser.add_argument('--max-retries', type=_check_positive, help='Max number of retries', default=None)
     parser.add_argument('--retry-delay', type=_check_positive, help='Delay between retries in seconds', default=None)
     parser.add_argument('--polling-interval', type=_check_positive, help='Delay between polling requests in seconds', default=None)
+    parser.add_argument('--max-request-rate', type=_check_positive_float, default=None, metavar="RATE",
+                        help='Max number of requests per second sent to the Galaxy server')
+    parser.add_argument('--max-active-jobs', type=_check_positive, default=None, metavar="N",
+                        help='Hold back new workflow invocations while the Galaxy user has N or more active jobs')
+    parser.add_argument('--history-pool-size', type=_check_positive, default=None, metavar="N",
+                        help='Reuse up to N Galaxy histories (cleared between tests) instead of creating\n'
+                             'a new history for each test; they are deleted at the end of the run')
+    parser.add_argument('--response-cache', default=None, metavar="FILE",
+                        help='SQLite file where responses about immutable Galaxy resources\n'
+                             '(e.g., finished jobs) are cached across runs')
+    parser.add_argument('--disable-response-cache', action='store_true', default=False,
+                        help='Disable the cache of responses about immutable Galaxy resources')
+    parser.add_argument('--job-metrics-baseline', default=None, metavar="FILE",
+                        help='Collect the metrics (runtime, memory, cores) of the workflow jobs\n'
+                             'and compare them with the baseline values stored in FILE')
+    parser.add_argument('--update-job-metrics-baseline', action='store_true', default=False,
+                        help='Store the collected job metrics as the new baseline values')
+    parser.add_argument('--job-metrics-threshold', type=_check_positive_float, default=_metrics.DEFAULT_THRESHOLD,
+                        metavar="PERCENT",
+                        help='Max accepted increase of a job metric with respect to its baseline (default is {0}%%)'
+                        .format(_metrics.DEFAULT_THRESHOLD))
+    parser.add_argument('--fail-on-job-metrics-regression', action='store_true', default=False,
+                        help='Mark as failed the tests whose job metrics exceed the baseline')
+    parser.add_argument('--timing-db', default=None, metavar="FILE",
+                        help='SQLite file where the durations of the tests are recorded and used to run\n'
+                             'the longest tests first (absolute or relative to the output folder, default is {0})'
+                        .format(_timings.DEFAULT_FILENAME))
+    parser.add_argument('--disable-timing-db', action='store_true', default=False,
+                        help='Do not record the durations of the tests')
+    parser.add_argument('--shard', type=_check_shard, default=None, metavar="INDEX/TOTAL",
+                        help='Run only the INDEX-th of TOTAL disjoint subsets of the tests (e.g., 2/4)')
+    parser.add_argument('--balance-shards', action='store_true', default=False,
+                        help='Split the tests into shards of similar duration according to the timing database\n'
+                             '(requires a --timing-db shared by all the shards)')
+    parser.add_argument('--incremental', action='store_true', default=False,
+                        help='Do not run the tests which already passed with the same workflow, inputs,\n'
+                             'parameters, expected outputs, comparators and tool versions')
+    parser.add_argument('--incremental-cache', default=_incremental.DEFAULT_FILENAME, metavar="FILE",
+                        help='JSON file where the fingerprints of the passed tests are stored\n'
+                             '(absolute or relative to the output folder, default is {0})'
+                        .format(_incremental.DEFAULT_FILENAME))
+    parser.add_argument('--changed-tools-only', action='store_true', default=False,
+                        help='Run only the tests whose workflows use tools installed, uninstalled or updated\n'
+                             'on the Galaxy server since the last snapshot of its tools (see --tool-snapshot)')
+    parser.add_argument('--tool-snapshot', default=_incremental.DEFAULT_TOOL_SNAPSHOT, metavar="FILE",
+                        help='JSON file of the snapshot of the Galaxy tools, updated when all the selected tests pass\n'
+                             '(absolute or relative to the output folder, default is {0})'
+                        .format(_incremental.DEFAULT_TOOL_SNAPSHOT))
+    parser.add_argument('--journal', default=_journal.DEFAULT_FILENAME, metavar="FILE",
+                        help='JSON file where the status and the results of the tests are checkpointed\n'
+                             '(absolute or relative to the output folder, default is {0})'
+                        .format(_journal.DEFAULT_FILENAME))
+    parser.add_argument('--resume', action='store_true', default=False,
+                        help='Resume an interrupted run: do not run the tests completed according to the journal\n'
+                             'and wait for the workflows which the interrupted run scheduled on Galaxy')
+    parser.add_argument('--repeat', type=_check_positive, default=None, metavar="N",
+                        help='Load test: invoke the workflow of the selected test N times, reusing the imported\n'
+                             'workflow and the uploaded inputs, and report throughput, latencies and errors')
+    parser.add_argument('--concurrency', type=_check_positive, default=None, metavar="C",
+                        help='Max number of concurrent invocations of a load test (default is {0})'
+                        .format(_loadtest.DEFAULT_CONCURRENCY))
+    parser.add_argument('--load-test-report', default=None, metavar="FILE",
+                        help='Write the results of the load test to FILE (JSON)')
 
     return parser
 
@@ -61,6 +151,19 @@ def _parse_cli_arguments(parser, cmd_args):
         parser.error("Permission error.  Test file {} isn't accessible for reading".format(args.file))
     if args.xunit_file and args.output_format != OutputFormat.xunit:
         parser.error("--xunit-file can only be specified when using the xUnit output format")
+    if (args.update_job_metrics_baseline or args.fail_on_job_metrics_regression) and not args.job_metrics_baseline:
+        parser.error("--update-job-metrics-baseline and --fail-on-job-metrics-regression "
+                     "require --job-metrics-baseline")
+    if args.balance_shards and not args.shard:
+        parser.error("--balance-shards requires --shard")
+    if args.balance_shards and (not args.timing_db or args.disable_timing_db):
+        parser.error("--balance-shards requires a --timing-db shared by all the shards")
+    if (args.concurrency or args.load_test_report) and not args.repeat:
+        parser.error("--concurrency and --load-test-report require --repeat")
+    if args.repeat and (len(args.test) > 1 or args.shard):
+        parser.error("--repeat requires a single workflow test")
+    if args.repeat and args.resume:
+        parser.error("--resume cannot be used with --repeat")
 
     return args
 
@@ -70,7 +173,10 @@ def run_tests(filename,
               enable_logger=None, enable_debug=None,
               disable_cleanup=None, disable_assertions=None,
               max_retries=None, retry_delay=None, polling_interval=None,
-              output_folder=None, enable_xunit=False, xunit_file=None, tests=None):
+              max_request_rate=None, max_active_jobs=None,
+              output_folder=None, enable_xunit=False, xunit_file=None, tests=None, metrics_baseline=None,
+              timing_db=None, shard=None, result_cache=None, tool_snapshot=None, history_pool_size=None,
+              journal=None, resume=False, attach=False):
     """
     Run a workflow test suite defined in a configuration file.
 
@@ -87,6 +193,43 @@ def run_tests(filename,
     :type disable_assertions: bool
     :param disable_assertions: ``True`` to disable assertions during the execution of the workflow test;
         ``False`` (default) otherwise.
+
+    :type metrics_baseline: :class:`wft4galaxy.metrics.MetricsBaseline`
+    :param metrics_baseline: an optional baseline of job metrics: if provided, the metrics of the workflow jobs
+        are collected and compared with it
+
+    :type timing_db: str
+    :param timing_db: the path (absolute or relative to the output folder) of the SQLite database
+        where the durations of the tests are recorded
+
+    :type shard: :class:`wft4galaxy.sharding.Shard`
+    :param shard: run only the tests of this shard of the suite
+
+    :type result_cache: str
+    :param result_cache: the path (absolute or relative to the output folder) of the file where
+        the fingerprints of the passed tests are stored: tests which already passed with
+        the same fingerprint are not executed
+
+    :type tool_snapshot: str
+    :param tool_snapshot: the path (absolute or relative to the output folder) of the snapshot
+        of the tools installed on the Galaxy server: if provided, only the tests whose workflows use the tools
+        changed since the snapshot are executed; the snapshot is updated when all of them are selected
+        (by ``tests`` and ``shard``) and pass
+
+    :type history_pool_size: int
+    :param history_pool_size: max number of Galaxy histories reused by the tests
+        (see :class:`wft4galaxy.common.HistoryPool`)
+
+    :type journal: str
+    :param journal: the path (absolute or relative to the output folder) of the file where
+        the status and the results of the tests are checkpointed (see :class:`wft4galaxy.journal.RunJournal`)
+
+    :type resume: bool
+    :param resume: ``True`` to resume the run checkpointed in the ``journal``
+
+    :type attach: bool
+    :param attach: ``True`` to only wait for and check the outputs of the workflow invocations scheduled
+        by the run checkpointed in the ``journal``, without submitting any new invocation
     """
 
     # load suite configuration
@@ -95,19 +238,137 @@ def run_tests(filename,
     # log the current configuration
     _logger.info("Configuration: %s", suite)
 
+    # select the tests which use the tools changed since the last snapshot
+    tool_inventory = None
+    affected_tests = None
+    if tool_snapshot:
+        if not _os.path.isabs(tool_snapshot) and not tool_snapshot.startswith("./"):
+            tool_snapshot = _os.path.join(suite.output_folder, tool_snapshot)
+        galaxy_instance = _common.get_galaxy_instance(galaxy_url or suite.galaxy_url,
+                                                      galaxy_api_key or suite.galaxy_api_key)
+        tool_inventory = _incremental.get_tool_inventory(galaxy_instance)
+        previous_inventory = _incremental.load_tool_snapshot(tool_snapshot)
+        if previous_inventory is None:
+            _logger.info("No snapshot of the Galaxy tools found (%s): all the tests are selected", tool_snapshot)
+            affected_tests = list(suite.workflow_tests)
+        else:
+            changed_tools = _incremental.diff_tool_inventories(previous_inventory, tool_inventory)
+            affected_tests = _incremental.select_affected_tests(suite.workflow_tests, changed_tools)
+            _logger.info("Changed tools: %s", ", ".join(changed_tools) or "none")
+            tests = [t for t in (tests or list(suite.workflow_tests)) if t in affected_tests]
+            if len(tests) == 0:
+                _logger.info("No selected workflow test uses the changed tools")
+                if _incremental.is_selection_complete(affected_tests, tests, shard):
+                    _incremental.save_tool_snapshot(tool_snapshot, tool_inventory)
+                return 0
+            _logger.info("Workflow tests affected by the changed tools: %s", ", ".join(tests))
+
+    # open the database of test durations
+    timing_database = None
+    if timing_db:
+        if not _os.path.isabs(timing_db) and not timing_db.startswith("./"):
+            timing_db = _os.path.join(suite.output_folder, timing_db)
+        timing_database = _timings.TimingDatabase(timing_db)
+
+    # load the fingerprints of the passed tests
+    passed_tests = None
+    if result_cache:
+        if not _os.path.isabs(result_cache) and not result_cache.startswith("./"):
+            result_cache = _os.path.join(suite.output_folder, result_cache)
+        passed_tests = _incremental.ResultCache(result_cache)
+
+    # checkpoint the tests of the run
+    run_journal = None
+    if journal:
+        if not _os.path.isabs(journal) and not journal.startswith("./"):
+            journal = _os.path.join(suite.output_folder, journal)
+        run_journal = _journal.RunJournal(journal, resume=resume, attach_only=attach)
+    if attach:
+        if run_journal is None:
+            raise ValueError("A journal is required to attach to the workflow invocations of a run")
+        scheduled_tests = run_journal.get_scheduled_tests()
+        tests = [t for t in (tests or list(suite.workflow_tests)) if t in scheduled_tests]
+        if len(tests) == 0:
+            _logger.info("No workflow invocation to attach to in %s", journal)
+            return 0
+        _logger.info("Attaching to the workflow invocations of the tests: %s", ", ".join(tests))
+
+    # the snapshot of the tools can be updated only if all the affected tests are run (and pass)
+    update_tool_snapshot = tool_inventory is not None \
+        and _incremental.is_selection_complete(affected_tests, tests or list(suite.workflow_tests), shard)
+    if tool_inventory is not None and not update_tool_snapshot:
+        _logger.info("Not all the workflow tests affected by the changed tools are selected: "
+                     "the snapshot of the Galaxy tools will not be updated")
+
     # run the configured test suite
-    result = suite.run(galaxy_url=galaxy_url, galaxy_api_key=galaxy_api_key, verbosity=2, tests=tests,
-                       enable_xunit=enable_xunit or (xunit_file != None), xunit_file=xunit_file,
-                       output_folder=output_folder,
-                       enable_logger=enable_logger, enable_debug=enable_debug,
-                       disable_cleanup=disable_cleanup, disable_assertions=disable_assertions,
-                       max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval)
+    try:
+        result = suite.run(galaxy_url=galaxy_url, galaxy_api_key=galaxy_api_key, verbosity=2, tests=tests,
+                           enable_xunit=enable_xunit or (xunit_file != None), xunit_file=xunit_file,
+                           output_folder=output_folder,
+                           enable_logger=enable_logger, enable_debug=enable_debug,
+                           disable_cleanup=disable_cleanup, disable_assertions=disable_assertions,
+                           max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+                           max_request_rate=max_request_rate, max_active_jobs=max_active_jobs,
+                           metrics_baseline=metrics_baseline, timing_db=timing_database, shard=shard,
+                           result_cache=passed_tests, history_pool_size=history_pool_size,
+                           journal=run_journal)
+    finally:
+        if timing_database is not None:
+            timing_database.close()
     # compute exit code
     exit_code = len([r for r in result.test_case_results if r.failed()])
+    if update_tool_snapshot and exit_code == 0:
+        _incremental.save_tool_snapshot(tool_snapshot, tool_inventory)
     _logger.debug("wft4galaxy.run_tests exiting with code: %s", exit_code)
     return exit_code
 
 
+def run_load_test(filename, test_name=None, repeat=1, concurrency=_loadtest.DEFAULT_CONCURRENCY,
+                  galaxy_url=None, galaxy_api_key=None,
+                  enable_logger=None, enable_debug=None, disable_cleanup=None,
+                  max_retries=None, retry_delay=None, polling_interval=None,
+                  max_request_rate=None, max_active_jobs=None,
+                  output_folder=None, report_filename=None):
+    """
+    Run a load test of a workflow test defined in a configuration file.
+
+    :type test_name: str
+    :param test_name: the name of the workflow test; it can be omitted if the suite has a single test
+
+    :type repeat: int
+    :param repeat: the number of invocations of the workflow
+
+    :type concurrency: int
+    :param concurrency: the max number of concurrent invocations
+
+    :type report_filename: str
+    :param report_filename: optional path of a JSON file where the results are written
+
+    :rtype: int
+    :return: ``0`` if all the invocations succeeded; ``1`` otherwise
+    """
+    suite = _core.WorkflowTestSuite.load(filename, output_folder=output_folder)
+    if test_name is None:
+        if len(suite.workflow_tests) != 1:
+            raise _common.TestConfigError("The suite has {0} workflow tests: select the one to load test"
+                                          .format(len(suite.workflow_tests)))
+        test_name = list(suite.workflow_tests)[0]
+    elif test_name not in suite.workflow_tests:
+        raise _common.TestConfigError("Workflow test '{0}' not found".format(test_name))
+
+    result = suite.workflow_tests[test_name].run_load_test(
+        repeat, concurrency, galaxy_url=galaxy_url, galaxy_api_key=galaxy_api_key,
+        enable_logger=enable_logger, enable_debug=enable_debug, disable_cleanup=disable_cleanup,
+        max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+        max_request_rate=max_request_rate, max_active_jobs=max_active_jobs)
+    result.print_report()
+    if report_filename:
+        with open(report_filename, "w") as f:
+            _json.dump(result.to_dict(), f, indent=2)
+        _logger.info("Load test report written to %s", report_filename)
+    return 1 if result.errors else 0
+
+
 def main():
     try:
         # parse arguments
@@ -123,6 +384,44 @@ def main():
         # log Python version
         _logger.debug("Python version: %s", _sys.version)
 
+        # configure the cache of Galaxy responses
+        if not options.disable_response_cache:
+            _common.ConnectionManager.get_instance().response_cache = \
+                _cache.ResponseCache(filename=options.response_cache)
+
+        # configure the baseline of job metrics
+        metrics_baseline = None
+        if options.job_metrics_baseline:
+            metrics_baseline = _metrics.MetricsBaseline(options.job_metrics_baseline,
+                                                        threshold=options.job_metrics_threshold,
+                                                        update=options.update_job_metrics_baseline,
+                                                        fail_on_regression=options.fail_on_job_metrics_regression)
+
+        # collect the spans of the run
+        if options.trace:
+            _common.Tracer.get_instance().enable()
+
+        # run a load test
+        if options.repeat:
+            code = run_load_test(options.file, test_name=options.test[0] if options.test else None,
+                                 repeat=options.repeat,
+                                 concurrency=options.concurrency or _loadtest.DEFAULT_CONCURRENCY,
+                                 galaxy_url=options.galaxy_url,
+                                 galaxy_api_key=options.galaxy_api_key,
+                                 output_folder=options.output_folder,
+                                 enable_logger=options.enable_logger,
+                                 enable_debug=options.debug,
+                                 disable_cleanup=options.disable_cleanup,
+                                 max_retries=options.max_retries,
+                                 retry_delay=options.retry_delay,
+                                 polling_interval=options.polling_interval,
+                                 max_request_rate=options.max_request_rate,
+                                 max_active_jobs=options.max_active_jobs,
+                                 report_filename=options.load_test_report)
+            if options.trace:
+                _common.Tracer.get_instance().save(options.trace, options.trace_format)
+            _sys.exit(code)
+
         # run tests and collect exit code
         code = run_tests(filename=options.file,
                          galaxy_url=options.galaxy_url,
@@ -134,9 +433,25 @@ def main():
                          max_retries=options.max_retries,
                          retry_delay=options.retry_delay,
                          polling_interval=options.polling_interval,
+                         max_request_rate=options.max_request_rate,
+                         max_active_jobs=options.max_active_jobs,
                          enable_xunit=(options.output_format == OutputFormat.xunit),
                          xunit_file=options.xunit_file,
-                         tests=options.test)
+                         tests=options.test,
+                         metrics_baseline=metrics_baseline,
+                         timing_db=None if options.disable_timing_db
+                         else options.timing_db or _timings.DEFAULT_FILENAME,
+                         shard=_sharding.Shard(options.shard.index, options.shard.total, options.balance_shards)
+                         if options.shard else None,
+                         result_cache=options.incremental_cache if options.incremental else None,
+                         tool_snapshot=options.tool_snapshot if options.changed_tools_only else None,
+                         history_pool_size=options.history_pool_size,
+                         journal=options.journal, resume=options.resume)
+
+        # write the trace of the run
+        if options.trace:
+            _common.Tracer.get_instance().save(options.trace, options.trace_format)
+            _logger.info("Trace of the run written to %s", options.trace)
 
         # report exit code to the system
         _sys.exit(code)
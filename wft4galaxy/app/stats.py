@@ -0,0 +1,88 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import sys as _sys
+import json as _json
+import logging as _logging
+import argparse as _argparse
+
+# wft4galaxy dependencies
+import wft4galaxy.core as _core
+import wft4galaxy.common as _common
+import wft4galaxy.timings as _timings
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default number of reported tests
+DEFAULT_LIMIT = 10
+
+# default number of reported phases per test
+DEFAULT_PHASES = 3
+
+
+def print_report(stats, stream=_sys.stdout, phases=DEFAULT_PHASES):
+    """
+    Print a plain text report of the test durations returned by :meth:`TimingDatabase.get_stats`.
+    """
+    print("{0:<30}{1:>6}{2:>10}{3:>12}{4:>12}{5:>10}  {6}".format(
+        "test", "runs", "failures", "expected", "last", "trend", "recent durations (s)"), file=stream)
+    for s in stats:
+        print("{0:<30}{1:>6}{2:>10}{3:>12.2f}{4:>12.2f}{5:>10}  {6}".format(
+            s["test"], s["runs"], s["failures"], s["expected"], s["last"],
+            "{0:+.1f}%".format(s["trend"]) if s["trend"] is not None else "n/a",
+            " ".join(["{0:.1f}".format(d) for d in s["recent"]])), file=stream)
+        for phase, duration in list(_iteritems(s["phases"]))[:phases]:
+            print("    {0:<26}{1:>40.2f}".format(phase, duration), file=stream)
+
+
+def _check_positive(value):
+    int_value = int(value)
+    if int_value <= 0:
+        raise _argparse.ArgumentTypeError("%s is an invalid positive int value" % value)
+    return int_value
+
+
+def _make_parser():
+    default_db = _os.path.join(_core.WorkflowTestCase.DEFAULT_OUTPUT_FOLDER, _timings.DEFAULT_FILENAME)
+    parser = _argparse.ArgumentParser(description="Report the trends of the durations of workflow tests "
+                                                  "recorded by the wft4galaxy runner")
+    parser.add_argument("test", help="Workflow Test Name", nargs="*")
+    parser.add_argument('--timing-db', default=default_db, metavar="FILE",
+                        help='SQLite file of the recorded durations (default is {0})'.format(default_db))
+    parser.add_argument('--limit', type=_check_positive, default=DEFAULT_LIMIT, metavar="N",
+                        help='Report the N slowest tests (default is {0})'.format(DEFAULT_LIMIT))
+    parser.add_argument('--history', type=_check_positive, default=_timings.DEFAULT_HISTORY, metavar="N",
+                        help='Number of recent runs used to estimate durations and trends (default is {0})'
+                        .format(_timings.DEFAULT_HISTORY))
+    parser.add_argument('--phases', type=int, default=DEFAULT_PHASES, metavar="N",
+                        help='Number of slowest phases reported for every test (default is {0})'
+                        .format(DEFAULT_PHASES))
+    parser.add_argument('--json', action='store_true', default=False, help='Write the report as JSON')
+    parser.add_argument('--debug', help='Enable debug mode', action='store_true', default=False)
+    return parser
+
+
+def main(args=None):
+    parser = _make_parser()
+    options = parser.parse_args(args if args is not None else _sys.argv[1:])
+    _common.LoggerManager.configure_logging(_logging.DEBUG if options.debug else _logging.ERROR)
+
+    if not _os.path.isfile(options.timing_db):
+        parser.error("Timing database {0} doesn't exist".format(options.timing_db))
+    db = _timings.TimingDatabase(options.timing_db, history=options.history)
+    try:
+        stats = db.get_stats(tests=options.test or None, limit=options.limit)
+    finally:
+        db.close()
+
+    if options.json:
+        print(_json.dumps(stats, indent=2))
+    else:
+        print_report(stats, phases=options.phases)
+    return 0
+
+
+if __name__ == '__main__':
+    _sys.exit(main())
@@ -1,14 +1,23 @@
 from __future__ import print_function
 
 import os as _os
+import re as _re
 import sys as _sys
+import time as _time
 import jinja2 as _jinja2
+import collections as _collections
 import logging as _logging
 import argparse as _argparse
 import datetime as _datetime
+import json as _json
+from multiprocessing.pool import ThreadPool as _ThreadPool
+
+# BioBlend dependencies
+from bioblend.galaxy.objects import wrappers as _wrappers
 
 # wft4galaxy dependencies
 import wft4galaxy.core as _core
+import wft4galaxy.cache as _cache
 import wft4galaxy.common as _common
 import wft4galaxy.wrapper as _wrapper
 
@@ -19,6 +28,14 @@ DEFAULT_EXPECTED_FOLDER = "expected"
 DEFAULT_WORFLOW_DEFINITION_FILENAME = "workflow.ga"
 DEFAULT_TEST_DEFINITION_FILENAME = "workflow-test-suite.yml"
 
+# default number of histories processed concurrently in batch mode
+DEFAULT_BATCH_WORKERS = 4
+
+# number of histories fetched per request by the history search
+HISTORY_SEARCH_PAGE_SIZE = 500
+# file which caches the history name-to-ID resolutions
+DEFAULT_HISTORY_CACHE_FILE = _os.path.join(_os.path.expanduser("~"), ".wft4galaxy", "history-cache.json")
+
 # command string
 _OPTION_CMD = "command"
 _TEST_CMD = "generate-test"
@@ -118,21 +135,9 @@ def generate_test_case(config):
     wf = _wrapper.Workflow.load(workflow_definition_filename)
 
     suite = _core.WorkflowTestSuite(config["galaxy_url"], config["galaxy_api_key"])
-    cfg = _core.WorkflowTestCase(name="workflow_test_case_1")
-    cfg.output_folder = _core.WorkflowTestCase.DEFAULT_OUTPUT_FOLDER
+    cfg = _make_test_case("workflow_test_case_1", hw)
     cfg.enable_debug = config["enable_debug"]
 
-    # configure input
-    for ds in hw.input_datasets.values():
-        cfg.add_input(hw.input_dataset_labels[ds.id],
-                      "{0}/{1}".format(DEFAULT_INPUTS_FOLDER, ds.wrapped["name"]), ds.file_ext)
-
-    # configure output
-    for ds in hw.output_datasets.values():
-        cfg.add_expected_output(hw.output_dataset_labels[ds.id],
-                                "{0}/{1}".format(DEFAULT_EXPECTED_FOLDER,
-                                                 "{0}.{1}".format(hw.output_dataset_labels[ds.id], ds.file_ext)))
-
     # append test case to the test suite
     suite.add_workflow_test(cfg)
 
@@ -144,12 +149,254 @@ def generate_test_case(config):
     _logger.info("Saving workflow test definition: done")
 
 
-def _get_history_info(config):
+def _make_test_case(name, hw, prefix=None):
+    """
+    Build the :class:`wft4galaxy.core.WorkflowTestCase` related to a processed history.
+    Paths of the workflow definition and datasets are relative to ``prefix`` (if any).
+    """
+    path = (lambda *p: "/".join(p)) if prefix is None else (lambda *p: "/".join((prefix,) + p))
+    cfg = _core.WorkflowTestCase(name=name)
+    cfg.set_filename(path(DEFAULT_WORFLOW_DEFINITION_FILENAME))
+    cfg.output_folder = _core.WorkflowTestCase.DEFAULT_OUTPUT_FOLDER
+
+    # configure input
+    for ds in hw.input_datasets.values():
+        cfg.add_input(hw.input_dataset_labels[ds.id],
+                      path(DEFAULT_INPUTS_FOLDER, ds.wrapped["name"]), ds.file_ext)
+
+    # configure output
+    for ds in hw.output_datasets.values():
+        cfg.add_expected_output(hw.output_dataset_labels[ds.id],
+                                path(DEFAULT_EXPECTED_FOLDER,
+                                     "{0}.{1}".format(hw.output_dataset_labels[ds.id], ds.file_ext)))
+    return cfg
+
+
+def _make_test_name(history_name, used_names):
+    """ Derive a unique test name (a valid YAML key) from a history name. """
+    name = _re.sub(r"\W+", "_", history_name).strip("_") or "workflow_test_case"
+    candidate, count = name, 1
+    while candidate in used_names:
+        count += 1
+        candidate = "{0}_{1}".format(name, count)
+    used_names.add(candidate)
+    return candidate
+
+
+def generate_test_suite(config, histories):
+    """
+    Generate a single test suite from many histories (batch mode).
+
+    Histories are processed concurrently (``config["workers"]`` at a time) sharing
+    the same Galaxy instance and the same caches of tools and jobs.
+    The workflow definition and the datasets of each history are written to a dedicated
+    subfolder of the output folder, and all the test cases are collected in one definition file.
+
+    :type config: :class:`wft4galaxy.common.Configuration`
+    :param config: the wizard configuration
+
+    :type histories: list
+    :param histories: list of histories (:class:`bioblend.galaxy.objects.wrappers.History`) to process
+
+    :rtype: list
+    :return: the list of histories that could not be processed
+    """
+    gi = config.get("galaxy_instance") or _common.get_galaxy_instance(config["galaxy_url"], config["galaxy_api_key"])
+    output_folder = _os.path.abspath(config["output_folder"])
+    workers = max(1, config.get("workers") or DEFAULT_BATCH_WORKERS)
+    tool_cache, job_cache = {}, {}
+    _common.ConnectionManager.get_instance().ensure_pool_size(workers)
+
+    # assign a test name to each history
+    used_names = set()
+    jobs = [(h, _make_test_name(h.name, used_names)) for h in histories]
+
+    def process(job):
+        history, test_name = job
+        start_time = _time.time()
+        try:
+            hw = _wrapper.History(history.id, galaxy_instance=gi, tool_cache=tool_cache, job_cache=job_cache)
+            test_folder = _os.path.join(output_folder, test_name)
+            make_dir_structure(test_folder)
+            hw.extract_workflow(_os.path.join(test_folder, DEFAULT_WORFLOW_DEFINITION_FILENAME))
+            download_dataset(hw.input_datasets.values(), _os.path.join(test_folder, DEFAULT_INPUTS_FOLDER))
+            download_dataset(hw.output_datasets.values(), _os.path.join(test_folder, DEFAULT_EXPECTED_FOLDER),
+                             labels=hw.output_dataset_labels)
+            return history, _make_test_case(test_name, hw, prefix=test_name), _time.time() - start_time, None
+        except Exception as e:
+            return history, None, _time.time() - start_time, e
+
+    _logger.info("Processing %d histories (workers: %d) ...", len(jobs), workers)
+    start_time = _time.time()
+    suite = _core.WorkflowTestSuite(config["galaxy_url"], config["galaxy_api_key"])
+    failures = []
+    pool = _ThreadPool(min(workers, len(jobs)) or 1)
+    try:
+        for count, (history, cfg, elapsed, error) in enumerate(pool.imap_unordered(process, jobs), 1):
+            if error is None:
+                cfg.enable_debug = config["enable_debug"]
+                suite.add_workflow_test(cfg)
+                _logger.info("[%d/%d] History '%s' (id: %s) processed in %.2fs (test: %s)",
+                             count, len(jobs), history.name, history.id, elapsed, cfg.name)
+            else:
+                failures.append(history)
+                _logger.error("[%d/%d] History '%s' (id: %s) failed after %.2fs: %s",
+                              count, len(jobs), history.name, history.id, elapsed, error)
+    finally:
+        pool.close()
+        pool.join()
+    _logger.info("Processing %d histories: done in %.2fs (tools loaded: %d, jobs loaded: %d, failures: %d)",
+                 len(jobs), _time.time() - start_time, len(tool_cache), len(job_cache), len(failures))
+
+    # write the definition file
+    if len(suite.workflow_tests) > 0:
+        wf_test_file = _os.path.join(output_folder, config["file"])
+        _logger.info("Saving workflow test suite definition (%d tests) ...", len(suite.workflow_tests))
+        write_test_suite_definition_file(wf_test_file, suite)
+        _logger.info("Saving workflow test suite definition: done\n ===> See file: %s", wf_test_file)
+    return failures
+
+
+def _load_history_ids(filename):
+    """ Read a list of history IDs (one per line; blank lines and '#' comments are ignored). """
+    with open(filename) as fp:
+        return [line.split("#", 1)[0].strip() for line in fp if line.split("#", 1)[0].strip()]
+
+
+def _select_histories(config, gi):
+    """
+    Select the histories to process in batch mode: every name in ``config["history"]``
+    has to identify a single history, while ``config["pattern"]`` (a regular expression)
+    and ``config["history_file"]`` (a file of history IDs) can select many of them.
+    """
+    selected = _collections.OrderedDict()
+    for name in config.get("history") or []:
+        if config.get("by_id"):
+            selected[name] = gi.histories.get(name)
+            continue
+        candidates = _search_histories(gi, name)
+        candidates = [h for h in candidates if h.name == name] or candidates
+        if len(candidates) == 1:
+            selected[candidates[0].id] = candidates[0]
+        elif len(candidates) == 0:
+            _logger.warning("No history found with name: \"%s\"", name)
+        else:
+            _logger.warning("More than one history matches the name \"%s\": skipped "
+                            "(use --pattern to select all of them)", name)
+    if config.get("pattern"):
+        regex = _re.compile(config["pattern"])
+        for h in _search_histories(gi):
+            if regex.search(h.name):
+                selected[h.id] = h
+    if config.get("history_file"):
+        for history_id in _load_history_ids(config["history_file"]):
+            if history_id not in selected:
+                selected[history_id] = gi.histories.get(history_id)
+    return list(selected.values())
+
+
+def _is_batch_mode(config):
+    return len(config.get("history") or []) > 1 \
+           or config.get("pattern") is not None or config.get("history_file") is not None
+
+
+class _HistoryCache(object):
+    """
+    Persistent cache of the history name-to-ID resolutions, indexed by Galaxy server URL.
+    """
+
+    def __init__(self, galaxy_url, filename=DEFAULT_HISTORY_CACHE_FILE):
+        self._galaxy_url = galaxy_url
+        self._filename = filename
+        self._data = {}
+        try:
+            with open(filename) as fp:
+                self._data = _json.load(fp)
+        except (IOError, OSError, ValueError):
+            _logger.debug("History cache '%s' not available", filename)
+
+    def get(self, name):
+        return self._data.get(self._galaxy_url, {}).get(name)
+
+    def put(self, name, history_id):
+        if self.get(name) != history_id:
+            self._data.setdefault(self._galaxy_url, {})[name] = history_id
+            self._save()
+
+    def remove(self, name):
+        if self._data.get(self._galaxy_url, {}).pop(name, None) is not None:
+            self._save()
+
+    def _save(self):
+        try:
+            _common.makedirs(_os.path.dirname(self._filename))
+            with open(self._filename, "w") as fp:
+                _json.dump(self._data, fp, indent=2)
+        except (IOError, OSError) as e:
+            _logger.debug("Unable to update the history cache '%s': %s", self._filename, e)
+
+
+def _search_histories(gi, name=None, page_size=HISTORY_SEARCH_PAGE_SIZE):
+    """
+    Return the previews of the histories whose name contains ``name`` (all histories if ``name`` is ``None``).
+    Names are filtered by the Galaxy server and results are fetched page by page.
+
+    :type gi: :class:`wft4galaxy.common.GalaxyInstance`
+    :param gi: the Galaxy instance to query
+
+    :type name: str
+    :param name: the (partial) name of the histories to search
+
+    :rtype: list
+    :return: a list of :class:`bioblend.galaxy.objects.wrappers.HistoryPreview` instances
+    """
+    url = "{0}/histories".format(gi.gi.url)
+    params = {"keys": "id,name,create_time,update_time,deleted", "limit": page_size}
+    if name:
+        params.update({"q": "name-contains", "qv": name})
+    results, offset = [], 0
+    while True:
+        params["offset"] = offset
+        response = gi.gi.make_get_request(url, params=params)
+        response.raise_for_status()
+        page = response.json()
+        # the server-side filter is case-insensitive
+        results.extend([_wrappers.HistoryPreview(h, gi=gi) for h in page])
+        if len(page) < page_size:
+            break
+        offset += page_size
+    _logger.debug("Histories matching '%s': %d", name, len(results))
+    return results
+
+
+def _get_cached_history(cache, name, candidate_histories):
+    """
+    Return the history cached for ``name`` if it is still one of the ``candidate_histories``
+    found by the search, i.e., if it still exists and its name still matches.
+    """
+    history_id = cache.get(name) if cache is not None else None
+    if history_id is not None:
+        for history in candidate_histories:
+            if history.id == history_id:
+                _logger.debug("History '%s' resolved by the local cache: %s", name, history_id)
+                return history
+        cache.remove(name)
+    return None
+
+
+def _get_history_info(config, gi=None):
     result = None
-    gi = _common.get_galaxy_instance(config["galaxy_url"], config["galaxy_api_key"])
+    gi = gi or _common.get_galaxy_instance(config["galaxy_url"], config["galaxy_api_key"])
     _logger.info("Loading Galaxy history info ...")
-    candidate_histories = [h for h in gi.histories.list() if config["history"] in h.name]
+    if config.get("by_id"):
+        return gi.histories.get(config["history"])
+    cache = _HistoryCache(config["galaxy_url"]) if not config.get("disable_history_cache") else None
+    candidate_histories = _search_histories(gi, config["history"])
     candidate_count = len(candidate_histories)
+    # the cache remembers which of the matching histories has been selected
+    result = _get_cached_history(cache, config["history"], candidate_histories)
+    if result is not None:
+        return result
     if candidate_count == 0:
         print("\n No history found with name: \"{0}\"".format(config["history"]))
     elif candidate_count == 1:
@@ -186,6 +433,8 @@ def _get_history_info(config):
                 break
             else:
                 print("\nWARNING: ".ljust(10), "Your choice is not valid!!!")
+    if result is not None and cache is not None:
+        cache.put(config["history"], result.id)
     return result
 
 
@@ -203,6 +452,9 @@ def _make_parser():
     main_parser.add_argument("-f", "--file", default=DEFAULT_TEST_DEFINITION_FILENAME,
                              help="YAML configuration file of workflow tests (default is \"{0}\")"
                              .format(DEFAULT_TEST_DEFINITION_FILENAME))
+    main_parser.add_argument('--response-cache', default=None, metavar="FILE",
+                             help='SQLite file where responses about immutable Galaxy resources '
+                                  '(e.g., tools and finished jobs) are cached across runs')
     # reference to the global options
     epilog = "NOTICE: Type \"{0} -h\" to see the global options.".format(main_parser.prog)
 
@@ -218,7 +470,19 @@ def _make_parser():
                                                         epilog=epilog)
 
     # test_parser.add_argument('workflow-name', help='Workflow name')
-    test_parser.add_argument('history', help='History name')
+    test_parser.add_argument('history', help='History name (more than one enables the batch mode)', nargs="*")
+    test_parser.add_argument('--pattern', default=None, metavar="REGEX",
+                             help='Select all the histories whose name matches REGEX (batch mode)')
+    test_parser.add_argument('--history-file', default=None, metavar="FILE", dest="history_file",
+                             help='File containing the IDs of the histories to process, one per line (batch mode)')
+    test_parser.add_argument('--id', action='store_true', default=False, dest="by_id",
+                             help='Interpret the history arguments as history IDs')
+    test_parser.add_argument('--no-history-cache', action='store_true', default=False,
+                             dest="disable_history_cache",
+                             help='Do not use the local cache of history name-to-ID resolutions')
+    test_parser.add_argument('-j', '--workers', type=int, default=DEFAULT_BATCH_WORKERS, metavar="N",
+                             help='Number of histories processed concurrently in batch mode '
+                                  '(default is {0})'.format(DEFAULT_BATCH_WORKERS))
 
     template_parser = command_subparsers_factory.add_parser(_TEMPLATE_CMD,
                                                             help="Generate a test definition template",
@@ -243,6 +507,10 @@ def main(args=None):
             level=_logging.DEBUG if options.enable_debug else _logging.INFO,
             show_logger_name=True if options.enable_debug else False)
 
+        # configure the cache of Galaxy responses
+        _common.ConnectionManager.get_instance().response_cache = \
+            _cache.ResponseCache(filename=options.response_cache)
+
         # log the configuration
         _logger.debug("CLI config %r", config)
         # update defaults
@@ -253,7 +521,17 @@ def main(args=None):
             print(_common.pformat(config))
         if options.command == _TEMPLATE_CMD:
             generate_template(config)
+        elif options.command == _TEST_CMD and _is_batch_mode(config):
+            config["galaxy_instance"] = _common.get_galaxy_instance(config["galaxy_url"], config["galaxy_api_key"])
+            histories = _select_histories(config, config["galaxy_instance"])
+            if len(histories) == 0:
+                print("\n No history selected")
+            else:
+                generate_test_suite(config, histories)
         elif options.command == _TEST_CMD:
+            if len(options.history) == 0:
+                parser.error("a history name is required")
+            config["history"] = options.history[0]
             history = _get_history_info(config)
             if history is not None:
                 _logger.info("Selected history: %s (id: %r)", history.name, history.id)
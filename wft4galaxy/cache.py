@@ -0,0 +1,324 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import re as _re
+import json as _json
+import time as _time
+import sqlite3 as _sqlite3
+import hashlib as _hashlib
+import threading as _threading
+import collections as _collections
+
+try:
+    from urllib import unquote as _unquote
+except ImportError:
+    from urllib.parse import unquote as _unquote
+
+# HTTP dependencies
+import requests as _requests
+from requests.structures import CaseInsensitiveDict as _CaseInsensitiveDict
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# states of jobs which can no longer change
+JOB_TERMINAL_STATES = ("ok", "error", "deleted", "deleted_new", "skipped")
+
+# default settings
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_DISK_ENTRIES = 50000
+DEFAULT_TTL = 7 * 24 * 3600
+
+
+class CacheRule(object):
+    """
+    Define which responses of a Galaxy API endpoint can be cached.
+
+    :type name: str
+    :param name: a name for the rule (used in log messages): the rules of the same resource type,
+        addressed by different URLs, share the same name
+
+    :type pattern: str
+    :param pattern: a regular expression matching the path of the endpoint URL
+
+    :type condition: callable
+    :param condition: a function ``(resource_id, params, data) -> bool`` which checks whether
+        the decoded JSON response ``data`` of the resource identified by ``resource_id`` can be cached
+    """
+
+    def __init__(self, name, pattern, condition):
+        self.name = name
+        self.pattern = _re.compile(pattern)
+        self.condition = condition
+
+    def match(self, url):
+        """
+        Return the ID of the resource addressed by ``url`` if the URL matches this rule; ``None`` otherwise.
+        """
+        m = self.pattern.search(url.split("?", 1)[0])
+        return _unquote(m.group("id")) if m else None
+
+
+def _is_pinned_tool(tool_id, params, data):
+    # only the I/O details of a given version of a tool are cached: the version is either
+    # requested explicitly (e.g., built-in tools) or part of the ID of a ToolShed tool
+    return str(params.get("io_details")).lower() == "true" \
+           and (bool(params.get("tool_version")) or "/repos/" in tool_id)
+
+
+def _is_finished_job(job_id, params, data):
+    return isinstance(data, dict) and data.get("state") in JOB_TERMINAL_STATES
+
+
+def _is_ok_dataset(dataset_id, params, data):
+    return isinstance(data, dict) and data.get("state") == "ok"
+
+
+# default rules: only responses which cannot change anymore are cached
+DEFAULT_RULES = (
+    CacheRule("tool", r"/api/tools/(?P<id>.+)$", _is_pinned_tool),
+    CacheRule("job", r"/api/jobs/(?P<id>[^/]+)$", _is_finished_job),
+    CacheRule("dataset", r"/api/datasets/(?P<id>[^/]+)$", _is_ok_dataset),
+    CacheRule("dataset", r"/api/histories/[^/]+/contents/(?P<id>[^/]+)$", _is_ok_dataset),
+)
+
+
+class ResponseCache(object):
+    """
+    Cache of the responses of Galaxy API GET requests related to immutable resources
+    (see ``DEFAULT_RULES``): responses are kept in memory (LRU) and, optionally, in a SQLite database
+    to be reused across runs.  Responses are invalidated by the resource they describe,
+    whatever the URL they were requested with (e.g., ``/api/datasets/{id}``
+    and ``/api/histories/{history_id}/contents/{id}``).
+    """
+
+    def __init__(self, filename=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_disk_entries=DEFAULT_MAX_DISK_ENTRIES, ttl=DEFAULT_TTL, rules=DEFAULT_RULES):
+        """
+        Create a new instance of this class.
+
+        :type filename: str
+        :param filename: the path of the SQLite database (``None`` to disable the persistent cache)
+
+        :type max_entries: int
+        :param max_entries: max number of responses kept in memory
+
+        :type max_disk_entries: int
+        :param max_disk_entries: max number of responses kept in the SQLite database
+
+        :type ttl: int
+        :param ttl: time (in seconds) after which a cached response expires (``None`` to never expire)
+
+        :type rules: list
+        :param rules: the list of :class:`CacheRule` defining the cacheable responses
+        """
+        self.filename = filename
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.rules = list(rules)
+        self._lock = _threading.RLock()
+        self._entries = _collections.OrderedDict()
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._db = None
+        if filename:
+            _common.makedirs(_os.path.dirname(_os.path.abspath(filename)))
+            self._db = _sqlite3.connect(filename, check_same_thread=False)
+            columns = [row[1] for row in self._db.execute("PRAGMA table_info(responses)")]
+            if columns and "resource" not in columns:
+                # responses cached by a previous version can't be invalidated by resource
+                self._db.execute("DROP TABLE responses")
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, url TEXT, "
+                             "resource TEXT, response TEXT, created REAL, last_access REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_url ON responses (url)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_resource ON responses (resource)")
+            self._db.commit()
+
+    @property
+    def stats(self):
+        """
+        The counters of this cache: ``hits``, ``misses``, ``stores`` and ``evictions``.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries))
+
+    def get_rule(self, url):
+        """
+        Return the :class:`CacheRule` which matches ``url`` (``None`` if the URL is not cacheable).
+        """
+        for rule in self.rules:
+            if rule.match(url) is not None:
+                return rule
+        return None
+
+    def get_resource(self, url):
+        """
+        Return the identifier of the resource addressed by ``url``, i.e., ``<RULE_NAME>:<RESOURCE_ID>``
+        (``None`` if the URL is not cacheable).
+        """
+        for rule in self.rules:
+            resource_id = rule.match(url)
+            if resource_id is not None:
+                return "{0}:{1}".format(rule.name, resource_id)
+        return None
+
+    def get(self, url, params=None, scope=None):
+        """
+        Return the cached response of a GET request.
+
+        :type url: str
+        :param url: the request URL
+
+        :type params: dict
+        :param params: the request parameters
+
+        :type scope: str
+        :param scope: an identifier of the user (e.g., the API key) which the response belongs to
+
+        :rtype: :class:`requests.Response`
+        :return: the cached response or ``None``
+        """
+        if self.get_rule(url) is None:
+            return None
+        key = self._make_key(url, params, scope)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry["created"]):
+                self._entries.pop(key)
+                entry = None
+            if entry is None and self._db is not None:
+                entry = self._load(key)
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is None:
+                self._counters["misses"] += 1
+                _logger.debug("Response cache MISS: %s (hits: %d, misses: %d)",
+                              url, self._counters["hits"], self._counters["misses"])
+                return None
+            # mark the entry as the most recently used
+            self._entries[key] = self._entries.pop(key)
+            self._counters["hits"] += 1
+            _logger.debug("Response cache HIT: %s (hits: %d, misses: %d)",
+                          url, self._counters["hits"], self._counters["misses"])
+        return _make_response(url, entry)
+
+    def put(self, url, params, response, scope=None):
+        """
+        Store the response of a GET request if it is cacheable.
+
+        :rtype: bool
+        :return: ``True`` if the response has been stored; ``False`` otherwise
+        """
+        rule = self.get_rule(url)
+        if rule is None or response.status_code != 200:
+            return False
+        try:
+            data = response.json()
+        except ValueError:
+            return False
+        if not rule.condition(rule.match(url), params or {}, data):
+            return False
+        entry = {"url": url.split("?", 1)[0], "resource": self.get_resource(url), "status_code": response.status_code,
+                 "headers": dict(response.headers), "encoding": response.encoding,
+                 "content": response.content.decode("utf-8"), "created": _time.time()}
+        key = self._make_key(url, params, scope)
+        with self._lock:
+            self._remember(key, entry)
+            self._counters["stores"] += 1
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                                 (key, entry["url"], entry["resource"], _json.dumps(entry),
+                                  entry["created"], entry["created"]))
+                self._evict_from_disk()
+                self._db.commit()
+        _logger.debug("Response cache STORE (%s): %s", rule.name, url)
+        return True
+
+    def invalidate(self, url):
+        """
+        Remove the cached responses of the resource addressed by ``url`` (requested with any URL)
+        and of its sub-resources.
+        """
+        path = url.split("?", 1)[0]
+        resource = self.get_resource(path)
+        with self._lock:
+            for key in [k for k, e in _iteritems(self._entries)
+                        if e["url"] == path or e["url"].startswith(path + "/")
+                        or (resource is not None and e.get("resource") == resource)]:
+                del self._entries[key]
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses WHERE url = ? OR url LIKE ? OR resource = ?",
+                                 (path, path + "/%", resource))
+                self._db.commit()
+
+    def clear(self):
+        """
+        Remove all the cached responses.
+        """
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def close(self):
+        """
+        Close the SQLite database (if any).
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _expired(self, created):
+        return self.ttl is not None and _time.time() - created > self.ttl
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def _load(self, key):
+        row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entry = _json.loads(row[0])
+        if self._expired(entry["created"]):
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (_time.time(), key))
+        self._db.commit()
+        return entry
+
+    def _evict_from_disk(self):
+        if self.ttl is not None:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (_time.time() - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._db.execute("DELETE FROM responses WHERE key IN "
+                             "(SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                             (count - self.max_disk_entries,))
+            self._counters["evictions"] += count - self.max_disk_entries
+
+    @staticmethod
+    def _make_key(url, params, scope):
+        params = sorted((str(k), str(v)) for k, v in _iteritems(params or {}))
+        return _hashlib.sha1(_json.dumps([scope or "", url, params]).encode("utf-8")).hexdigest()
+
+
+def _make_response(url, entry):
+    response = _requests.Response()
+    response.status_code = entry["status_code"]
+    response.headers = _CaseInsensitiveDict(entry["headers"])
+    response.encoding = entry["encoding"]
+    response._content = entry["content"].encode("utf-8")
+    response.url = url
+    return response
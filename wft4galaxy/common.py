@@ -4,12 +4,26 @@ from past.builtins import basestring as _basestring
 
 import os as _os
 import json as _json
+import atexit as _atexit
+import collections as _collections
 import types as _types
 import logging as _logging
+import time as _time
 import datetime as _datetime
+import threading as _threading
+import contextlib as _contextlib
+import binascii as _binascii
+from multiprocessing.pool import ThreadPool as _ThreadPool
+
+# HTTP dependencies
+import requests as _requests
+from requests.adapters import HTTPAdapter as _HTTPAdapter
 
 # BioBlend dependency
+from bioblend import ConnectionError as _ConnectionError
+from bioblend.galaxy import GalaxyInstance as _GalaxyClient
 from bioblend.galaxy.objects import GalaxyInstance as ObjGalaxyInstance
+from bioblend.galaxy.objects.client import ObjClient as _ObjClient
 
 # Galaxy ENV variable names
 ENV_KEY_GALAXY_URL = "GALAXY_URL"
@@ -19,6 +33,16 @@ ENV_KEY_GALAXY_API_KEY = "GALAXY_API_KEY"
 MAX_RETRIES = 1
 RETRY_DELAY = 10
 POLLING_INTERVAL = 10
+# default max number of pooled connections per Galaxy server
+POOL_SIZE = 10
+
+# cleanup settings
+CLEANUP_WORKERS = 4
+CLEANUP_BATCH_SIZE = 20
+# max time (in seconds) spent waiting for the pending deletions at the end of a run
+CLEANUP_DRAIN_TIMEOUT = 60
+# file where the deletions not completed are recorded for `wft4galaxy-cleanup`
+CLEANUP_LEFTOVERS_FILENAME = _os.path.join(_os.path.expanduser("~"), ".wft4galaxy", "cleanup-leftovers.json")
 
 # map `StandardError` to `Exception` to allow compatibility both with Python2 and Python3
 RunnerStandardError = Exception
@@ -140,6 +164,242 @@ def makedirs(path, check_if_exists=False):
             raise OSError(e.message)
 
 
+class TimingSpan(object):
+    """
+    A timed phase of a workflow test (e.g., the upload of an input dataset).
+
+    :type name: str
+    :param name: the name of the phase
+
+    :type key: str
+    :param key: an optional identifier of the phase instance (e.g., the name of the uploaded input)
+
+    :type category: str
+    :param category: the kind of activity timed by the span (e.g., ``test``, ``http``, ``comparator``)
+
+    :type attributes: dict
+    :param attributes: additional information about the phase
+    """
+
+    def __init__(self, name, key=None, category=None, start_time=None, end_time=None, attributes=None):
+        self.name = name
+        self.key = key
+        self.category = category
+        self.start_time = start_time if start_time is not None else _time.time()
+        self.end_time = end_time
+        self.thread_id = _threading.current_thread().ident
+        self.thread_name = _threading.current_thread().name
+        self.attributes = attributes or {}
+
+    @property
+    def label(self):
+        """ The name of the span followed by its key (if any), e.g. ``upload_input[DataMatrix]``. """
+        return self.name if self.key is None else "{0}[{1}]".format(self.name, self.key)
+
+    @property
+    def duration(self):
+        """ The duration (in seconds) of the span (``None`` if the span is still open). """
+        return self.end_time - self.start_time if self.end_time is not None else None
+
+    def to_dict(self):
+        return {"name": self.name, "key": self.key, "category": self.category,
+                "start_time": self.start_time, "end_time": self.end_time, "duration": self.duration,
+                "thread_id": self.thread_id, "thread_name": self.thread_name, "attributes": self.attributes}
+
+    def __repr__(self):
+        return "<TimingSpan {0}: {1}>".format(self.label, "{0:.3f}s".format(self.duration)
+                                               if self.duration is not None else "open")
+
+
+@_contextlib.contextmanager
+def _timed(span):
+    try:
+        yield span
+    except Exception as e:
+        span.attributes["error"] = str(e)
+        raise
+    finally:
+        span.end_time = _time.time()
+
+
+class SpanRecorder(object):
+    """
+    Collect the :class:`TimingSpan` instances of a workflow test.
+    Spans are also published to the :class:`Tracer`, when it is enabled.
+    """
+
+    def __init__(self, spans=None, category="test"):
+        self.spans = spans if spans is not None else []
+        self.category = category
+
+    @_contextlib.contextmanager
+    def span(self, name, key=None, category=None, **attributes):
+        """
+        Time the enclosed block of code as a new :class:`TimingSpan`.
+        The span is recorded even if the block raises an exception.
+        """
+        span = TimingSpan(name, key=key, category=category or self.category, attributes=attributes)
+        self.spans.append(span)
+        try:
+            with _timed(span):
+                yield span
+        finally:
+            Tracer.get_instance().add(span)
+
+
+class Tracer(object):
+    """
+    Singleton utility class which collects the :class:`TimingSpan` instances of a whole run
+    (tests, HTTP requests, uploads, downloads, comparisons) and exports them as a
+    Chrome Trace Event file or as OTLP JSON, i.e., timelines which can be inspected
+    with standard viewers (e.g., ``chrome://tracing``, Perfetto, Jaeger).
+    Spans are collected only when the tracer is enabled.
+    """
+
+    FORMATS = ("chrome", "otlp")
+
+    _instance = None
+    _instance_lock = _threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Return the singleton instance of this class.
+
+        :rtype: :class:`Tracer`
+        :return: a :class:`Tracer` instance
+        """
+        with cls._instance_lock:
+            if not Tracer._instance:
+                Tracer._instance = Tracer()
+        return Tracer._instance
+
+    def __init__(self):
+        self.enabled = False
+        self._spans = []
+        self._lock = _threading.Lock()
+
+    @property
+    def spans(self):
+        """ The list of collected spans sorted by start time. """
+        with self._lock:
+            return sorted(self._spans, key=lambda s: s.start_time)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            del self._spans[:]
+
+    def add(self, span):
+        """
+        Collect a (terminated) span.
+
+        :type span: :class:`TimingSpan`
+        """
+        if self.enabled:
+            with self._lock:
+                self._spans.append(span)
+
+    @_contextlib.contextmanager
+    def span(self, name, key=None, category=None, **attributes):
+        """
+        Time the enclosed block of code as a new :class:`TimingSpan` (no-op if the tracer is disabled).
+        """
+        if not self.enabled:
+            yield None
+        else:
+            span = TimingSpan(name, key=key, category=category, attributes=attributes)
+            try:
+                with _timed(span):
+                    yield span
+            finally:
+                self.add(span)
+
+    def to_chrome_trace(self):
+        """
+        :rtype: dict
+        :return: the collected spans as Chrome Trace Event ``complete`` events
+        """
+        pid = _os.getpid()
+        events = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": "wft4galaxy"}}]
+        threads = {}
+        for span in self.spans:
+            threads[span.thread_id] = span.thread_name
+            events.append({"name": span.label, "cat": span.category or "wft4galaxy", "ph": "X",
+                           "ts": int(span.start_time * 1e6), "dur": int((span.duration or 0) * 1e6),
+                           "pid": pid, "tid": span.thread_id, "args": span.attributes})
+        for thread_id, thread_name in _iteritems(threads):
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id,
+                           "args": {"name": thread_name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self):
+        """
+        :rtype: dict
+        :return: the collected spans as an OTLP (OpenTelemetry Protocol) JSON trace
+        """
+
+        def attribute(k, v):
+            if isinstance(v, bool):
+                return {"key": k, "value": {"boolValue": v}}
+            if isinstance(v, int):
+                return {"key": k, "value": {"intValue": str(v)}}
+            if isinstance(v, float):
+                return {"key": k, "value": {"doubleValue": v}}
+            return {"key": k, "value": {"stringValue": str(v)}}
+
+        trace_id = _binascii.hexlify(_os.urandom(16)).decode()
+        spans = []
+        # spans of the same thread are nested according to their time intervals
+        stacks = {}
+        for span in sorted(self.spans, key=lambda s: (s.start_time, -(s.end_time or s.start_time))):
+            span_id = _binascii.hexlify(_os.urandom(8)).decode()
+            stack = stacks.setdefault(span.thread_id, [])
+            while stack and stack[-1][0].end_time is not None and stack[-1][0].end_time <= span.start_time:
+                stack.pop()
+            attributes = [attribute("thread.id", span.thread_id), attribute("thread.name", span.thread_name)]
+            if span.category:
+                attributes.append(attribute("category", span.category))
+            if span.key is not None:
+                attributes.append(attribute("key", span.key))
+            attributes.extend(attribute(k, v) for k, v in sorted(_iteritems(span.attributes)))
+            otlp_span = {"traceId": trace_id, "spanId": span_id, "name": span.label, "kind": 1,
+                         "startTimeUnixNano": str(int(span.start_time * 1e9)),
+                         "endTimeUnixNano": str(int((span.end_time or span.start_time) * 1e9)),
+                         "attributes": attributes,
+                         "status": {"code": 2, "message": span.attributes["error"]}
+                         if "error" in span.attributes else {}}
+            if stack:
+                otlp_span["parentSpanId"] = stack[-1][1]
+            stack.append((span, span_id))
+            spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [attribute("service.name", "wft4galaxy")]},
+            "scopeSpans": [{"scope": {"name": "wft4galaxy"}, "spans": spans}]
+        }]}
+
+    def save(self, filename, trace_format="chrome"):
+        """
+        Write the collected spans to the file ``filename``.
+
+        :type filename: str
+        :param filename: the path of the trace file
+
+        :type trace_format: str
+        :param trace_format: ``chrome`` (Chrome Trace Event format) or ``otlp`` (OTLP JSON)
+        """
+        if trace_format not in self.FORMATS:
+            raise ValueError("Unsupported trace format: {0}".format(trace_format))
+        trace = self.to_chrome_trace() if trace_format == "chrome" else self.to_otlp()
+        with open(filename, "w") as f:
+            _json.dump(trace, f)
+
+
 class WorkflowLoader(object):
     """
     Singleton utility class responsible for loading (unloading) workflows to (from) a Galaxy server.
@@ -217,10 +477,7 @@ class WorkflowLoader(object):
         """
         if not self._galaxy_instance:
             raise RuntimeError("WorkflowLoader not initialized")
-        workflow_filename = workflow_test_config.filename \
-            if not workflow_test_config.base_path or _os.path.isabs(workflow_test_config.filename) \
-            else _os.path.join(workflow_test_config.base_path, workflow_test_config.filename)
-        return self.load_workflow_by_filename(workflow_filename,
+        return self.load_workflow_by_filename(workflow_test_config.workflow_filename,
                                               workflow_name, workflow_name_prefix, workflow_name_suffix)
 
     def load_workflow_by_filename(self, workflow_filename,
@@ -236,29 +493,51 @@ class WorkflowLoader(object):
         """
         if not self._galaxy_instance:
             raise RuntimeError("WorkflowLoader not initialized")
+        import wft4galaxy.core as _core
         self._logger.debug("Loading workflow definition from file: %s", workflow_filename)
-        with open(workflow_filename) as f:
-            wf_json = _json.load(f)
+        wf_json = _core.WorkflowGraph.load(workflow_filename).get_definition()
         self._logger.debug("Workflow definition loaded from file: done")
+        return self.load_workflow_definition(wf_json, workflow_name, workflow_name_prefix, workflow_name_suffix,
+                                             filename=workflow_filename)
+
+    def load_workflow_definition(self, wf_json, workflow_name=None, workflow_name_prefix="",
+                                 workflow_name_suffix="", filename=None):
+        """
+        Load a workflow definition (i.e., the content of a ``.ga`` file) to the connected Galaxy server.
+
+        :type wf_json: dict
+        :param wf_json: the workflow definition
+
+        :type workflow_name: str
+        :param workflow_name: an optional name which overrides the default workflow name
+
+        :type filename: str
+        :param filename: the path of the file the definition comes from (only for tracing)
+        """
+        if not self._galaxy_instance:
+            raise RuntimeError("WorkflowLoader not initialized")
         wf_json["name"] = "-".join([workflow_name_prefix,
                                     (workflow_name if workflow_name else wf_json["name"]).replace(" ", ""),
                                     workflow_name_suffix])
         self._logger.debug("Uploading the Workflow to the Galaxy instance ...")
-        wf = self._galaxy_instance.workflows.import_new(wf_json)
+        with Tracer.get_instance().span("load_workflow", key=wf_json["name"], category="workflow_loader",
+                                        filename=filename):
+            wf = self._galaxy_instance.workflows.import_new(wf_json)
         self._logger.debug("Uploading the Workflow to the Galaxy instance: done")
         self._workflows[wf.id] = wf
         return wf
 
     def unload_workflow(self, workflow_id):
         """
-        Unload the workflow identified by ``workflow_id`` from the configured Galaxy server.
+        Unload the workflow identified by ``workflow_id`` from the configured Galaxy server
+        (the workflow is deleted in background by the :class:`CleanupQueue` of the Galaxy instance).
 
         :type workflow_id: str
         :param workflow_id: the ID of the workflow to unload from the connected Galaxy server.
         """
         if not self._galaxy_instance:
             raise RuntimeError("WorkflowLoader not initialized")
-        self._galaxy_instance.workflows.delete(workflow_id)
+        self._galaxy_instance.cleanup_queue.delete_workflow(workflow_id)
         if workflow_id in self._workflows:
             del self._workflows[workflow_id]
 
@@ -272,17 +551,802 @@ class WorkflowLoader(object):
             self.unload_workflow(wf.id)
 
 
+class RateLimiter(object):
+    """
+    Thread-safe token bucket which limits the rate of the requests sent to a Galaxy server.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        """
+        Create a new instance of this class.
+
+        :type rate: float
+        :param rate: max number of requests per second (``None`` to disable the limiter)
+
+        :type burst: int
+        :param burst: max number of requests which can be sent at once
+            after an idle period (by default, the number of requests allowed in one second)
+        """
+        self._lock = _threading.Lock()
+        self.configure(rate, burst)
+
+    @property
+    def rate(self):
+        """
+        The max number of requests per second (``None`` if the limiter is disabled).
+        """
+        return self._rate
+
+    @property
+    def burst(self):
+        """
+        The max number of requests which can be sent at once.
+        """
+        return self._burst
+
+    def configure(self, rate=None, burst=None):
+        """
+        Update the settings of this limiter.
+
+        :type rate: float
+        :param rate: max number of requests per second (``None`` to disable the limiter)
+
+        :type burst: int
+        :param burst: max number of requests which can be sent at once
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError("The request rate must be a positive number (got: {0})".format(rate))
+        with self._lock:
+            self._rate = rate
+            self._burst = (burst or max(1, int(rate))) if rate else None
+            self._tokens = self._burst
+            self._last_update = _time.time()
+
+    def acquire(self):
+        """
+        Wait until a request can be sent.
+
+        :rtype: float
+        :return: the time (in seconds) spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                if not self._rate:
+                    return waited
+                now = _time.time()
+                self._tokens = min(self._burst, self._tokens + (now - self._last_update) * self._rate)
+                self._last_update = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self._rate
+            _time.sleep(delay)
+            waited += delay
+
+
+class AdmissionController(object):
+    """
+    Hold back new workflow invocations while the number of the active jobs (i.e., new, queued or running)
+    owned by the current Galaxy user is above a given threshold.
+
+    An invocation admitted by :meth:`wait` counts as ``weight`` active jobs (e.g., the number of its tool steps)
+    until it is released (see :meth:`release`), i.e., until its jobs are visible in the job queue
+    of the Galaxy server.
+    """
+
+    ACTIVE_JOB_STATES = ("new", "queued", "running")
+
+    _logger = LoggerManager.get_logger(__name__)
+
+    def __init__(self, galaxy_instance, max_active_jobs=None, polling_interval=POLLING_INTERVAL):
+        """
+        Create a new instance of this class.
+
+        :type galaxy_instance: :class:`GalaxyInstance`
+        :param galaxy_instance: the Galaxy instance to monitor
+
+        :type max_active_jobs: int
+        :param max_active_jobs: max number of active jobs (``None`` to admit every invocation)
+
+        :type polling_interval: int
+        :param polling_interval: delay (in seconds) between two consecutive checks of the job queue
+        """
+        self._galaxy_instance = galaxy_instance
+        self._lock = _threading.Lock()
+        self._admitted_lock = _threading.Lock()
+        self._admitted = 0
+        # admissions released but held until the outputs of their invocations leave the `new` state
+        self._pending = []
+        self.max_active_jobs = max_active_jobs
+        self.polling_interval = polling_interval
+
+    def count_active_jobs(self):
+        """
+        Return the number of active jobs owned by the current user
+        (at most ``max_active_jobs``, when the threshold is set).
+
+        :rtype: int
+        """
+        jobs = self._galaxy_instance.gi.jobs.get_jobs(state=list(self.ACTIVE_JOB_STATES),
+                                                      limit=self.max_active_jobs or 500)
+        return len(jobs)
+
+    @property
+    def admitted(self):
+        """ The number of active jobs of the invocations admitted and not released yet. """
+        with self._admitted_lock:
+            return self._admitted
+
+    def wait(self, timeout=None, weight=1):
+        """
+        Wait until a new workflow invocation can be admitted.
+        Once the invocation request is completed (or failed), the caller must call :meth:`release`
+        with the same ``weight``.
+
+        :type timeout: float
+        :param timeout: max time to wait (in seconds); ``None`` to wait indefinitely
+
+        :type weight: int
+        :param weight: number of jobs of the invocation (i.e., of its tool steps); an invocation
+            heavier than ``max_active_jobs`` is admitted only when no other job is active
+
+        :rtype: float
+        :return: the time (in seconds) spent waiting
+        """
+        if not self.max_active_jobs:
+            return 0.0
+        # admissions are checked one at a time and the admitted invocations, whose jobs
+        # may not be visible yet, are counted as active jobs: thus, concurrent invocations
+        # cannot be admitted on the same (old) state of the job queue
+        start_time = _time.time()
+        with self._lock:
+            while True:
+                self._check_pending()
+                active_jobs = self.count_active_jobs() + self.admitted
+                if active_jobs + weight <= self.max_active_jobs or active_jobs == 0:
+                    with self._admitted_lock:
+                        self._admitted += weight
+                    waited = _time.time() - start_time
+                    self._logger.debug("Invocation admitted (active jobs: %d, waited %.2fs)", active_jobs, waited)
+                    return waited
+                if timeout is not None and _time.time() - start_time > timeout:
+                    raise RuntimeError("Timeout expired while waiting for {0} active jobs to complete"
+                                       .format(active_jobs))
+                self._logger.info("Too many active jobs (%d >= %d): waiting before invoking a new workflow...",
+                                  active_jobs, self.max_active_jobs)
+                _time.sleep(self.polling_interval)
+
+    def release(self, weight=1, datasets=None):
+        """
+        Release an invocation admitted by :meth:`wait` with the same ``weight``.
+
+        If the invocation request failed, the admission is released at once. Otherwise, the output
+        ``datasets`` of the invocation must be given: the admission is held until none of them
+        is in the ``new`` state, i.e., until the jobs of the invocation have been created and picked up
+        by the Galaxy server (checked by the following calls of :meth:`wait`).
+
+        :type datasets: list
+        :param datasets: list of :class:`bioblend.galaxy.objects.wrappers.HistoryDatasetAssociation`
+        """
+        with self._admitted_lock:
+            if datasets:
+                self._pending.append((weight, [d.id for d in datasets]))
+            else:
+                self._admitted = max(0, self._admitted - weight)
+
+    def _check_pending(self):
+        """ Release the held admissions whose output datasets are not in the ``new`` state anymore. """
+        with self._admitted_lock:
+            pending = list(self._pending)
+        for admission in pending:
+            weight, dataset_ids = admission
+            try:
+                # datasets never go back to the `new` state: they are checked only once they leave it
+                while dataset_ids and self._galaxy_instance.gi.datasets.show_dataset(
+                        dataset_ids[-1]).get("state") != "new":
+                    dataset_ids.pop()
+            except Exception as e:
+                self._logger.debug("Unable to check the state of dataset %s: %s", dataset_ids[-1], e)
+                del dataset_ids[:]
+            if not dataset_ids:
+                with self._admitted_lock:
+                    self._pending.remove(admission)
+                    self._admitted = max(0, self._admitted - weight)
+
+
+def get_history_jobs(galaxy_instance, history_id, page_size=500):
+    """
+    List all the jobs of the history ``history_id``.
+
+    :type galaxy_instance: :class:`GalaxyInstance`
+    :param galaxy_instance: the Galaxy instance
+
+    :type page_size: int
+    :param page_size: number of jobs retrieved by every request
+
+    :rtype: list
+    :return: the list of job summaries (dicts)
+    """
+    jobs = []
+    while True:
+        page = galaxy_instance.gi.jobs.get_jobs(history_id=history_id, limit=page_size, offset=len(jobs))
+        jobs.extend(page)
+        if len(page) < page_size:
+            return jobs
+
+
+class HistoryPool(object):
+    """
+    Pool of Galaxy histories reused by the workflow tests instead of creating (and deleting)
+    a new history for every test: a history is leased by one test at a time and, when released,
+    it is cleared of its datasets and kept for the next lease.  The histories of the pool
+    are deleted all together at the end of the run (see :meth:`close`).
+    The jobs which ran in a history before it was leased are returned by :meth:`get_previous_jobs`,
+    so that they are not attributed to the test currently holding the history.
+    """
+
+    _logger = LoggerManager.get_logger(__name__)
+
+    def __init__(self, galaxy_instance, size=None):
+        """
+        Create a new instance of this class.
+
+        :type galaxy_instance: :class:`GalaxyInstance`
+        :param galaxy_instance: the Galaxy instance where the histories are created
+
+        :type size: int
+        :param size: max number of idle histories kept in the pool (``None`` or ``0`` to disable the pool)
+        """
+        self._galaxy_instance = galaxy_instance
+        self._lock = _threading.Lock()
+        self._idle = []
+        self._leased = {}
+        self._retired = []
+        self._previous_jobs = {}
+        self.size = size
+
+    @property
+    def enabled(self):
+        return bool(self.size)
+
+    @property
+    def leased(self):
+        """ The number of histories currently leased. """
+        with self._lock:
+            return len(self._leased)
+
+    def lease(self, name):
+        """
+        Lease a history: an idle history of the pool or, if none is available, a new history named ``name``.
+
+        :rtype: :class:`bioblend.galaxy.objects.wrappers.History`
+        """
+        with self._lock:
+            history = self._idle.pop() if self._idle else None
+        if history is None:
+            history = self._galaxy_instance.histories.create(name)
+            self._logger.debug("New history '%s' (id: %s) added to the pool", history.name, history.id)
+        else:
+            self._logger.debug("Reusing the history '%s' (id: %s) of the pool", history.name, history.id)
+        with self._lock:
+            self._leased[history.id] = history
+        return history
+
+    def get_previous_jobs(self, history_id):
+        """
+        :rtype: frozenset
+        :return: the IDs of the jobs which ran in the history ``history_id`` before its current lease
+        """
+        with self._lock:
+            return self._previous_jobs.get(history_id, frozenset())
+
+    def release(self, history):
+        """
+        Return a leased history to the pool, after deleting (and purging) its contents.
+        Histories which cannot be cleared or exceed the pool size are deleted at the end of the run.
+        """
+        with self._lock:
+            history = self._leased.pop(history.id, history)
+        try:
+            job_ids = frozenset(j["id"] for j in get_history_jobs(self._galaxy_instance, history.id))
+            self._clear(history)
+            cleared = True
+        except Exception as e:
+            self._logger.warning("Unable to clear the history %s: %s", history.id, e)
+            cleared = False
+        with self._lock:
+            if cleared:
+                self._previous_jobs[history.id] = job_ids
+            if cleared and len(self._idle) < self.size:
+                self._idle.append(history)
+            else:
+                self._retired.append(history)
+
+    def _clear(self, history):
+        client = self._galaxy_instance.gi.histories
+        for content in client.show_history(history.id, contents=True, deleted=False):
+            if content.get("history_content_type") == "dataset_collection":
+                client.delete_dataset_collection(history.id, content["id"])
+            else:
+                client.delete_dataset(history.id, content["id"], purge=True)
+
+    def close(self):
+        """
+        Delete all the histories of the pool which are not leased
+        (the deletions are queued to the :class:`CleanupQueue` of the Galaxy instance).
+
+        :rtype: int
+        :return: the number of histories queued for deletion
+        """
+        with self._lock:
+            histories = self._idle + self._retired
+            self._idle = []
+            self._retired = []
+        for history in histories:
+            self._galaxy_instance.cleanup_queue.delete_history(history.id)
+        self._logger.debug("Queued %d histories of the pool for deletion", len(histories))
+        return len(histories)
+
+
+class CleanupQueue(object):
+    """
+    Background queue of the deletions of the histories and workflows created by the workflow tests:
+    tests don't wait for their resources to be deleted, while a worker thread deletes them
+    in batches of ``batch_size`` items, ``workers`` at a time.
+
+    Pending deletions are completed by :meth:`drain`, which is also called at the process exit
+    for the queues shared through the :class:`ConnectionManager`: the ones not started within its timeout
+    (or failed) are recorded in the ``leftovers_filename`` file, to be retried later by ``wft4galaxy-cleanup``
+    (see :func:`cleanup_leftovers`).
+    """
+
+    _logger = LoggerManager.get_logger(__name__)
+
+    HISTORY = "history"
+    WORKFLOW = "workflow"
+
+    def __init__(self, galaxy_instance, workers=CLEANUP_WORKERS, batch_size=CLEANUP_BATCH_SIZE,
+                 leftovers_filename=CLEANUP_LEFTOVERS_FILENAME):
+        """
+        Create a new instance of this class.
+
+        :type galaxy_instance: :class:`GalaxyInstance`
+        :param galaxy_instance: the Galaxy instance which the histories and workflows belong to
+
+        :type workers: int
+        :param workers: number of deletions performed concurrently
+
+        :type batch_size: int
+        :param batch_size: max number of deletions dispatched to the workers at a time
+
+        :type leftovers_filename: str
+        :param leftovers_filename: the file where the deletions not completed are recorded
+            (``None`` to only log them)
+        """
+        self._galaxy_instance = galaxy_instance
+        self.workers = workers
+        self.batch_size = batch_size
+        self.leftovers_filename = leftovers_filename
+        self._condition = _threading.Condition(_threading.Lock())
+        self._pending = _collections.deque()
+        self._running = []
+        self._failed = []
+        self._thread = None
+
+    @property
+    def pending(self):
+        """ The number of deletions not completed yet. """
+        with self._condition:
+            return len(self._pending) + len(self._running)
+
+    def delete_history(self, history_id, purge=False):
+        """
+        Queue the deletion of a history.
+
+        :type purge: bool
+        :param purge: ``True`` to also purge the history datasets
+        """
+        self._put({"type": self.HISTORY, "id": history_id, "purge": purge})
+
+    def delete_workflow(self, workflow_id):
+        """ Queue the deletion of a workflow. """
+        self._put({"type": self.WORKFLOW, "id": workflow_id})
+
+    def _put(self, item):
+        with self._condition:
+            self._pending.append(item)
+            if self._thread is None:
+                self._thread = _threading.Thread(target=self._run, name="wft4galaxy-cleanup")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run(self):
+        pool = _ThreadPool(self.workers)
+        try:
+            while True:
+                with self._condition:
+                    while not self._pending:
+                        self._condition.wait()
+                    self._running = [self._pending.popleft()
+                                     for _ in range(min(self.batch_size, len(self._pending)))]
+                    batch = list(self._running)
+                self._logger.debug("Deleting a batch of %d Galaxy resources...", len(batch))
+                try:
+                    pool.map(self._delete, batch)
+                finally:
+                    with self._condition:
+                        self._running = []
+                        self._condition.notify_all()
+        finally:
+            pool.close()
+
+    def _delete(self, item):
+        try:
+            with Tracer.get_instance().span("delete_" + item["type"], key=item["id"], category="cleanup"):
+                if item["type"] == self.HISTORY:
+                    self._galaxy_instance.histories.delete(item["id"], purge=item.get("purge", False))
+                else:
+                    self._galaxy_instance.workflows.delete(item["id"])
+            self._logger.debug("Deleted the %s %s", item["type"], item["id"])
+        except Exception as e:
+            self._logger.warning("Unable to delete the %s %s: %s", item["type"], item["id"], e)
+            with self._condition:
+                self._failed.append(item)
+
+    def drain(self, timeout=CLEANUP_DRAIN_TIMEOUT):
+        """
+        Wait (at most ``timeout`` seconds, or indefinitely if ``None``) for the pending deletions to complete.
+        The deletions not started at the timeout, as well as the failed ones,
+        are removed from the queue and recorded in the ``leftovers_filename`` file
+        (the ones in progress are left to the worker thread: if they fail, they are reported by the next drain).
+
+        :rtype: list
+        :return: the deletions not completed
+        """
+        deadline = _time.time() + timeout if timeout is not None else None
+        with self._condition:
+            while self._pending or self._running:
+                remaining = deadline - _time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            leftovers = self._failed + list(self._pending)
+            self._pending.clear()
+            self._failed = []
+        if leftovers:
+            self._logger.warning("%d Galaxy resources not deleted%s", len(leftovers),
+                                 ": see {0}".format(self.leftovers_filename) if self.leftovers_filename else "")
+            if self.leftovers_filename:
+                url = self._galaxy_instance.gi.base_url
+                save_cleanup_leftovers(self.leftovers_filename,
+                                       load_cleanup_leftovers(self.leftovers_filename) +
+                                       [dict(item, galaxy_url=url) for item in leftovers])
+        return leftovers
+
+
+def load_cleanup_leftovers(filename=CLEANUP_LEFTOVERS_FILENAME):
+    """
+    :rtype: list
+    :return: the deletions recorded in ``filename`` by :meth:`CleanupQueue.drain`
+    """
+    if not _os.path.exists(filename):
+        return []
+    with open(filename) as f:
+        return _json.load(f)
+
+
+def save_cleanup_leftovers(filename, leftovers):
+    """ Write the list of deletions ``leftovers`` to ``filename`` (removing the file if the list is empty). """
+    if not leftovers:
+        if _os.path.exists(filename):
+            _os.remove(filename)
+        return
+    folder = _os.path.dirname(filename)
+    if folder and not _os.path.exists(folder):
+        _os.makedirs(folder)
+    with open(filename, "w") as f:
+        _json.dump(leftovers, f, indent=2)
+
+
+def cleanup_leftovers(galaxy_url=None, galaxy_api_key=None, filename=CLEANUP_LEFTOVERS_FILENAME,
+                      timeout=CLEANUP_DRAIN_TIMEOUT):
+    """
+    Retry the deletions recorded in ``filename`` which refer to the Galaxy server ``galaxy_url``.
+    The ones which fail again are kept in the file.
+
+    :rtype: tuple
+    :return: a pair (<NUMBER_OF_DELETED_RESOURCES>, <NUMBER_OF_LEFTOVERS>)
+    """
+    galaxy_instance = get_galaxy_instance(galaxy_url, galaxy_api_key)
+    url = galaxy_instance.gi.base_url
+    leftovers = load_cleanup_leftovers(filename)
+    others = [item for item in leftovers if item.get("galaxy_url") != url]
+    queue = CleanupQueue(galaxy_instance, leftovers_filename=None)
+    for item in leftovers:
+        if item.get("galaxy_url") == url:
+            if item["type"] == CleanupQueue.HISTORY:
+                queue.delete_history(item["id"], purge=item.get("purge", False))
+            else:
+                queue.delete_workflow(item["id"])
+    failed = [dict(item, galaxy_url=url) for item in queue.drain(timeout)]
+    save_cleanup_leftovers(filename, others + failed)
+    return len(leftovers) - len(others) - len(failed), len(failed)
+
+
+class ConnectionManager(object):
+    """
+    Singleton utility class which provides one shared :class:`requests.Session` for every
+    pair <Galaxy URL, API key>, so that all the Galaxy clients related to the same server and user
+    reuse the same pool of keep-alive connections. Requests to the same server share
+    the same :class:`RateLimiter`, and the deletions of the resources of the same server and user
+    are queued to the same :class:`CleanupQueue`.
+    """
+
+    _instance = None
+    _instance_lock = _threading.Lock()
+
+    _logger = LoggerManager.get_logger(__name__)
+
+    @classmethod
+    def get_instance(cls):
+        """
+        Return the singleton instance of this class.
+
+        :rtype: :class:`ConnectionManager`
+        :return: a :class:`ConnectionManager` instance
+        """
+        with cls._instance_lock:
+            if not ConnectionManager._instance:
+                cls._logger.debug("Creating a new ConnectionManager instance...")
+                ConnectionManager._instance = ConnectionManager()
+        return ConnectionManager._instance
+
+    def __init__(self, pool_size=POOL_SIZE):
+        """
+        Create a new instance of this class.
+
+        :type pool_size: int
+        :param pool_size: max number of connections kept alive for each Galaxy server
+        """
+        self._pool_size = pool_size
+        self._sessions = {}
+        self._rate_limiters = {}
+        self._cleanup_queues = {}
+        self._lock = _threading.Lock()
+        # cache of the responses (see :class:`wft4galaxy.cache.ResponseCache`) shared by all the clients
+        self.response_cache = None
+
+    @property
+    def pool_size(self):
+        """
+        The max number of connections kept alive for each Galaxy server.
+        """
+        return self._pool_size
+
+    @pool_size.setter
+    def pool_size(self, size):
+        with self._lock:
+            self._pool_size = size
+            for session in self._sessions.values():
+                self._mount_adapters(session)
+
+    def ensure_pool_size(self, size):
+        """
+        Grow the connection pools to serve (at least) ``size`` concurrent requests.
+
+        :type size: int
+        :param size: the number of concurrent requests to serve
+        """
+        if size > self._pool_size:
+            self._logger.debug("Updating the size of HTTP connection pools: %d -> %d", self._pool_size, size)
+            self.pool_size = size
+
+    def get_session(self, galaxy_url, galaxy_api_key):
+        """
+        Return the session shared by the clients of a Galaxy server and user.
+
+        :type galaxy_url: str
+        :param galaxy_url: the URL of the Galaxy server
+
+        :type galaxy_api_key: str
+        :param galaxy_api_key: a registered Galaxy API KEY
+
+        :rtype: :class:`requests.Session`
+        :return: the shared session
+        """
+        key = (galaxy_url.rstrip("/"), galaxy_api_key)
+        with self._lock:
+            if key not in self._sessions:
+                self._logger.debug("Creating a new HTTP session for %s (pool size: %d)", key[0], self._pool_size)
+                session = _requests.Session()
+                session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+                self._mount_adapters(session)
+                self._sessions[key] = session
+            return self._sessions[key]
+
+    def get_rate_limiter(self, galaxy_url):
+        """
+        Return the rate limiter of a Galaxy server (disabled unless configured by ``set_rate_limit``).
+
+        :type galaxy_url: str
+        :param galaxy_url: the URL of the Galaxy server
+
+        :rtype: :class:`RateLimiter`
+        :return: the rate limiter shared by all the clients of the Galaxy server
+        """
+        key = galaxy_url.rstrip("/")
+        with self._lock:
+            if key not in self._rate_limiters:
+                self._rate_limiters[key] = RateLimiter()
+            return self._rate_limiters[key]
+
+    def get_cleanup_queue(self, galaxy_instance):
+        """
+        Return the cleanup queue shared by the clients of a Galaxy server and user.
+        The pending deletions of all the shared queues are completed at the process exit.
+
+        :type galaxy_instance: :class:`GalaxyInstance`
+        :param galaxy_instance: the Galaxy instance which the histories and workflows belong to
+
+        :rtype: :class:`CleanupQueue`
+        :return: the shared cleanup queue
+        """
+        key = (galaxy_instance.gi.base_url.rstrip("/"), galaxy_instance.gi.json_headers.get("x-api-key"))
+        with self._lock:
+            if key not in self._cleanup_queues:
+                if not self._cleanup_queues:
+                    _atexit.register(self.drain_cleanup_queues)
+                self._cleanup_queues[key] = CleanupQueue(galaxy_instance)
+            return self._cleanup_queues[key]
+
+    def drain_cleanup_queues(self, timeout=CLEANUP_DRAIN_TIMEOUT):
+        """
+        Wait for the pending deletions of all the shared cleanup queues to complete
+        (see :meth:`CleanupQueue.drain`).
+        """
+        deadline = _time.time() + timeout if timeout is not None else None
+        with self._lock:
+            queues = list(self._cleanup_queues.values())
+        for queue in queues:
+            queue.drain(max(0, deadline - _time.time()) if deadline is not None else None)
+
+    def set_rate_limit(self, galaxy_url, rate, burst=None):
+        """
+        Limit the rate of the requests sent to a Galaxy server.
+
+        :type galaxy_url: str
+        :param galaxy_url: the URL of the Galaxy server
+
+        :type rate: float
+        :param rate: max number of requests per second (``None`` to disable the limit)
+
+        :type burst: int
+        :param burst: max number of requests which can be sent at once
+        """
+        self._logger.debug("Setting the request rate limit of %s: %s req/s", galaxy_url, rate)
+        self.get_rate_limiter(galaxy_url).configure(rate, burst)
+
+    def close(self):
+        """
+        Close all the sessions (and their connections) created by this manager.
+        """
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _mount_adapters(self, session):
+        adapter = _HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+
+class _PooledGalaxyClient(_GalaxyClient):
+    """
+    A :class:`bioblend.galaxy.GalaxyInstance` which sends its requests
+    through the shared session provided by the :class:`ConnectionManager`.
+    Uploads with attached files are sent by bioblend itself.
+    """
+
+    def __init__(self, url, key=None, email=None, password=None):
+        super(_PooledGalaxyClient, self).__init__(url, key=key, email=email, password=password)
+        self.session = ConnectionManager.get_instance().get_session(self.base_url, key)
+        self.rate_limiter = ConnectionManager.get_instance().get_rate_limiter(self.base_url)
+
+    @property
+    def response_cache(self):
+        return ConnectionManager.get_instance().response_cache
+
+    @property
+    def _cache_scope(self):
+        return self.json_headers.get("x-api-key") or self.json_headers.get("Authorization")
+
+    def _invalidate(self, url):
+        if self.response_cache is not None:
+            self.response_cache.invalidate(url)
+
+    def _send(self, method, url, payload=None, **kwargs):
+        self.rate_limiter.acquire()
+        if method != "GET":
+            self._invalidate(url)
+            kwargs.update(data=_json.dumps(payload) if payload is not None else None, allow_redirects=False)
+        kwargs.setdefault("headers", self.json_headers)
+        kwargs.setdefault("timeout", getattr(self, "timeout", None))
+        kwargs.setdefault("verify", self.verify)
+        with Tracer.get_instance().span("http", key="{0} {1}".format(method, url.replace(self.base_url, "", 1)),
+                                        category="http") as span:
+            response = self.session.request(method, url, **kwargs)
+            if span is not None:
+                span.attributes["status_code"] = response.status_code
+        return response
+
+    def make_get_request(self, url, **kwargs):
+        cache = self.response_cache if not kwargs.get("stream") else None
+        if cache is not None:
+            response = cache.get(url, kwargs.get("params"), scope=self._cache_scope)
+            if response is not None:
+                return response
+        response = self._send("GET", url, **kwargs)
+        if cache is not None:
+            cache.put(url, kwargs.get("params"), response, scope=self._cache_scope)
+        return response
+
+    def make_post_request(self, url, payload=None, params=None, files_attached=False):
+        if files_attached:
+            self.rate_limiter.acquire()
+            self._invalidate(url)
+            return super(_PooledGalaxyClient, self).make_post_request(url, payload=payload, params=params,
+                                                                      files_attached=True)
+        return self._decode(self._send("POST", url, payload, params=params))
+
+    def make_delete_request(self, url, payload=None, params=None):
+        return self._send("DELETE", url, payload, params=params)
+
+    def make_put_request(self, url, payload=None, params=None):
+        return self._decode(self._send("PUT", url, payload, params=params))
+
+    def make_patch_request(self, url, payload=None, params=None):
+        return self._decode(self._send("PATCH", url, payload, params=params))
+
+    @staticmethod
+    def _decode(response):
+        if response.status_code == 200:
+            try:
+                return response.json()
+            except ValueError as e:
+                raise _ConnectionError("Request was successful, but cannot decode the response content: {0}"
+                                       .format(e), body=response.content, status_code=response.status_code)
+        raise _ConnectionError("Unexpected HTTP status code: {0}".format(response.status_code),
+                               body=response.text, status_code=response.status_code)
+
+
 # GalaxyInstance wrapper
 class GalaxyInstance(ObjGalaxyInstance):
     def __init__(self, url, api_key=None, email=None, password=None,
-                 max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, polling_interval=POLLING_INTERVAL):
+                 max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, polling_interval=POLLING_INTERVAL,
+                 max_request_rate=None, max_active_jobs=None, history_pool_size=None):
         super(GalaxyInstance, self).__init__(url, api_key, email, password)
+        # route requests through the session shared by all clients of this server
+        client = _PooledGalaxyClient(url, key=api_key, email=email, password=password)
+        self.gi = client
+        for obj_client in vars(self).values():
+            if isinstance(obj_client, _ObjClient):
+                obj_client.gi = client
+        self._admission_controller = AdmissionController(self, polling_interval=POLLING_INTERVAL)
+        self._history_pool = HistoryPool(self, size=history_pool_size)
+        self._cleanup_queue = ConnectionManager.get_instance().get_cleanup_queue(self)
         if max_retries is not None:
             self.max_retries = max_retries
         if retry_delay is not None:
             self.retry_delay = retry_delay
         if polling_interval is not None:
             self.polling_interval = polling_interval
+        if max_request_rate is not None:
+            self.max_request_rate = max_request_rate
+        if max_active_jobs is not None:
+            self.max_active_jobs = max_active_jobs
 
     @property
     def max_retries(self):
@@ -307,6 +1371,43 @@ class GalaxyInstance(ObjGalaxyInstance):
     @polling_interval.setter
     def polling_interval(self, interval):
         self._polling_interval = interval
+        self._admission_controller.polling_interval = interval
+
+    @property
+    def max_request_rate(self):
+        return self.gi.rate_limiter.rate
+
+    @max_request_rate.setter
+    def max_request_rate(self, rate):
+        ConnectionManager.get_instance().set_rate_limit(self.gi.base_url, rate)
+
+    @property
+    def max_active_jobs(self):
+        return self._admission_controller.max_active_jobs
+
+    @max_active_jobs.setter
+    def max_active_jobs(self, v):
+        self._admission_controller.max_active_jobs = v
+
+    @property
+    def admission_controller(self):
+        return self._admission_controller
+
+    @property
+    def history_pool_size(self):
+        return self._history_pool.size
+
+    @history_pool_size.setter
+    def history_pool_size(self, v):
+        self._history_pool.size = v
+
+    @property
+    def history_pool(self):
+        return self._history_pool
+
+    @property
+    def cleanup_queue(self):
+        return self._cleanup_queue
 
 
 def configure_env_galaxy_server_instance(config, options, base_config=None):
@@ -326,7 +1427,8 @@ def configure_env_galaxy_server_instance(config, options, base_config=None):
 
 
 def get_galaxy_instance(galaxy_url=None, galaxy_api_key=None,
-                        max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, polling_interval=POLLING_INTERVAL):
+                        max_retries=MAX_RETRIES, retry_delay=RETRY_DELAY, polling_interval=POLLING_INTERVAL,
+                        max_request_rate=None, max_active_jobs=None, history_pool_size=None):
     """
     Private utility function to instantiate and configure a :class:`bioblend.GalaxyInstance`
 
@@ -336,6 +1438,16 @@ def get_galaxy_instance(galaxy_url=None, galaxy_api_key=None,
     :type galaxy_api_key: str
     :param galaxy_api_key: a registered Galaxy API KEY
 
+    :type max_request_rate: float
+    :param max_request_rate: max number of requests per second sent to the Galaxy server
+
+    :type max_active_jobs: int
+    :param max_active_jobs: max number of active jobs of the user above which
+        new workflow invocations are held back
+
+    :type history_pool_size: int
+    :param history_pool_size: max number of histories reused by the workflow tests (see :class:`HistoryPool`)
+
     :rtype: :class:`bioblend.objects.GalaxyInstance`
     :return: a new :class:`bioblend.objects.GalaxyInstance` instance
     """
@@ -357,4 +1469,6 @@ def get_galaxy_instance(galaxy_url=None, galaxy_api_key=None,
 
     # initialize the galaxy instance
     return GalaxyInstance(galaxy_url, galaxy_api_key,
-                          max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval)
+                          max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+                          max_request_rate=max_request_rate, max_active_jobs=max_active_jobs,
+                          history_pool_size=history_pool_size)
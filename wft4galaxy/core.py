@@ -6,8 +6,13 @@ from past.builtins import basestring as _basestring
 
 import os as _os
 import sys as _sys
+import copy as _copy
 import logging as _logging
+import itertools as _itertools
+import threading as _threading
+from json import load as _json_load
 from json import dumps as _json_dumps
+from collections import OrderedDict as _OrderedDict
 from uuid import uuid1 as  _uuid1
 
 from yaml import dump as _yaml_dump
@@ -15,6 +20,7 @@ from yaml import load as _yaml_load
 
 # wft4galaxy dependencies
 import wft4galaxy.common as _common
+import wft4galaxy.metrics as _metrics
 
 # set logger
 _logger = _common.LoggerManager.get_logger(__name__)
@@ -57,6 +63,217 @@ class FileFormats(object):
         return isinstance(file_format, _basestring) and file_format.upper() == FileFormats.JSON
 
 
+class WorkflowGraph(object):
+    """
+    The step graph of a workflow definition (i.e., of a ``.ga`` file), parsed once and indexed.
+
+    Use :meth:`WorkflowGraph.load` to get the graph of a file: graphs are cached and parsed again only
+    when the file is modified.  Graphs are shared and must not be modified: :meth:`get_definition`
+    returns a copy of the workflow definition which can be freely changed.
+
+    :type definition: dict
+    :param definition: the content of a ``.ga`` file
+
+    :type filename: str
+    :param filename: the path of the file the definition comes from (optional)
+    """
+
+    # types of the workflow steps which represent workflow inputs
+    INPUT_STEP_TYPES = frozenset(["data_input", "data_collection_input", "parameter_input"])
+
+    # cache of the parsed files: map <ABSOLUTE_PATH>:(<MTIME>, <WorkflowGraph>)
+    _cache = {}
+    _cache_lock = _threading.Lock()
+
+    def __init__(self, definition, filename=None):
+        self._definition = definition
+        self.filename = filename
+        # map <STEP_ID>:<STEP> (ordered by step ID)
+        self.steps = _OrderedDict(sorted([(int(step_id), step)
+                                          for step_id, step in _iteritems(definition.get("steps", {}))]))
+        # map <STEP_ID>:<IDS_OF_THE_STEPS_IT_DEPENDS_ON>
+        self.dependencies = {}
+        # map <TOOL_ID>:<STEP_IDS>
+        self.tool_steps = {}
+        # map <OUTPUT_NAME>:<STEP_IDS>
+        self.output_steps = {}
+        # map <INPUT_LABEL>:<STEP_ID>
+        self.input_steps = _OrderedDict()
+        for step_id, step in _iteritems(self.steps):
+            self.dependencies[step_id] = sorted(set(
+                int(c["id"]) for connection in (step.get("input_connections") or {}).values()
+                for c in (connection if isinstance(connection, list) else [connection])))
+            if step.get("tool_id"):
+                self.tool_steps.setdefault(step["tool_id"], []).append(step_id)
+            for name in self.get_step_outputs(step):
+                self.output_steps.setdefault(name, []).append(step_id)
+            if step.get("type") in self.INPUT_STEP_TYPES:
+                self.input_steps[self.get_input_label(step)] = step_id
+        self.topological_order = self._sort_steps()
+
+    def __repr__(self):
+        return "WorkflowGraph: name={0}, file={1}, steps={2}".format(self.name, self.filename, len(self.steps))
+
+    @property
+    def name(self):
+        return self._definition.get("name")
+
+    @property
+    def definition(self):
+        """
+        The (shared) workflow definition: use :meth:`get_definition` to get a copy which can be modified.
+        """
+        return self._definition
+
+    def get_definition(self):
+        """
+        :rtype: dict
+        :return: a copy of the workflow definition
+        """
+        return _copy.deepcopy(self._definition)
+
+    def get_tools(self, step_ids=None):
+        """
+        :type step_ids: list
+        :param step_ids: the steps to consider (by default, all the steps)
+
+        :rtype: dict
+        :return: map <TOOL_ID>:<TOOL_VERSION> of the tools used by the workflow steps
+        """
+        steps = self.steps if step_ids is None else {step_id: self.steps[step_id] for step_id in step_ids}
+        return {step["tool_id"]: step.get("tool_version") for step in steps.values() if step.get("tool_id")}
+
+    def find_output_steps(self, output_names):
+        """
+        :type output_names: list
+        :param output_names: the names of the outputs (e.g., the expected outputs of a test)
+
+        :rtype: tuple
+        :return: a pair (<STEP_IDS>, <UNMATCHED_OUTPUTS>) where <STEP_IDS> is the set of the IDs of the steps
+            producing the ``output_names`` and <UNMATCHED_OUTPUTS> lists the outputs no step produces
+        """
+        step_ids = set()
+        unmatched = []
+        for name in output_names:
+            if name in self.output_steps:
+                step_ids.update(self.output_steps[name])
+            else:
+                unmatched.append(name)
+        return step_ids, sorted(unmatched)
+
+    def upstream(self, step_ids):
+        """
+        :rtype: set
+        :return: the IDs of the ``step_ids`` and of all the steps they (directly or indirectly) depend on
+        """
+        closure = set()
+        pending = list(step_ids)
+        while pending:
+            step_id = pending.pop()
+            if step_id not in closure:
+                closure.add(step_id)
+                pending.extend(self.dependencies[step_id])
+        return closure
+
+    def find_unknown_params(self, params):
+        """
+        :type params: dict
+        :param params: the step parameters of a workflow test, i.e., map <STEP_ID_OR_TOOL_ID>:<PARAMS>
+
+        :rtype: list
+        :return: the keys of ``params`` which identify neither a step nor a tool of the workflow
+        """
+        unknown = []
+        for key in (params or {}):
+            try:
+                if int(key) in self.steps:
+                    continue
+            except (TypeError, ValueError):
+                if key in self.tool_steps:
+                    continue
+            unknown.append(key)
+        return unknown
+
+    def _sort_steps(self):
+        order = []
+        pending = {step_id: len(dependencies) for step_id, dependencies in _iteritems(self.dependencies)}
+        dependents = {}
+        for step_id, dependencies in _iteritems(self.dependencies):
+            for dependency in dependencies:
+                if dependency not in pending:
+                    raise ValueError("Step {0} depends on the unknown step {1}".format(step_id, dependency))
+                dependents.setdefault(dependency, []).append(step_id)
+        ready = sorted(step_id for step_id, count in _iteritems(pending) if count == 0)
+        while ready:
+            step_id = ready.pop(0)
+            order.append(step_id)
+            for dependent in dependents.get(step_id, []):
+                pending[dependent] -= 1
+                if pending[dependent] == 0:
+                    ready.append(dependent)
+            ready.sort()
+        if len(order) < len(self.steps):
+            raise ValueError("The workflow steps {0} form a cycle".format(
+                ", ".join([str(step_id) for step_id in self.steps if step_id not in order])))
+        return order
+
+    @staticmethod
+    def get_step_outputs(step):
+        """
+        :rtype: set
+        :return: the names which the datasets produced by a step can have, i.e., the names assigned
+            by its ``RenameDatasetAction`` post job actions and the labels of its workflow outputs
+        """
+        names = set()
+        for action in (step.get("post_job_actions") or {}).values():
+            if action.get("action_type") == "RenameDatasetAction":
+                names.add(action["action_arguments"]["newname"])
+        for workflow_output in step.get("workflow_outputs") or []:
+            if workflow_output.get("label"):
+                names.add(workflow_output["label"])
+        return names
+
+    @staticmethod
+    def get_input_label(step):
+        """
+        :rtype: str
+        :return: the label of the workflow input represented by an input step
+        """
+        if step.get("label"):
+            return step["label"]
+        inputs = step.get("inputs") or []
+        return inputs[0]["name"] if inputs else step.get("name")
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Return the graph of the workflow defined in ``filename``,
+        which is parsed only if it has been modified since the last call.
+
+        :type filename: str
+        :param filename: the path of the ``.ga`` file
+
+        :rtype: :class:`WorkflowGraph`
+        """
+        path = _os.path.abspath(filename)
+        mtime = _os.path.getmtime(path)
+        with cls._cache_lock:
+            cached = cls._cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        _logger.debug("Parsing workflow definition %s", path)
+        with open(path) as f:
+            graph = cls(_json_load(f), filename=filename)
+        with cls._cache_lock:
+            cls._cache[path] = (mtime, graph)
+        return graph
+
+    @classmethod
+    def clear_cache(cls):
+        with cls._cache_lock:
+            cls._cache.clear()
+
+
 class WorkflowTestCase(object):
     """
     A representation of the configuration of a workflow test.
@@ -144,6 +361,36 @@ class WorkflowTestCase(object):
     :param disable_assertions: ``True`` to disable assertions during the execution of the workflow test;
         ``False`` (default) otherwise.
 
+    :type max_wall_time: float
+    :param max_wall_time: max time (in seconds) the workflow test can take: when it expires,
+        the test is aborted and marked as failed
+
+    :type max_step_runtime: float or dict
+    :param max_step_runtime: max runtime (in seconds) of the jobs of every workflow step or a dictionary
+        which maps a step (identified by its tool ID) to its own max runtime
+
+    :type max_output_size: int or str or dict
+    :param max_output_size: max size of every actual output (in bytes or with a unit suffix, e.g., ``10M``)
+        or a dictionary which maps an output name to its own max size
+
+    :type reuse_cached_jobs: bool
+    :param reuse_cached_jobs: ``True`` to let Galaxy reuse the outputs of equivalent jobs it already ran
+        (i.e., ``use_cached_job``) instead of running the workflow steps again;
+        ``None`` (default) to use the setting of the test suite
+
+    :type prune_workflow: bool
+    :param prune_workflow: ``True`` to run only the workflow steps needed to produce the expected outputs;
+        ``None`` (default) to use the setting of the test suite
+
+    :type matrix: dict
+    :param matrix: a parameter sweep, i.e., a dictionary which maps a step to the lists of values
+        of some of its parameters: the test is expanded into one case per combination of values
+        (see :meth:`expand_matrix`).
+
+           :Example:
+
+                {3: {"predI": [1, 2], "orthoI": [0, 1]}}
+
     """
     # Default settings
     DEFAULT_HISTORY_NAME_PREFIX = "WorkflowTestCase"
@@ -165,7 +412,9 @@ class WorkflowTestCase(object):
 
     def __init__(self, name=None, base_path=".", workflow_filename="workflow.ga", inputs=None, params=None,
                  expected_outputs=None, output_folder=None, disable_cleanup=False, disable_assertions=False,
-                 enable_logger=False, enable_debug=False):
+                 enable_logger=False, enable_debug=False,
+                 max_wall_time=None, max_step_runtime=None, max_output_size=None, reuse_cached_jobs=None,
+                 prune_workflow=None, matrix=None):
 
         # init properties
         self._base_path = None
@@ -191,6 +440,15 @@ class WorkflowTestCase(object):
             if output_folder is None else output_folder
         self.disable_cleanup = disable_cleanup
         self.disable_assertions = disable_assertions
+        self.max_wall_time = max_wall_time
+        self.max_step_runtime = max_step_runtime
+        self.max_output_size = max_output_size
+        self.reuse_cached_jobs = reuse_cached_jobs
+        self.prune_workflow = prune_workflow
+        self.matrix = matrix
+        # the test expanded into this case and the parameter values of the case (see `expand_matrix`)
+        self.parameter_sweep = None
+        self.matrix_values = None
 
     def __str__(self):
         return "WorkflowTestConfig: name={0}, file={1}, inputs=[{2}], expected_outputs=[{3}]".format(
@@ -229,6 +487,21 @@ class WorkflowTestCase(object):
         """
         self._filename = filename
 
+    @property
+    def workflow_filename(self):
+        """
+        The path of the workflow definition (i.e., the ``filename`` resolved against the ``base_path``).
+        """
+        return self.filename if not self.base_path or _os.path.isabs(self.filename) \
+            else _os.path.join(self.base_path, self.filename)
+
+    @property
+    def workflow_graph(self):
+        """
+        The :class:`WorkflowGraph` of the workflow definition.
+        """
+        return WorkflowGraph.load(self.workflow_filename)
+
     @property
     def inputs(self):
         """
@@ -337,6 +610,51 @@ class WorkflowTestCase(object):
         if step_id in self._params:
             del self._params[step_id][name]
 
+    def expand_matrix(self):
+        """
+        Expand the parameter sweep of this test (see :class:`WorkflowTestCase`) into one
+        :class:`WorkflowTestCase` per combination of parameter values, named after the test and the values
+        (e.g., ``multivariate[orthoI=0,predI=1]``).  Every case uses the params of this test updated with
+        the values of its combination and stores its outputs in a subfolder of the test ``output_folder``;
+        the filenames of the expected outputs can refer to the values of the combination as ``{<PARAM_NAME>}``.
+
+        :rtype: list
+        :return: the list of the :class:`WorkflowTestCase` instances of the parameter sweep
+            (just this test if it doesn't define a matrix)
+        """
+        if not self.matrix:
+            return [self]
+        axes = [(step_id, name, values) for step_id, step_params in sorted(_iteritems(self.matrix), key=str)
+                for name, values in sorted(_iteritems(step_params))]
+        names = [name for _, name, _ in axes]
+        if len(set(names)) < len(names):
+            raise ValueError("Duplicate parameter names in the matrix of the test '{0}'".format(self.name))
+        cases = []
+        for combination in _itertools.product(*[values for _, _, values in axes]):
+            values = _OrderedDict(zip(names, combination))
+            label = ",".join(["{0}={1}".format(name, value) for name, value in _iteritems(values)])
+            case = WorkflowTestCase(name="{0}[{1}]".format(self.name, label), base_path=self.base_path,
+                                    workflow_filename=self.filename, inputs=self.inputs, params=self.params,
+                                    output_folder=_os.path.join(self.output_folder, label),
+                                    disable_cleanup=self.disable_cleanup, disable_assertions=self.disable_assertions,
+                                    enable_logger=self.enable_logger, enable_debug=self.enable_debug,
+                                    max_wall_time=self.max_wall_time, max_step_runtime=self.max_step_runtime,
+                                    max_output_size=self.max_output_size, reuse_cached_jobs=self.reuse_cached_jobs,
+                                    prune_workflow=self.prune_workflow)
+            for (step_id, name, _), value in zip(axes, combination):
+                case.add_param(step_id, name, value)
+            for output_name, config in _iteritems(self.expected_outputs):
+                try:
+                    filename = config["file"].format(**values)
+                except (KeyError, IndexError) as e:
+                    raise ValueError("Unknown matrix parameter {0} in the expected output '{1}' of the test '{2}'"
+                                     .format(e, output_name, self.name))
+                case.add_expected_output(output_name, filename, config.get("comparator"))
+            case.parameter_sweep = self.name
+            case.matrix_values = values
+            cases.append(case)
+        return cases
+
     def get_params(self, step_id):
         """
         Return the dictionary of parameters related to the step identified by 'step_id'.
@@ -429,13 +747,23 @@ class WorkflowTestCase(object):
         :rtype: dict
         :return:
         """
-        return dict({
+        config = dict({
             "name": self.name,
             "file": self.filename,
             "inputs": {name: input_["file"][0] for name, input_ in _iteritems(self.inputs)},
             "params": self.params,
             "expected": self.expected_outputs
         })
+        for budget in _metrics.BUDGETS:
+            if getattr(self, budget) is not None:
+                config[budget] = getattr(self, budget)
+        if self.reuse_cached_jobs is not None:
+            config["reuse_cached_jobs"] = self.reuse_cached_jobs
+        if self.prune_workflow is not None:
+            config["prune_workflow"] = self.prune_workflow
+        if self.matrix:
+            config["matrix"] = self.matrix
+        return config
 
     def save(self, filename=None, file_format=FileFormats.YAML):
         """
@@ -497,7 +825,13 @@ class WorkflowTestCase(object):
                                     expected_outputs=wft_config["expected"],
                                     output_folder=wft_output_folder,
                                     enable_logger=file_configuration.get("enable_logger", False),
-                                    enable_debug=file_configuration.get("enable_debug", False))
+                                    enable_debug=file_configuration.get("enable_debug", False),
+                                    reuse_cached_jobs=wft_config.get("reuse_cached_jobs",
+                                                                     file_configuration.get("reuse_cached_jobs")),
+                                    prune_workflow=wft_config.get("prune_workflow",
+                                                                  file_configuration.get("prune_workflow")),
+                                    matrix=wft_config.get("matrix"),
+                                    **_load_budgets(wft_config, file_configuration))
         else:
             raise ValueError("Filename '{0}' not found".format(filename))
 
@@ -540,20 +874,50 @@ class WorkflowTestCase(object):
     def run(self, galaxy_url=None, galaxy_api_key=None, output_folder=None,
             enable_xunit=False, xunit_file=None, verbosity=0,
             enable_logger=None, enable_debug=None, disable_cleanup=None,
-            max_retries=None, retry_delay=None, polling_interval=None):
+            max_retries=None, retry_delay=None, polling_interval=None,
+            max_request_rate=None, max_active_jobs=None, metrics_baseline=None, timing_db=None,
+            result_cache=None, history_pool_size=None, journal=None):
         _common.LoggerManager.configure_logging(
             _logging.DEBUG if enable_debug is True else _logging.INFO if enable_logger is True else _logging.ERROR)
         import wft4galaxy.runner as _runner
         return _runner.WorkflowTestsRunner(
             galaxy_url, galaxy_api_key,
             max_retries=max_retries, retry_delay=retry_delay,
-            polling_interval=polling_interval).run(self, verbosity=verbosity,
+            polling_interval=polling_interval, max_request_rate=max_request_rate,
+            max_active_jobs=max_active_jobs, history_pool_size=history_pool_size).run(self, verbosity=verbosity,
                                                    output_folder=output_folder or self.output_folder,
                                                    report_format="xunit" if enable_xunit else None,
                                                    report_filename=xunit_file,
                                                    enable_logger=enable_logger,
                                                    enable_debug=enable_debug,
-                                                   disable_cleanup=disable_cleanup)
+                                                   disable_cleanup=disable_cleanup,
+                                                   metrics_baseline=metrics_baseline,
+                                                   timing_db=timing_db,
+                                                   result_cache=result_cache,
+                                                   journal=journal)
+
+    def run_load_test(self, repeat, concurrency=1, galaxy_url=None, galaxy_api_key=None,
+                      enable_logger=None, enable_debug=None, disable_cleanup=None,
+                      max_retries=None, retry_delay=None, polling_interval=None,
+                      max_request_rate=None, max_active_jobs=None):
+        """
+        Invoke the workflow of this test ``repeat`` times, at most ``concurrency`` at a time,
+        reusing the imported workflow and the uploaded inputs.
+
+        :rtype: :class:`wft4galaxy.loadtest.LoadTestResult`
+        :return: throughput, scheduling and completion latencies and error rate of the invocations
+        """
+        _common.LoggerManager.configure_logging(
+            _logging.DEBUG if enable_debug is True else _logging.INFO if enable_logger is True else _logging.ERROR)
+        import wft4galaxy.runner as _runner
+        return _runner.WorkflowTestsRunner(
+            galaxy_url, galaxy_api_key,
+            max_retries=max_retries, retry_delay=retry_delay,
+            polling_interval=polling_interval, max_request_rate=max_request_rate,
+            max_active_jobs=max_active_jobs).run_load_test(self, repeat, concurrency,
+                                                             enable_logger=enable_logger,
+                                                             enable_debug=enable_debug,
+                                                             disable_cleanup=disable_cleanup)
 
 
 class WorkflowTestSuite(object):
@@ -564,7 +928,9 @@ class WorkflowTestSuite(object):
     def __init__(self, galaxy_url=None, galaxy_api_key=None,
                  output_folder=WorkflowTestCase.DEFAULT_OUTPUT_FOLDER,
                  enable_logger=True, enable_debug=False, disable_cleanup=False, disable_assertions=False,
-                 max_retries=None, retry_delay=None, polling_interval=None):
+                 max_retries=None, retry_delay=None, polling_interval=None,
+                 max_request_rate=None, max_active_jobs=None, reuse_cached_jobs=False,
+                 prune_workflow=False, history_pool_size=None):
         """
         Create an instance of :class:`WorkflowTestSuite`.
 
@@ -575,6 +941,25 @@ class WorkflowTestSuite(object):
         :type galaxy_api_key: str
         :param galaxy_api_key: an API key from your Galaxy server instance.  If ``none``, the environment variable
             ``GALAXY_API_KEY`` is used. An error is raised when such a variable cannot be found.
+
+        :type max_request_rate: float
+        :param max_request_rate: max number of requests per second sent to the Galaxy server
+
+        :type max_active_jobs: int
+        :param max_active_jobs: max number of active (i.e., new, queued or running) jobs of the Galaxy user
+            above which new workflow invocations are held back
+
+        :type reuse_cached_jobs: bool
+        :param reuse_cached_jobs: ``True`` to let Galaxy reuse the outputs of equivalent jobs
+            in the workflow tests which don't override this setting
+
+        :type prune_workflow: bool
+        :param prune_workflow: ``True`` to run only the workflow steps needed to produce the expected outputs
+            in the workflow tests which don't override this setting
+
+        :type history_pool_size: int
+        :param history_pool_size: max number of Galaxy histories reused by the workflow tests
+            instead of creating a new history for each test (``None`` to disable the history pool)
         """
 
         self.galaxy_url = galaxy_url
@@ -587,6 +972,11 @@ class WorkflowTestSuite(object):
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.polling_interval = polling_interval
+        self.max_request_rate = max_request_rate
+        self.max_active_jobs = max_active_jobs
+        self.reuse_cached_jobs = reuse_cached_jobs
+        self.prune_workflow = prune_workflow
+        self.history_pool_size = history_pool_size
 
         # instantiate the dict for worklofws
         self._workflows = {}
@@ -654,7 +1044,12 @@ class WorkflowTestSuite(object):
                               or WorkflowTestCase.DEFAULT_OUTPUT_FOLDER,
                 max_retries=file_configuration.get("max_retries", None),
                 retry_delay=file_configuration.get("retry_delay", None),
-                polling_interval=file_configuration.get("polling_interval", None)
+                polling_interval=file_configuration.get("polling_interval", None),
+                max_request_rate=file_configuration.get("max_request_rate", None),
+                max_active_jobs=file_configuration.get("max_active_jobs", None),
+                reuse_cached_jobs=file_configuration.get("reuse_cached_jobs", False),
+                prune_workflow=file_configuration.get("prune_workflow", False),
+                history_pool_size=file_configuration.get("history_pool_size", None)
             )
             for wf_name, wf_config in _iteritems(file_configuration.get("workflows")):
                 wf_base_path = _os.path.join(base_path, wf_config.get("base_path", ""))
@@ -664,7 +1059,11 @@ class WorkflowTestSuite(object):
                 w = WorkflowTestCase(name=wf_name, base_path=wf_base_path, workflow_filename=wf_config["file"],
                                      inputs=wf_config["inputs"], params=wf_config.get("params", {}),
                                      expected_outputs=wf_config["expected"],
-                                     output_folder=wf_config["output_folder"])
+                                     output_folder=wf_config["output_folder"],
+                                     reuse_cached_jobs=wf_config.get("reuse_cached_jobs"),
+                                     prune_workflow=wf_config.get("prune_workflow"),
+                                     matrix=wf_config.get("matrix"),
+                                     **_load_budgets(wf_config, file_configuration))
                 suite.add_workflow_test(w)
             return suite
         else:
@@ -673,19 +1072,26 @@ class WorkflowTestSuite(object):
     def run(self, galaxy_url=None, galaxy_api_key=None, tests=None, output_folder=None,
             enable_xunit=False, xunit_file=None, verbosity=0,
             enable_logger=None, enable_debug=None, disable_cleanup=None, disable_assertions=None,
-            max_retries=None, retry_delay=None, polling_interval=None):
+            max_retries=None, retry_delay=None, polling_interval=None,
+            max_request_rate=None, max_active_jobs=None, metrics_baseline=None, timing_db=None, shard=None,
+            result_cache=None, history_pool_size=None, journal=None):
         # configure logger
         _common.LoggerManager.configure_logging(
             _logging.DEBUG if enable_debug is True else _logging.INFO if enable_logger is True else _logging.ERROR)
 
         import wft4galaxy.runner as _runner
         return _runner.WorkflowTestsRunner(galaxy_url, galaxy_api_key, max_retries=max_retries,
-                                           retry_delay=retry_delay, polling_interval=polling_interval) \
+                                           retry_delay=retry_delay, polling_interval=polling_interval,
+                                           max_request_rate=max_request_rate, max_active_jobs=max_active_jobs,
+                                           history_pool_size=history_pool_size) \
             .run(self, filter=tests, verbosity=verbosity,
                  output_folder=output_folder or self.output_folder,
                  report_format="xunit" if enable_xunit else None, report_filename=xunit_file,
                  enable_logger=enable_logger, enable_debug=enable_debug, disable_cleanup=disable_cleanup,
-                 max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval)
+                 max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+                 max_request_rate=max_request_rate, max_active_jobs=max_active_jobs,
+                 metrics_baseline=metrics_baseline, timing_db=timing_db, shard=shard, result_cache=result_cache,
+                 history_pool_size=history_pool_size, journal=journal)
 
 
 class WorkflowTestResult(object):
@@ -695,7 +1101,8 @@ class WorkflowTestResult(object):
 
     def __init__(self, test_id, workflow, inputs, outputs, output_history, expected_outputs,
                  missing_tools, results, output_file_map,
-                 output_folder=WorkflowTestCase.DEFAULT_OUTPUT_FOLDER, errors=None):
+                 output_folder=WorkflowTestCase.DEFAULT_OUTPUT_FOLDER, errors=None, spans=None,
+                 job_metrics=None, metric_regressions=None, budget_violations=None):
         self.test_id = test_id
         self.workflow = workflow
         self.inputs = inputs
@@ -707,6 +1114,18 @@ class WorkflowTestResult(object):
         self.missing_tools = missing_tools
         self.output_file_map = output_file_map
         self.results = results
+        self.spans = [] if spans is None else spans
+        self.job_metrics = {} if job_metrics is None else job_metrics
+        self.metric_regressions = [] if metric_regressions is None else metric_regressions
+        self.budget_violations = [] if budget_violations is None else budget_violations
+        # workflow steps whose outputs were reused from equivalent jobs by the Galaxy job cache
+        self.cached_steps = []
+        # wall-clock time (in seconds) of the whole test
+        self.duration = None
+        # True if the test was not executed since it already passed with the same fingerprint
+        self.cached = False
+        # True if the result was read from the journal of an interrupted run
+        self.resumed = False
 
         self.failed_outputs = {out[0]: out[1]
                                for out in _iteritems(self.results)
@@ -714,7 +1133,7 @@ class WorkflowTestResult(object):
 
     def __str__(self):
         return "Test {0}: workflow {1}, intputs=[{2}], outputs=[{3}]" \
-            .format(self.test_id, self.workflow.name,
+            .format(self.test_id, self.workflow.name if self.workflow else None,
                     ",".join([i for i in self.inputs]),
                     ", ".join(["{0}: {1}".format(x[0], "OK" if x[1] else "ERROR")
                                for x in _iteritems(self.results)]))
@@ -764,6 +1183,20 @@ class WorkflowTestResult(object):
         """
         return self.results
 
+    def get_timings(self):
+        """
+        Return the durations (in seconds) of the test phases, e.g., ``upload_input[DataMatrix]``.
+        The durations of phases with the same label are summed up.
+
+        :rtype: :class:`collections.OrderedDict`
+        :return: map <PHASE_LABEL>:<DURATION>
+        """
+        timings = _OrderedDict()
+        for span in self.spans:
+            if span.duration is not None:
+                timings[span.label] = timings.get(span.label, 0.0) + span.duration
+        return timings
+
 
 class WorkflowTestReportGenerator(object):
     def generate_report(self, stream, report_format="plaintext"):
@@ -794,6 +1227,15 @@ def _load_configuration(config_filename):
     return workflows_conf
 
 
+def _load_budgets(workflow_config, suite_config):
+    # per-test budgets override the ones defined at suite level
+    budgets = {b: workflow_config.get(b, suite_config.get(b)) for b in _metrics.BUDGETS}
+    if budgets["max_output_size"] is not None:
+        budgets["max_output_size"] = {k: _metrics.parse_size(v) for k, v in _iteritems(budgets["max_output_size"])} \
+            if isinstance(budgets["max_output_size"], dict) else _metrics.parse_size(budgets["max_output_size"])
+    return budgets
+
+
 def _parse_dict(elements):
     results = {}
     for name, value in _iteritems(elements):
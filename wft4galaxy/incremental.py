@@ -0,0 +1,294 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import json as _json
+import time as _time
+import hashlib as _hashlib
+import threading as _threading
+
+# wft4galaxy dependencies
+import wft4galaxy.core as _core
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default name of the file of passed tests (relative to the output folder)
+DEFAULT_FILENAME = "wft4galaxy-passed.json"
+
+# default name of the snapshot of the tools installed on the Galaxy server (relative to the output folder)
+DEFAULT_TOOL_SNAPSHOT = "wft4galaxy-tools.json"
+
+# version of the fingerprint: bump it whenever the fingerprint of the same test changes
+FINGERPRINT_VERSION = 2
+
+# keys of the workflow definition which don't affect the workflow behaviour
+_VOLATILE_WORKFLOW_KEYS = frozenset(["uuid", "position", "annotation", "errors"])
+
+# size of the blocks read to hash files
+_BLOCK_SIZE = 1 << 20
+
+
+def _resolve(base_path, filename):
+    return filename if not base_path or _os.path.isabs(filename) else _os.path.join(base_path, filename)
+
+
+def hash_file(filename):
+    """
+    :rtype: str
+    :return: the SHA-256 digest of the content of ``filename``
+    """
+    digest = _hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _normalize(element):
+    if isinstance(element, dict):
+        return {k: _normalize(v) for k, v in _iteritems(element) if k not in _VOLATILE_WORKFLOW_KEYS}
+    if isinstance(element, list):
+        return [_normalize(e) for e in element]
+    return element
+
+
+def load_workflow_definition(workflow_test_config):
+    """
+    :rtype: dict
+    :return: the workflow definition (i.e., the content of the ``.ga`` file) of a :class:`WorkflowTestCase`,
+        which must not be modified (see :class:`wft4galaxy.core.WorkflowGraph`)
+    """
+    return workflow_test_config.workflow_graph.definition
+
+
+def get_workflow_tools(workflow_definition):
+    """
+    :type workflow_definition: dict
+    :param workflow_definition: the content of a ``.ga`` file
+
+    :rtype: dict
+    :return: map <TOOL_ID>:<TOOL_VERSION> of the tools used by the workflow steps
+    """
+    return _core.WorkflowGraph(workflow_definition).get_tools()
+
+
+def get_tool_inventory(galaxy_instance):
+    """
+    :type galaxy_instance: :class:`wft4galaxy.common.GalaxyInstance`
+    :param galaxy_instance: the Galaxy instance
+
+    :rtype: dict
+    :return: map <TOOL_ID>:<LIST_OF_INSTALLED_VERSIONS> of the tools installed on the Galaxy server
+    """
+    inventory = {}
+    for tool in galaxy_instance.tools.list():
+        inventory.setdefault(tool.id, set()).add(tool.version)
+    return {tool_id: sorted(versions) for tool_id, versions in _iteritems(inventory)}
+
+
+def save_tool_snapshot(filename, tool_inventory):
+    """
+    Store the tools installed on the Galaxy server (see :func:`get_tool_inventory`) as a JSON file.
+    """
+    _common.makedirs(_os.path.dirname(_os.path.abspath(filename)))
+    with open(filename, "w") as f:
+        _json.dump({"timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S"), "tools": tool_inventory},
+                   f, indent=2, sort_keys=True)
+    _logger.debug("Saved snapshot of %d tools to %s", len(tool_inventory), filename)
+
+
+def load_tool_snapshot(filename):
+    """
+    :rtype: dict
+    :return: the tool inventory stored by :func:`save_tool_snapshot`; ``None`` if the file doesn't exist
+    """
+    if not _os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        return _json.load(f)["tools"]
+
+
+def diff_tool_inventories(old_inventory, new_inventory):
+    """
+    :rtype: list
+    :return: the IDs of the tools which have been installed, uninstalled or updated
+        (i.e., whose installed versions differ) between two tool inventories
+    """
+    return sorted(tool_id for tool_id in set(old_inventory) | set(new_inventory)
+                  if sorted(old_inventory.get(tool_id, [])) != sorted(new_inventory.get(tool_id, [])))
+
+
+def build_tool_index(workflow_tests):
+    """
+    Index the workflow tests by the tools their workflows use.
+
+    :type workflow_tests: dict
+    :param workflow_tests: map <TEST_NAME>:<WorkflowTestCase>
+
+    :rtype: tuple
+    :return: a pair (<INDEX>, <UNINDEXED_TESTS>) where <INDEX> maps a tool ID to the list of the tests
+        which use it and <UNINDEXED_TESTS> lists the tests whose workflow definition cannot be read
+    """
+    index = {}
+    unindexed = []
+    for name, config in _iteritems(workflow_tests):
+        try:
+            tools = config.workflow_graph.get_tools()
+        except (IOError, OSError, ValueError) as e:
+            _logger.warning("Unable to read the workflow of test '%s': %s", name, e)
+            unindexed.append(name)
+            continue
+        for tool_id in tools:
+            index.setdefault(tool_id, set()).add(name)
+    return {tool_id: sorted(names) for tool_id, names in _iteritems(index)}, sorted(unindexed)
+
+
+def select_affected_tests(workflow_tests, changed_tools):
+    """
+    Select the workflow tests which use any of the ``changed_tools``
+    (and the ones whose workflow definition cannot be read).
+
+    :type workflow_tests: dict
+    :param workflow_tests: map <TEST_NAME>:<WorkflowTestCase>
+
+    :type changed_tools: list
+    :param changed_tools: list of tool IDs (see :func:`diff_tool_inventories`)
+
+    :rtype: list
+    :return: the names of the affected tests
+    """
+    index, affected = build_tool_index(workflow_tests)
+    affected = set(affected)
+    for tool_id in changed_tools:
+        affected.update(index.get(tool_id, []))
+    return sorted(affected)
+
+
+def is_selection_complete(affected_tests, selected_tests, shard=None):
+    """
+    Check whether all the ``affected_tests`` are selected to run: the snapshot of the tools
+    can be updated only when a run of all the affected tests passes.
+
+    :type affected_tests: list
+    :param affected_tests: the names of the tests affected by the changed tools (see :func:`select_affected_tests`)
+
+    :type selected_tests: list
+    :param selected_tests: the names of the tests selected to run
+
+    :type shard: :class:`wft4galaxy.sharding.Shard`
+    :param shard: the shard of the selected tests which is run (if any)
+
+    :rtype: bool
+    """
+    return shard is None and set(affected_tests).issubset(selected_tests)
+
+
+def fingerprint(workflow_test_config, tool_inventory, metrics_baseline=None):
+    """
+    Compute a digest of everything which determines the result of a workflow test:
+    the normalized workflow definition (UUIDs, layout and annotations are ignored), the content
+    of the input datasets, the step parameters, the content of the expected outputs
+    with their comparators, the installed versions of the tools used by the workflow,
+    the performance budgets, the ``reuse_cached_jobs`` and ``prune_workflow`` settings
+    and the settings of the job metrics baseline.
+
+    :type workflow_test_config: :class:`wft4galaxy.core.WorkflowTestCase`
+    :param workflow_test_config: the configuration of the workflow test
+
+    :type tool_inventory: dict
+    :param tool_inventory: the tools installed on the Galaxy server (see :func:`get_tool_inventory`)
+
+    :type metrics_baseline: :class:`wft4galaxy.metrics.MetricsBaseline`
+    :param metrics_baseline: the baseline of job metrics the test is checked against, if any
+
+    :rtype: str
+    :return: the SHA-256 fingerprint of the workflow test
+    """
+    config = workflow_test_config
+    base_path = config.base_path
+    graph = config.workflow_graph
+    description = {
+        "version": FINGERPRINT_VERSION,
+        "workflow": _normalize(graph.definition),
+        "inputs": {label: {"type": input_config.get("type"),
+                           "files": [hash_file(_resolve(base_path, f)) for f in input_config["file"]]}
+                   for label, input_config in _iteritems(config.inputs)},
+        "params": {str(step): params for step, params in _iteritems(config.params or {})},
+        "expected": {name: {"comparator": output_config.get("comparator"),
+                            "file": hash_file(_resolve(base_path, output_config["file"]))}
+                     for name, output_config in _iteritems(config.expected_outputs)},
+        "tools": {tool_id: tool_inventory.get(tool_id, []) for tool_id in graph.get_tools()},
+        "budgets": {"max_wall_time": config.max_wall_time, "max_step_runtime": config.max_step_runtime,
+                    "max_output_size": config.max_output_size},
+        "reuse_cached_jobs": bool(config.reuse_cached_jobs),
+        "prune_workflow": bool(config.prune_workflow),
+        "metrics_baseline": {"threshold": metrics_baseline.threshold,
+                             "fail_on_regression": bool(metrics_baseline.fail_on_regression)}
+        if metrics_baseline is not None else None
+    }
+    return _hashlib.sha256(_json.dumps(description, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """
+    Fingerprints of the workflow tests which passed, stored as a JSON file:
+    a test whose fingerprint (see :func:`fingerprint`) matches the one of its last passed run
+    doesn't need to be run again.
+
+    :type filename: str
+    :param filename: the path of the JSON file (loaded if it exists)
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self._tests = {}
+        self._tool_inventory = None
+        self._lock = _threading.RLock()
+        if filename and _os.path.exists(filename):
+            self.load(filename)
+
+    def load(self, filename):
+        with open(filename) as f:
+            data = _json.load(f)
+        with self._lock:
+            self._tests = data.get("tests", {}) if data.get("version") == FINGERPRINT_VERSION else {}
+        _logger.debug("Loaded fingerprints of passed tests from %s", filename)
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        if not filename:
+            raise ValueError("No file configured")
+        _common.makedirs(_os.path.dirname(_os.path.abspath(filename)))
+        with self._lock:
+            with open(filename, "w") as f:
+                _json.dump({"version": FINGERPRINT_VERSION, "tests": self._tests}, f, indent=2, sort_keys=True)
+        _logger.debug("Saved fingerprints of passed tests to %s", filename)
+
+    def get_tool_inventory(self, galaxy_instance):
+        """
+        Return the tools installed on the Galaxy server (see :func:`get_tool_inventory`),
+        which are retrieved only once.
+        """
+        with self._lock:
+            if self._tool_inventory is None:
+                self._tool_inventory = get_tool_inventory(galaxy_instance)
+            return self._tool_inventory
+
+    def is_passed(self, test_name, test_fingerprint):
+        """
+        :rtype: bool
+        :return: ``True`` if the last passed run of the test ``test_name`` had the fingerprint ``test_fingerprint``
+        """
+        with self._lock:
+            return self._tests.get(test_name, {}).get("fingerprint") == test_fingerprint
+
+    def set_passed(self, test_name, test_fingerprint):
+        with self._lock:
+            self._tests[test_name] = {"fingerprint": test_fingerprint,
+                                      "timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def remove(self, test_name):
+        with self._lock:
+            self._tests.pop(test_name, None)
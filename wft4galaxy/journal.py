@@ -0,0 +1,161 @@
+from __future__ import print_function
+
+import os as _os
+import json as _json
+import time as _time
+import threading as _threading
+
+# wft4galaxy dependencies
+import wft4galaxy.core as _core
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default name of the journal of a run (relative to the output folder)
+DEFAULT_FILENAME = "wft4galaxy-journal.json"
+
+# version of the journal format
+JOURNAL_VERSION = 2
+
+
+class RunJournal(object):
+    """
+    Checkpoints of the workflow tests of a run, stored as a JSON file which is rewritten
+    whenever the workflow of a test is scheduled on Galaxy and whenever a test completes.
+    When a run is resumed, the tests completed by the previous run are not executed again
+    (their results are read from the journal) and the tests scheduled but not completed
+    wait for the outputs of their invocations, if their history still exists.
+    Every checkpoint records the fingerprint of the configuration of its test
+    (see :func:`wft4galaxy.incremental.fingerprint`): the checkpoints of a test whose
+    configuration has changed since the interrupted run are ignored.
+
+    :type filename: str
+    :param filename: the path of the JSON file
+
+    :type resume: bool
+    :param resume: ``True`` to load the checkpoints of a previous run from ``filename``;
+        ``False`` to start a new journal
+
+    :type attach_only: bool
+    :param attach_only: ``True`` to only wait for the invocations scheduled by the previous run
+        (implies ``resume``): the tests whose invocation cannot be found fail instead of running again
+    """
+
+    SCHEDULED = "scheduled"
+    COMPLETED = "completed"
+
+    def __init__(self, filename, resume=False, attach_only=False):
+        self.filename = filename
+        self.resume = resume or attach_only
+        self.attach_only = attach_only
+        self._tests = {}
+        self._lock = _threading.RLock()
+        if self.resume and _os.path.exists(filename):
+            self.load(filename)
+        elif _os.path.exists(filename):
+            # the checkpoints of a previous run must not be resumed by a later run
+            _os.remove(filename)
+
+    def load(self, filename):
+        with open(filename) as f:
+            data = _json.load(f)
+        with self._lock:
+            self._tests = data.get("tests", {}) if data.get("version") == JOURNAL_VERSION else {}
+        _logger.info("Loaded the checkpoints of %d workflow tests from %s", len(self._tests), filename)
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        if not filename:
+            raise ValueError("No file configured")
+        _common.makedirs(_os.path.dirname(_os.path.abspath(filename)))
+        with self._lock:
+            # write a new file and replace the old one, so that the journal is never left truncated
+            temp_filename = filename + ".tmp"
+            with open(temp_filename, "w") as f:
+                _json.dump({"version": JOURNAL_VERSION, "tests": self._tests}, f, indent=2, sort_keys=True)
+            getattr(_os, "replace", _os.rename)(temp_filename, filename)
+
+    def get(self, test_name, fingerprint=None):
+        """
+        :type fingerprint: str
+        :param fingerprint: the fingerprint of the current configuration of the test
+
+        :rtype: dict
+        :return: the checkpoint of the test ``test_name``; ``None`` if it has no checkpoint
+            or the checkpoint was recorded for a different ``fingerprint``
+        """
+        with self._lock:
+            entry = self._tests.get(test_name)
+            if entry is None:
+                return None
+            if entry.get("fingerprint") != fingerprint:
+                _logger.debug("Checkpoint of workflow test '%s' ignored: its configuration has changed", test_name)
+                return None
+            return dict(entry)
+
+    def get_scheduled_tests(self):
+        """
+        :rtype: list
+        :return: the names of the tests whose workflow has been scheduled but which are not completed
+        """
+        with self._lock:
+            return sorted(name for name, entry in self._tests.items() if entry.get("state") == self.SCHEDULED)
+
+    def is_completed(self, test_name, fingerprint=None):
+        entry = self.get(test_name, fingerprint)
+        return entry is not None and entry.get("state") == self.COMPLETED
+
+    def set_scheduled(self, test_name, workflow_id, history_id, output_ids, fingerprint=None):
+        """
+        Record that the workflow of the test ``test_name`` has been scheduled on Galaxy.
+
+        :type output_ids: list
+        :param output_ids: the IDs of the output datasets of the invocation
+
+        :type fingerprint: str
+        :param fingerprint: the fingerprint of the configuration of the test
+        """
+        with self._lock:
+            self._tests[test_name] = {"state": self.SCHEDULED, "workflow_id": workflow_id,
+                                      "history_id": history_id, "output_ids": list(output_ids),
+                                      "fingerprint": fingerprint, "timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self.save()
+
+    def set_completed(self, test_name, test_result, error_msg=None, fingerprint=None):
+        """
+        Record the result of the test ``test_name``.
+
+        :type test_result: :class:`wft4galaxy.core.WorkflowTestResult`
+        :param test_result: the result of the test
+
+        :type error_msg: str
+        :param error_msg: the message reported for the failure of the test
+
+        :type fingerprint: str
+        :param fingerprint: the fingerprint of the configuration of the test
+        """
+        with self._lock:
+            self._tests[test_name] = {"state": self.COMPLETED, "passed": test_result.passed(),
+                                      "results": dict(test_result.results), "errors": list(test_result.errors),
+                                      "error_msg": error_msg, "duration": test_result.duration,
+                                      "fingerprint": fingerprint, "timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S")}
+            self.save()
+
+    def get_result(self, test_name, test_id, workflow_test_config, output_folder=None, fingerprint=None):
+        """
+        Rebuild the result of a completed test from its checkpoint.
+
+        :rtype: :class:`wft4galaxy.core.WorkflowTestResult`
+        :return: the result of the test; ``None`` if the test is not completed (with the same ``fingerprint``)
+        """
+        entry = self.get(test_name, fingerprint)
+        if entry is None or entry.get("state") != self.COMPLETED:
+            return None
+        config = workflow_test_config
+        test_result = _core.WorkflowTestResult(test_id, None, config.inputs, [], None, config.expected_outputs,
+                                               [], entry.get("results", {}), {},
+                                               output_folder or config.output_folder, list(entry.get("errors", [])))
+        test_result.duration = entry.get("duration")
+        test_result.resumed = True
+        return test_result
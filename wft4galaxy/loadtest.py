@@ -0,0 +1,124 @@
+from __future__ import print_function
+
+import sys as _sys
+import math as _math
+from collections import namedtuple as _namedtuple
+from collections import OrderedDict as _OrderedDict
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default number of concurrent invocations
+DEFAULT_CONCURRENCY = 1
+
+# reported latency percentiles
+PERCENTILES = (50, 95, 99)
+
+# latencies measured for every invocation
+LATENCIES = ("scheduling", "completion")
+
+
+def percentile(values, p):
+    """
+    Return the ``p``-th percentile of ``values`` (nearest-rank method).
+
+    :type values: list
+    :param values: list of numbers
+
+    :type p: float
+    :param p: the percentile, between 0 and 100
+
+    :rtype: float
+    :return: the percentile; ``None`` if ``values`` is empty
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = int(_math.ceil(p / 100.0 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+class Invocation(_namedtuple("Invocation", ["index", "start_time", "scheduling", "completion", "error"])):
+    """
+    A workflow invocation of a load test: ``scheduling`` is the time (in seconds) Galaxy took to accept
+    the invocation, ``completion`` the time until all its outputs were ready
+    (``None`` if the invocation failed, with ``error`` describing the failure).
+    """
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+
+class LoadTestResult(object):
+    """
+    Result of a load test, i.e., of ``repeat`` invocations of the workflow of a test,
+    at most ``concurrency`` at a time.
+    """
+
+    def __init__(self, test_name, repeat, concurrency, invocations, duration):
+        self.test_name = test_name
+        self.repeat = repeat
+        self.concurrency = concurrency
+        self.invocations = sorted(invocations, key=lambda i: i.index)
+        # wall-clock time (in seconds) of all the invocations
+        self.duration = duration
+
+    @property
+    def errors(self):
+        """ The list of failed invocations. """
+        return [i for i in self.invocations if i.failed]
+
+    @property
+    def error_rate(self):
+        """ The fraction of failed invocations. """
+        return len(self.errors) / float(len(self.invocations)) if self.invocations else 0.0
+
+    @property
+    def throughput(self):
+        """ The number of completed invocations per second. """
+        completed = len(self.invocations) - len(self.errors)
+        return completed / self.duration if self.duration else 0.0
+
+    def latencies(self, latency):
+        """
+        :type latency: str
+        :param latency: one of ``scheduling`` and ``completion``
+
+        :rtype: list
+        :return: the latencies of the successful invocations
+        """
+        return [getattr(i, latency) for i in self.invocations if getattr(i, latency) is not None]
+
+    def percentiles(self, latency):
+        """
+        :rtype: :class:`collections.OrderedDict`
+        :return: map <PERCENTILE>:<LATENCY> of the reported percentiles (see :data:`PERCENTILES`)
+        """
+        values = self.latencies(latency)
+        return _OrderedDict(("p{0}".format(p), percentile(values, p)) for p in PERCENTILES)
+
+    def to_dict(self):
+        return {"test": self.test_name, "repeat": self.repeat, "concurrency": self.concurrency,
+                "duration": self.duration, "throughput": self.throughput,
+                "errors": len(self.errors), "error_rate": self.error_rate,
+                "latencies": {latency: self.percentiles(latency) for latency in LATENCIES},
+                "invocations": [i._asdict() for i in self.invocations]}
+
+    def print_report(self, stream=_sys.stdout):
+        """
+        Print a plain text summary of the load test.
+        """
+        print("Load test '{0}': {1} invocations (concurrency: {2}) in {3:.2f}s".format(
+            self.test_name, self.repeat, self.concurrency, self.duration), file=stream)
+        print("  throughput: {0:.3f} invocations/s".format(self.throughput), file=stream)
+        print("  errors: {0} ({1:.1%})".format(len(self.errors), self.error_rate), file=stream)
+        for latency in LATENCIES:
+            print("  {0} latency (s): {1}".format(latency, "  ".join(
+                ["{0}={1}".format(p, "{0:.3f}".format(v) if v is not None else "n/a")
+                 for p, v in self.percentiles(latency).items()])), file=stream)
+        for invocation in self.errors:
+            print("  invocation {0} failed: {1}".format(invocation.index, invocation.error), file=stream)
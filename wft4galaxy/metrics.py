@@ -0,0 +1,318 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import re as _re
+import json as _json
+import time as _time
+import threading as _threading
+from collections import namedtuple as _namedtuple
+from collections import OrderedDict as _OrderedDict
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default max accepted increase (in percent) of a job metric with respect to its baseline value
+DEFAULT_THRESHOLD = 50.0
+
+# tools which import data into Galaxy (their jobs are not workflow steps)
+UPLOAD_TOOL_IDS = frozenset(["upload1", "__DATA_FETCH__"])
+
+# map the names of the Galaxy job metrics to the names of the metrics tracked by wft4galaxy
+METRIC_ALIASES = {
+    "runtime_seconds": "runtime",
+    "galaxy_slots": "cores",
+    "memory.max_usage_in_bytes": "memory",
+    "memory.peak": "memory",
+    "memtotal": "memory_total",
+    "galaxy_memory_mb": "memory_allocated"
+}
+
+# metrics compared against the baseline
+TRACKED_METRICS = ("runtime", "memory")
+
+# increases below these absolute values are considered noise
+MIN_DIFFERENCES = {"runtime": 1.0, "memory": 16 << 20}
+
+# version of the format of the baseline file
+BASELINE_FORMAT_VERSION = 1
+
+# performance budgets which can be set on a workflow test
+BUDGETS = ("max_wall_time", "max_step_runtime", "max_output_size")
+
+_SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+
+class MetricRegression(_namedtuple("MetricRegression", ["test", "step", "metric", "value", "baseline"])):
+    """
+    A job metric of a workflow step which exceeds its baseline value.
+    """
+
+    @property
+    def increase(self):
+        """ The increase (in percent) of the metric with respect to its baseline value. """
+        return (self.value - self.baseline) * 100.0 / self.baseline if self.baseline else float("inf")
+
+    def __str__(self):
+        return "{0}: {1} {2} = {3:g} (baseline {4:g}, +{5:.1f}%)".format(
+            self.test, self.step, self.metric, self.value, self.baseline, self.increase)
+
+
+class BudgetViolation(_namedtuple("BudgetViolation", ["budget", "subject", "value", "limit"])):
+    """
+    A performance budget (e.g., ``max_wall_time``) exceeded by a workflow test, step or output.
+    """
+
+    def __str__(self):
+        return "{0} of {1} exceeded: {2:g} > {3:g}".format(self.budget, self.subject, self.value, self.limit)
+
+
+def parse_size(value):
+    """
+    Convert a size given as a number of bytes or as a string with a unit suffix (e.g., ``10M``, ``1.5G``)
+    to a number of bytes.
+
+    :rtype: int
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    m = _re.match(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$", str(value).upper())
+    if m is None:
+        raise ValueError("Invalid size: {0}".format(value))
+    return int(float(m.group(1)) * _SIZE_UNITS[m.group(2)])
+
+
+def get_budget(budget, key):
+    """
+    Return the limit which applies to ``key`` (a step or an output): ``budget`` is either a single limit
+    for all the steps (outputs) or a dictionary <STEP_OR_OUTPUT>:<LIMIT>.
+    """
+    if isinstance(budget, dict):
+        return budget.get(key)
+    return budget
+
+
+def check_step_runtimes(max_step_runtime, job_metrics):
+    """
+    Check the runtime of the jobs returned by :func:`collect_job_metrics` against the ``max_step_runtime`` budget.
+
+    :rtype: list
+    :return: the list of :class:`BudgetViolation`
+    """
+    violations = []
+    for step, job in _iteritems(job_metrics):
+        limit = get_budget(max_step_runtime, step)
+        runtime = job["metrics"].get("runtime")
+        if limit is not None and runtime is not None and runtime > limit:
+            violations.append(BudgetViolation("max_step_runtime", step, runtime, limit))
+    return violations
+
+
+def check_output_sizes(max_output_size, output_file_map):
+    """
+    Check the size of the downloaded outputs against the ``max_output_size`` budget.
+
+    :type output_file_map: dict
+    :param output_file_map: map <OUTPUT_NAME>:{"filename": <ACTUAL_OUTPUT_FILENAME>, ...}
+
+    :rtype: list
+    :return: the list of :class:`BudgetViolation`
+    """
+    violations = []
+    for output, output_map in _iteritems(output_file_map):
+        limit = parse_size(get_budget(max_output_size, output))
+        if limit is not None and _os.path.exists(output_map["filename"]):
+            size = _os.path.getsize(output_map["filename"])
+            if size > limit:
+                violations.append(BudgetViolation("max_output_size", output, size, limit))
+    return violations
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_job_metrics(job_metrics):
+    """
+    Convert the list of job metrics returned by Galaxy (``job_metrics`` of a job shown with full details)
+    to a dictionary <METRIC_NAME>:<VALUE>. Numeric metrics are reported both with their Galaxy name
+    and with their wft4galaxy alias (e.g., ``runtime_seconds`` and ``runtime``).
+
+    :type job_metrics: list
+    :param job_metrics: list of dictionaries with (at least) the keys ``name`` and ``raw_value``
+
+    :rtype: dict
+    """
+    metrics = {}
+    for m in job_metrics or []:
+        value = _to_number(m.get("raw_value"))
+        if value is None:
+            continue
+        metrics[m["name"]] = value
+        if m["name"] in METRIC_ALIASES:
+            alias = METRIC_ALIASES[m["name"]]
+            metrics[alias] = value * (1 << 20) if alias == "memory_allocated" else value
+    return metrics
+
+
+def get_creating_jobs(galaxy_instance, history_id, dataset_ids):
+    """
+    Return the IDs of the jobs of the history ``history_id`` which produced the datasets ``dataset_ids``,
+    either directly or by producing (recursively) the inputs of their creating jobs.
+
+    :rtype: set
+    """
+    job_ids = set()
+    visited = set()
+    pending = list(dataset_ids)
+    while pending:
+        dataset_id = pending.pop()
+        if dataset_id in visited:
+            continue
+        visited.add(dataset_id)
+        dataset = galaxy_instance.gi.histories.show_dataset(history_id, dataset_id)
+        job_id = dataset.get("creating_job")
+        if not job_id or job_id in job_ids or dataset.get("history_id", history_id) != history_id:
+            continue
+        job_ids.add(job_id)
+        job = galaxy_instance.gi.jobs.show_job(job_id)
+        pending.extend(i["id"] for i in (job.get("inputs") or {}).values()
+                       if i.get("src", "hda") == "hda" and i.get("id"))
+    return job_ids
+
+
+def collect_job_metrics(galaxy_instance, history_id, exclude_job_ids=None, output_ids=None):
+    """
+    Collect the metrics of the jobs which ran the workflow steps in the history ``history_id``.
+    Jobs are identified by their tool ID; the tool ID of a tool which runs more than once
+    is suffixed by the order of the job (e.g., ``cat1``, ``cat1#2``).
+
+    :type galaxy_instance: :class:`wft4galaxy.common.GalaxyInstance`
+    :param galaxy_instance: the Galaxy instance
+
+    :type history_id: str
+    :param history_id: the ID of the history of the workflow test
+
+    :type exclude_job_ids: set
+    :param exclude_job_ids: the IDs of the jobs of ``history_id`` which don't belong to the workflow test
+        (e.g., the jobs of the previous tests which leased the same history from the
+        :class:`wft4galaxy.common.HistoryPool`)
+
+    :type output_ids: list
+    :param output_ids: the IDs of the output datasets of the workflow invocation: if given, only the jobs
+        which produced them are collected (e.g., the cases of a parameter sweep share the same history)
+
+    :rtype: :class:`collections.OrderedDict`
+    :return: map <STEP>:{"job_id": <JOB_ID>, "tool_id": <TOOL_ID>, "state": <STATE>, "metrics": <METRICS>,
+        "cached": <CACHED>}, where <CACHED> is ``True`` if the job reused the outputs of an equivalent job
+        (Galaxy job cache)
+    """
+    exclude_job_ids = exclude_job_ids or ()
+    jobs = _common.get_history_jobs(galaxy_instance, history_id)
+    if output_ids is not None:
+        job_ids = get_creating_jobs(galaxy_instance, history_id, output_ids)
+        jobs = [j for j in jobs if j["id"] in job_ids]
+    jobs = sorted([j for j in jobs if j.get("tool_id") not in UPLOAD_TOOL_IDS and j["id"] not in exclude_job_ids],
+                  key=lambda j: (j.get("create_time") or "", j["id"]))
+    result = _OrderedDict()
+    for job in jobs:
+        details = galaxy_instance.gi.jobs.show_job(job["id"], full_details=True)
+        step, n = job["tool_id"], 1
+        while step in result:
+            n += 1
+            step = "{0}#{1}".format(job["tool_id"], n)
+        result[step] = {"job_id": job["id"], "tool_id": job["tool_id"], "state": details.get("state"),
+                        "metrics": parse_job_metrics(details.get("job_metrics")),
+                        "cached": details.get("copied_from_job_id") is not None}
+    _logger.debug("Job metrics of history %s: %r", history_id, result)
+    return result
+
+
+class MetricsBaseline(object):
+    """
+    Reference values of the job metrics of workflow tests, stored as a JSON file.
+
+    :type filename: str
+    :param filename: the path of the baseline file (loaded if it exists)
+
+    :type threshold: float
+    :param threshold: max accepted increase (in percent) of a metric with respect to its baseline value
+
+    :type update: bool
+    :param update: ``True`` to replace the baseline values with the collected ones when :meth:`save` is called
+
+    :type fail_on_regression: bool
+    :param fail_on_regression: ``True`` to mark as failed the tests with metric regressions
+    """
+
+    def __init__(self, filename=None, threshold=DEFAULT_THRESHOLD, update=False, fail_on_regression=False):
+        self.filename = filename
+        self.threshold = DEFAULT_THRESHOLD if threshold is None else threshold
+        self.update = update
+        self.fail_on_regression = fail_on_regression
+        self._tests = {}
+        self._lock = _threading.Lock()
+        if filename and _os.path.exists(filename):
+            self.load(filename)
+
+    def load(self, filename):
+        with open(filename) as f:
+            data = _json.load(f)
+        with self._lock:
+            self._tests = data.get("tests", {})
+        _logger.debug("Loaded job metrics baseline from %s", filename)
+
+    def save(self, filename=None):
+        filename = filename or self.filename
+        if not filename:
+            raise ValueError("No baseline file configured")
+        with self._lock:
+            data = {"format_version": BASELINE_FORMAT_VERSION,
+                    "timestamp": _time.strftime("%Y-%m-%dT%H:%M:%S"), "tests": self._tests}
+            with open(filename, "w") as f:
+                _json.dump(data, f, indent=2, sort_keys=True)
+        _logger.debug("Saved job metrics baseline to %s", filename)
+
+    def get(self, test_name):
+        """
+        :rtype: dict
+        :return: map <STEP>:<METRICS> of the baseline values of the test ``test_name``
+        """
+        with self._lock:
+            return dict(self._tests.get(test_name, {}))
+
+    def set(self, test_name, job_metrics):
+        """
+        Replace the baseline values of the test ``test_name`` with the metrics
+        returned by :func:`collect_job_metrics`.
+        """
+        with self._lock:
+            self._tests[test_name] = {step: {m: v for m, v in _iteritems(job["metrics"]) if m in TRACKED_METRICS}
+                                      for step, job in _iteritems(job_metrics)
+                                      if job["state"] == "ok" and not job.get("cached")}
+
+    def compare(self, test_name, job_metrics):
+        """
+        Compare the metrics returned by :func:`collect_job_metrics` with the baseline values of the test.
+
+        :rtype: list
+        :return: the list of :class:`MetricRegression`
+        """
+        baseline = self.get(test_name)
+        regressions = []
+        for step, job in _iteritems(job_metrics):
+            for metric in TRACKED_METRICS:
+                value = job["metrics"].get(metric)
+                reference = baseline.get(step, {}).get(metric)
+                if value is None or reference is None:
+                    continue
+                if value > reference * (1 + self.threshold / 100.0) \
+                        and value - reference > MIN_DIFFERENCES.get(metric, 0):
+                    regressions.append(MetricRegression(test_name, step, metric, value, reference))
+        return regressions
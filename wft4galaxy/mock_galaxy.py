@@ -0,0 +1,913 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+from past.builtins import basestring as _basestring
+
+import re as _re
+import json as _json
+import time as _time
+import random as _random
+import datetime as _datetime
+import threading as _threading
+
+try:
+    from urlparse import urlparse as _urlparse, parse_qs as _parse_qs
+    from urllib import unquote as _unquote
+except ImportError:
+    from urllib.parse import urlparse as _urlparse, parse_qs as _parse_qs, unquote as _unquote
+
+try:
+    from BaseHTTPServer import HTTPServer as _HTTPServer, BaseHTTPRequestHandler as _BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn as _ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer as _HTTPServer, BaseHTTPRequestHandler as _BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn as _ThreadingMixIn
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# version reported by the mock server:
+# it makes BioBlend upload files through the plain `upload1` tool
+GALAXY_VERSION = "17.09"
+
+# ID of the Galaxy upload tool
+UPLOAD_TOOL_ID = "upload1"
+
+
+class MockGalaxyError(Exception):
+    """ Error returned to the client as a Galaxy API error response """
+
+    def __init__(self, status_code, message):
+        super(MockGalaxyError, self).__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class MockGalaxy(object):
+    """
+    An in-process HTTP server which emulates the subset of the Galaxy API used by wft4galaxy
+    (histories, uploads, workflow import and invocation, datasets, tools and jobs).
+
+    Jobs are not executed: their state is computed from the time elapsed since their submission
+    and their outputs are either copies of their first input or synthetic text files.
+    Given the same ``seed`` and the same sequence of requests, the server behaves deterministically.
+
+    Example::
+
+        with MockGalaxy(job_duration=0.5, failure_rate=0.1, seed=1) as galaxy:
+            gi = wft4galaxy.common.get_galaxy_instance(galaxy.url, galaxy.api_key)
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, api_key="mock-api-key",
+                 job_duration=0.0, queue_time=0.0, upload_duration=0.0,
+                 output_size=None, output_factory=None, failure_rate=0.0, seed=None,
+                 tools=None, register_workflow_tools=True):
+        """
+        Create a new mock Galaxy server (use :meth:`start` to start it).
+
+        :type host: str
+        :param host: the address to bind
+
+        :type port: int
+        :param port: the port to bind (``0`` to pick a free port)
+
+        :type api_key: str
+        :param api_key: the API key accepted by the server (``None`` to accept any request)
+
+        :type job_duration: float or tuple
+        :param job_duration: running time (in seconds) of a tool job or ``(min, max)`` bounds
+            of a uniformly distributed running time
+
+        :type queue_time: float or tuple
+        :param queue_time: time (in seconds) spent by a job in the ``queued`` state or ``(min, max)`` bounds
+
+        :type upload_duration: float or tuple
+        :param upload_duration: running time (in seconds) of an upload job or ``(min, max)`` bounds
+
+        :type output_size: int
+        :param output_size: size (in bytes) of the synthetic outputs of tool jobs;
+            if ``None``, every output is a copy of the first job input
+
+        :type output_factory: callable
+        :param output_factory: a function ``(tool_id, output_name, input_contents) -> bytes``
+            which overrides ``output_size``
+
+        :type failure_rate: float
+        :param failure_rate: probability that a tool job fails
+
+        :type seed: int
+        :param seed: seed of the random generator used for job durations and failures
+
+        :type tools: list
+        :param tools: the tools installed on the server: a list of ``(tool_id, version)`` tuples
+            or dictionaries with the ``id``, ``version`` and ``name`` keys
+
+        :type register_workflow_tools: bool
+        :param register_workflow_tools: ``True`` (default) to install the tools
+            required by a workflow when it is imported
+        """
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.job_duration = job_duration
+        self.queue_time = queue_time
+        self.upload_duration = upload_duration
+        self.output_size = output_size
+        self.output_factory = output_factory
+        self.failure_rate = failure_rate
+        self.register_workflow_tools = register_workflow_tools
+        self._random = _random.Random(seed)
+        self._lock = _threading.RLock()
+        self._server = None
+        self._thread = None
+        self._counter = 0
+        self._histories = {}
+        self._datasets = {}
+        self._jobs = {}
+        self._workflows = {}
+        self._invocations = {}
+        self._tools = {}
+        self._stats = None
+        self.reset_stats()
+        self._register_tool({"id": UPLOAD_TOOL_ID, "name": "Upload File", "version": "1.1.4"})
+        for tool in tools or []:
+            self._register_tool(tool if isinstance(tool, dict) else {"id": tool[0], "version": tool[1]})
+
+    @property
+    def url(self):
+        """ The base URL of the running server. """
+        if self._server is None:
+            raise RuntimeError("Mock Galaxy server not started")
+        return "http://{0}:{1}".format(self.host, self._server.server_address[1])
+
+    @property
+    def stats(self):
+        """
+        Counters of the served requests: ``requests`` (total number), ``bytes_received``, ``bytes_sent``
+        and ``endpoints``, which maps every ``METHOD handler_name`` to its own counters
+        (``requests``, ``bytes_received``, ``bytes_sent`` and ``time`` spent serving them).
+
+        :rtype: dict
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["endpoints"] = {k: dict(v) for k, v in _iteritems(self._stats["endpoints"])}
+            return stats
+
+    def reset_stats(self):
+        """ Reset the request counters. """
+        with self._lock:
+            self._stats = {"requests": 0, "bytes_received": 0, "bytes_sent": 0, "endpoints": {}}
+
+    def start(self):
+        """ Start serving requests in a background thread. """
+        if self._server is not None:
+            return self
+        self._server = _ThreadingHTTPServer((self.host, self.port), _MockGalaxyRequestHandler)
+        self._server.galaxy = self
+        self._thread = _threading.Thread(target=self._server.serve_forever, name="MockGalaxy")
+        self._thread.daemon = True
+        self._thread.start()
+        _logger.debug("Mock Galaxy server listening on %s", self.url)
+        return self
+
+    def stop(self):
+        """ Stop the server. """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    # ----------------------------------------------------------------------------------------------
+    # Request dispatching
+    # ----------------------------------------------------------------------------------------------
+
+    def handle(self, method, path, params, payload, headers, received=0):
+        """
+        Dispatch an API request.
+
+        :type received: int
+        :param received: the size (in bytes) of the request body (used to update the request counters)
+
+        :rtype: tuple
+        :return: a tuple ``(status_code, body, content_type)``
+        """
+        start_time = _time.time()
+        endpoint = "{0} unknown".format(method)
+        try:
+            if self.api_key is not None \
+                    and headers.get("x-api-key") != self.api_key and params.get("key") != self.api_key:
+                raise MockGalaxyError(403, "Provided API key is not valid.")
+            for route_method, pattern, handler_name in _ROUTES:
+                m = pattern.match(path) if route_method == method else None
+                if m is not None:
+                    if handler_name == "create_workflow" and "workflow_id" in payload:
+                        # legacy API to run a workflow
+                        handler_name = "run_workflow"
+                    endpoint = "{0} {1}".format(method, handler_name)
+                    kwargs = {k: _unquote(v) for k, v in _iteritems(m.groupdict())}
+                    with self._lock:
+                        result = getattr(self, handler_name)(params, payload, **kwargs)
+                    if isinstance(result, bytes):
+                        response = 200, result, "application/octet-stream"
+                    else:
+                        response = 200, _json.dumps(result).encode("utf-8"), "application/json"
+                    break
+            else:
+                raise MockGalaxyError(404, "Unknown API endpoint: {0} {1}".format(method, path))
+        except Exception as e:
+            if not isinstance(e, MockGalaxyError):
+                _logger.exception(e)
+                e = MockGalaxyError(500, "Internal error: {0}".format(e))
+            response = e.status_code, _json.dumps({"err_msg": e.message, "err_code": e.status_code * 1000}) \
+                .encode("utf-8"), "application/json"
+        self._record(endpoint, received, len(response[1]), _time.time() - start_time)
+        return response
+
+    def _record(self, endpoint, received, sent, elapsed_time):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["bytes_received"] += received
+            self._stats["bytes_sent"] += sent
+            counters = self._stats["endpoints"].setdefault(
+                endpoint, {"requests": 0, "bytes_received": 0, "bytes_sent": 0, "time": 0.0})
+            counters["requests"] += 1
+            counters["bytes_received"] += received
+            counters["bytes_sent"] += sent
+            counters["time"] += elapsed_time
+
+    # ----------------------------------------------------------------------------------------------
+    # Server info
+    # ----------------------------------------------------------------------------------------------
+
+    def get_version(self, params, payload):
+        return {"version_major": GALAXY_VERSION, "version_minor": "mock"}
+
+    def get_configuration(self, params, payload):
+        return {"version_major": GALAXY_VERSION, "allow_user_dataset_purge": True}
+
+    def get_current_user(self, params, payload):
+        return {"id": "0" * 16, "username": "wft4galaxy", "email": "wft4galaxy@localhost"}
+
+    # ----------------------------------------------------------------------------------------------
+    # Histories
+    # ----------------------------------------------------------------------------------------------
+
+    def list_histories(self, params, payload):
+        histories = sorted(self._histories.values(), key=lambda h: h["create_time"], reverse=True)
+        filters = dict(zip(_as_list(params.get("q")), _as_list(params.get("qv"))))
+        if "name" in params:
+            filters["name"] = params["name"]
+        deleted = _as_bool(filters.get("deleted", params.get("deleted", False)))
+        histories = [h for h in histories if h["deleted"] == deleted]
+        if "name" in filters:
+            histories = [h for h in histories if h["name"] == filters["name"]]
+        if "name-contains" in filters:
+            histories = [h for h in histories if filters["name-contains"].lower() in h["name"].lower()]
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if params.get("limit") is not None else None
+        histories = histories[offset:offset + limit if limit is not None else None]
+        return [self._history_summary(h) for h in histories]
+
+    def create_history(self, params, payload):
+        history_id = self._new_id()
+        self._histories[history_id] = {"id": history_id, "name": payload.get("name") or "Unnamed history",
+                                       "deleted": False, "purged": False, "contents": [],
+                                       "create_time": _time.time()}
+        return self._show_history(self._histories[history_id])
+
+    def show_history(self, params, payload, history_id):
+        return self._show_history(self._get_history(history_id))
+
+    def update_history(self, params, payload, history_id):
+        history = self._get_history(history_id)
+        for key in ("name", "deleted"):
+            if key in payload:
+                history[key] = payload[key]
+        return self._show_history(history)
+
+    def delete_history(self, params, payload, history_id):
+        history = self._get_history(history_id)
+        history["deleted"] = True
+        history["purged"] = _as_bool(payload.get("purge", params.get("purge", False)))
+        return self._show_history(history)
+
+    def list_history_contents(self, params, payload, history_id):
+        history = self._get_history(history_id)
+        return [self._dataset_summary(self._datasets[d]) for d in history["contents"]
+                if _as_bool(params.get("deleted", False)) or not self._datasets[d]["deleted"]]
+
+    def show_history_dataset(self, params, payload, history_id, dataset_id):
+        return self._show_dataset(self._get_dataset(dataset_id, history_id))
+
+    def delete_history_dataset(self, params, payload, history_id, dataset_id):
+        dataset = self._get_dataset(dataset_id, history_id)
+        dataset["deleted"] = True
+        dataset["purged"] = _as_bool(payload.get("purge", params.get("purge", False)))
+        return self._dataset_summary(dataset)
+
+    def show_dataset_provenance(self, params, payload, history_id, dataset_id):
+        dataset = self._get_dataset(dataset_id, history_id)
+        job = self._jobs[dataset["job_id"]]
+        return {"id": dataset["id"], "job_id": job["id"], "tool_id": job["tool_id"],
+                "parameters": self._job_io(job["inputs"]), "stdout": "", "stderr": ""}
+
+    def display_history_dataset(self, params, payload, history_id, dataset_id):
+        return self._get_dataset(dataset_id, history_id)["content"]
+
+    # ----------------------------------------------------------------------------------------------
+    # Datasets
+    # ----------------------------------------------------------------------------------------------
+
+    def show_dataset(self, params, payload, dataset_id):
+        return self._show_dataset(self._get_dataset(dataset_id))
+
+    def display_dataset(self, params, payload, dataset_id):
+        return self._get_dataset(dataset_id)["content"]
+
+    # ----------------------------------------------------------------------------------------------
+    # Tools
+    # ----------------------------------------------------------------------------------------------
+
+    def list_tools(self, params, payload):
+        return [{"id": t["id"], "name": t["name"], "version": t["version"], "description": "",
+                 "model_class": "Tool"} for t in sorted(self._tools.values(), key=lambda t: t["id"])]
+
+    def show_tool(self, params, payload, tool_id):
+        tool = self._get_tool(tool_id)
+        result = {"id": tool["id"], "name": tool["name"], "version": tool["version"],
+                  "description": "", "model_class": "Tool"}
+        if _as_bool(params.get("io_details", False)):
+            result["inputs"] = [{"name": n, "label": n, "type": "data", "optional": False}
+                                for n in tool["inputs"]]
+            result["outputs"] = [{"name": o["name"], "format": o.get("type", "txt")} for o in tool["outputs"]]
+        return result
+
+    def run_tool(self, params, payload):
+        tool = self._get_tool(payload.get("tool_id"))
+        history = self._get_history(payload.get("history_id"))
+        inputs = payload.get("inputs") or {}
+        if isinstance(inputs, _basestring):
+            inputs = _json.loads(inputs)
+        if tool["id"] == UPLOAD_TOOL_ID:
+            upload = payload.get("files_0|file_data")
+            content = upload["content"] if isinstance(upload, dict) \
+                else (inputs.get("files_0|url_paste") or payload.get("files_0|url_paste") or "").encode("utf-8")
+            name = inputs.get("files_0|NAME") or (upload.get("filename") if isinstance(upload, dict) else None)
+            job = self._create_job(history, tool, {}, {"output0": {
+                "name": name or "Pasted Entry", "content": content,
+                "file_ext": inputs.get("file_type") if inputs.get("file_type") not in (None, "auto") else "txt"}},
+                                   duration=self._sample(self.upload_duration), queue_time=0.0, failed=False)
+        else:
+            job_inputs = {}
+            for name, value in _iteritems(inputs):
+                if isinstance(value, dict) and value.get("src") == "hda":
+                    job_inputs[name] = self._get_dataset(value["id"])
+            job = self._run_tool(history, tool, job_inputs)
+        return {"outputs": [self._dataset_summary(self._datasets[d]) for d in job["outputs"].values()],
+                "jobs": [self._job_summary(job)], "implicit_collections": [], "output_collections": []}
+
+    # ----------------------------------------------------------------------------------------------
+    # Jobs
+    # ----------------------------------------------------------------------------------------------
+
+    def list_jobs(self, params, payload):
+        states = _as_list(params.get("state"))
+        jobs = sorted(self._jobs.values(), key=lambda j: j["create_time"], reverse=True)
+        jobs = [j for j in jobs if (not states or self._job_state(j) in states)
+                and (not params.get("history_id") or j["history_id"] == params["history_id"])]
+        offset = int(params.get("offset", 0))
+        limit = int(params["limit"]) if params.get("limit") is not None else None
+        return [self._job_summary(j) for j in jobs[offset:offset + limit if limit is not None else None]]
+
+    def show_job(self, params, payload, job_id):
+        if job_id not in self._jobs:
+            raise MockGalaxyError(400, "Invalid job id: {0}".format(job_id))
+        job = self._jobs[job_id]
+        result = self._job_summary(job)
+        state = result["state"]
+        result.update({"inputs": self._job_io(job["inputs"]), "outputs": self._job_io(job["outputs"]),
+                       "params": {}, "exit_code": None if state not in ("ok", "error") else int(state == "error")})
+        if _as_bool(params.get("full", False)):
+            result.update({"stdout": "", "stderr": "" if state != "error" else "Mock job failure",
+                           "job_metrics": self._job_metrics(job) if state in ("ok", "error") else [],
+                           "copied_from_job_id": job.get("copied_from_job_id")})
+        return result
+
+    # ----------------------------------------------------------------------------------------------
+    # Workflows
+    # ----------------------------------------------------------------------------------------------
+
+    def list_workflows(self, params, payload):
+        workflows = [w for w in self._workflows.values() if not w["deleted"]]
+        if params.get("name"):
+            workflows = [w for w in workflows if w["name"] == params["name"]]
+        return [self._workflow_summary(w) for w in sorted(workflows, key=lambda w: w["id"])]
+
+    def create_workflow(self, params, payload):
+        definition = payload.get("workflow")
+        if isinstance(definition, _basestring):
+            definition = _json.loads(definition)
+        if not isinstance(definition, dict) or "steps" not in definition:
+            raise MockGalaxyError(400, "Invalid workflow definition")
+        workflow_id = self._new_id()
+        self._workflows[workflow_id] = {"id": workflow_id, "name": definition.get("name", "Unnamed workflow"),
+                                        "definition": definition, "deleted": False,
+                                        "uuid": definition.get("uuid") or workflow_id}
+        if self.register_workflow_tools:
+            for step in definition["steps"].values():
+                if step.get("type") == "tool" and step.get("tool_id"):
+                    self._register_tool({"id": step["tool_id"], "version": step.get("tool_version"),
+                                         "name": step.get("name"), "step": step})
+        return self._workflow_summary(self._workflows[workflow_id])
+
+    def run_workflow(self, params, payload):
+        workflow = self._get_workflow(payload["workflow_id"])
+        history_id = payload.get("history_id") or _re.sub(r"^hist_id=", "", payload.get("history", ""))
+        invocation = self._invoke(workflow, self._get_history(history_id), payload.get("ds_map") or {},
+                                  use_cached_job=_as_bool(payload.get("use_cached_job", False)))
+        return {"history": history_id, "outputs": invocation["output_ids"]}
+
+    def show_workflow(self, params, payload, workflow_id):
+        workflow = self._get_workflow(workflow_id)
+        inputs, steps = {}, {}
+        for step_id, step in _iteritems(workflow["definition"]["steps"]):
+            step_id = str(step_id)
+            connections = {name: {"source_step": str(c["id"]), "step_output": c["output_name"]}
+                           for name, c in _iteritems(_input_connections(step))}
+            steps[step_id] = {"id": step_id, "type": step.get("type"), "tool_id": step.get("tool_id"),
+                              "tool_version": step.get("tool_version"),
+                              "tool_inputs": _json.loads(step["tool_state"]) if step.get("tool_state") else {},
+                              "input_steps": connections, "annotation": step.get("annotation")}
+            if step.get("type") in ("data_input", "data_collection_input", "parameter_input"):
+                inputs[step_id] = {"label": _step_label(step), "value": "", "uuid": step.get("uuid")}
+        result = self._workflow_summary(workflow)
+        result.update({"inputs": inputs, "steps": steps})
+        return result
+
+    def download_workflow(self, params, payload, workflow_id):
+        return self._get_workflow(workflow_id)["definition"]
+
+    def delete_workflow(self, params, payload, workflow_id):
+        self._get_workflow(workflow_id)["deleted"] = True
+        return "Workflow '{0}' successfully deleted".format(workflow_id)
+
+    def invoke_workflow(self, params, payload, workflow_id):
+        workflow = self._get_workflow(workflow_id)
+        history_id = payload.get("history_id") or _re.sub(r"^hist_id=", "", payload.get("history", ""))
+        if history_id:
+            history = self._get_history(history_id)
+        else:
+            history = self._histories[self.create_history({}, {"name": payload.get("history_name")})["id"]]
+        invocation = self._invoke(workflow, history, payload.get("inputs") or payload.get("ds_map") or {},
+                                  use_cached_job=_as_bool(payload.get("use_cached_job", False)))
+        return self._show_invocation(invocation)
+
+    def show_invocation(self, params, payload, invocation_id, workflow_id=None):
+        if invocation_id not in self._invocations:
+            raise MockGalaxyError(404, "Invocation not found: {0}".format(invocation_id))
+        return self._show_invocation(self._invocations[invocation_id])
+
+    # ----------------------------------------------------------------------------------------------
+    # Internals
+    # ----------------------------------------------------------------------------------------------
+
+    def _new_id(self):
+        self._counter += 1
+        return "{0:016x}".format(self._counter)
+
+    def _sample(self, value):
+        if isinstance(value, (tuple, list)):
+            return self._random.uniform(value[0], value[1])
+        return float(value or 0)
+
+    def _register_tool(self, tool):
+        step = tool.get("step") or {}
+        self._tools[tool["id"]] = {"id": tool["id"], "version": tool.get("version"),
+                                   "name": tool.get("name") or tool["id"],
+                                   "inputs": list(tool.get("inputs") or _input_connections(step)),
+                                   "outputs": list(tool.get("outputs") or step.get("outputs") or
+                                                   [{"name": "output", "type": "txt"}])}
+
+    def _get_history(self, history_id):
+        if history_id not in self._histories:
+            raise MockGalaxyError(400, "History not found: {0}".format(history_id))
+        return self._histories[history_id]
+
+    def _get_dataset(self, dataset_id, history_id=None):
+        dataset = self._datasets.get(dataset_id)
+        if dataset is None or (history_id is not None and dataset["history_id"] != history_id):
+            raise MockGalaxyError(400, "Dataset not found: {0}".format(dataset_id))
+        return dataset
+
+    def _get_tool(self, tool_id):
+        if tool_id not in self._tools:
+            raise MockGalaxyError(404, "Tool not found: {0}".format(tool_id))
+        return self._tools[tool_id]
+
+    def _get_workflow(self, workflow_id):
+        if workflow_id not in self._workflows:
+            raise MockGalaxyError(400, "Workflow not found: {0}".format(workflow_id))
+        return self._workflows[workflow_id]
+
+    def _create_job(self, history, tool, inputs, outputs, duration, queue_time, failed, tool_state=None):
+        # a job starts as soon as all its inputs are ready
+        now = _time.time()
+        start = max([now] + [self._jobs[d["job_id"]]["end_time"] for d in inputs.values()])
+        job_id = self._new_id()
+        job = {"id": job_id, "tool_id": tool["id"], "tool_version": tool["version"], "history_id": history["id"],
+               "create_time": now, "start_time": start + queue_time, "end_time": start + queue_time + duration,
+               "failed": failed, "inputs": {n: d["id"] for n, d in _iteritems(inputs)}, "outputs": {},
+               "tool_state": tool_state}
+        self._jobs[job_id] = job
+        for output_name, output in _iteritems(outputs):
+            dataset_id = self._new_id()
+            history["contents"].append(dataset_id)
+            self._datasets[dataset_id] = {"id": dataset_id, "history_id": history["id"], "job_id": job_id,
+                                          "hid": len(history["contents"]), "name": output["name"],
+                                          "file_ext": output.get("file_ext") or "txt",
+                                          "content": b"" if failed else output["content"],
+                                          "create_time": now, "deleted": False, "purged": False,
+                                          "visible": True}
+            job["outputs"][output_name] = dataset_id
+        return job
+
+    def _find_cached_job(self, tool, inputs, tool_state):
+        # like the Galaxy job cache: a finished job of the same tool version, with the same parameters and inputs
+        input_ids = {n: d["id"] for n, d in _iteritems(inputs)}
+        for job in sorted(self._jobs.values(), key=lambda j: j["create_time"]):
+            if job["tool_id"] == tool["id"] and job["tool_version"] == tool["version"] \
+                    and job["inputs"] == input_ids and job["tool_state"] == tool_state \
+                    and self._job_state(job) == "ok":
+                return job
+        return None
+
+    def _run_tool(self, history, tool, inputs, step=None, use_cached_job=False):
+        tool_state = step.get("tool_state") if step is not None else None
+        cached_job = self._find_cached_job(tool, inputs, tool_state) if use_cached_job else None
+        if cached_job is not None:
+            outputs = {name: {"name": self._datasets[dataset_id]["name"],
+                              "file_ext": self._datasets[dataset_id]["file_ext"],
+                              "content": self._datasets[dataset_id]["content"]}
+                       for name, dataset_id in _iteritems(cached_job["outputs"])}
+            job = self._create_job(history, tool, inputs, outputs, duration=0.0, queue_time=0.0, failed=False,
+                                   tool_state=tool_state)
+            job["copied_from_job_id"] = cached_job["id"]
+            return job
+        failed = any(self._jobs[d["job_id"]]["failed"] for d in inputs.values()) \
+                 or self._random.random() < self.failure_rate
+        input_contents = [d["content"] for _, d in sorted(_iteritems(inputs))]
+        outputs = {}
+        for output in tool["outputs"] if step is None else step.get("outputs") or tool["outputs"]:
+            if self.output_factory is not None:
+                content = self.output_factory(tool["id"], output["name"], input_contents)
+            elif self.output_size is not None:
+                content = make_synthetic_content(self.output_size, "{0}:{1}".format(tool["id"], output["name"]))
+            else:
+                content = input_contents[0] if input_contents else b""
+            name = _output_dataset_name(step, output["name"]) if step is not None else None
+            outputs[output["name"]] = {
+                "name": name or "{0} on data {1}".format(
+                    tool["name"], ", ".join(str(d["hid"]) for _, d in sorted(_iteritems(inputs))) or "-"),
+                "file_ext": output.get("type"), "content": content}
+        return self._create_job(history, tool, inputs, outputs, duration=self._sample(self.job_duration),
+                                queue_time=self._sample(self.queue_time), failed=failed, tool_state=tool_state)
+
+    def _invoke(self, workflow, history, inputs, use_cached_job=False):
+        step_outputs = {}
+        output_ids, labelled_outputs, steps = [], {}, []
+        definition = workflow["definition"]
+        for step_id in sorted(definition["steps"], key=lambda s: int(s)):
+            step = definition["steps"][step_id]
+            job = None
+            if step.get("type") == "tool":
+                tool = self._tools.get(step.get("tool_id"))
+                if tool is None or tool["version"] != step.get("tool_version"):
+                    raise MockGalaxyError(400, "Tool {0} (version {1}) not installed".format(
+                        step.get("tool_id"), step.get("tool_version")))
+                job_inputs = {}
+                for name, connection in _iteritems(_input_connections(step)):
+                    key = (str(connection["id"]), connection["output_name"])
+                    if key not in step_outputs:
+                        raise MockGalaxyError(400, "Missing input '{0}' of step {1}".format(name, step_id))
+                    job_inputs[name] = step_outputs[key]
+                job = self._run_tool(history, tool, job_inputs, step, use_cached_job=use_cached_job)
+                for output_name, dataset_id in _iteritems(job["outputs"]):
+                    step_outputs[(str(step_id), output_name)] = self._datasets[dataset_id]
+                    output_ids.append(dataset_id)
+                for workflow_output in step.get("workflow_outputs") or []:
+                    if workflow_output.get("label") and workflow_output["output_name"] in job["outputs"]:
+                        labelled_outputs[workflow_output["label"]] = job["outputs"][workflow_output["output_name"]]
+            elif step.get("type") == "data_input":
+                value = _find_step_input(inputs, step_id, step)
+                if value is None:
+                    raise MockGalaxyError(400, "Workflow input not provided for step {0}".format(step_id))
+                step_outputs[(str(step_id), "output")] = self._get_dataset(value["id"])
+            steps.append({"id": self._new_id(), "order_index": int(step_id), "workflow_step_id": str(step_id),
+                          "job_id": job["id"] if job else None, "state": "scheduled"})
+        invocation_id = self._new_id()
+        self._invocations[invocation_id] = {"id": invocation_id, "workflow_id": workflow["id"],
+                                            "history_id": history["id"], "steps": steps, "inputs": inputs,
+                                            "output_ids": output_ids, "outputs": labelled_outputs,
+                                            "create_time": _time.time()}
+        return self._invocations[invocation_id]
+
+    def _job_state(self, job):
+        now = _time.time()
+        if now < job["start_time"]:
+            return "queued"
+        if now < job["end_time"]:
+            return "running"
+        return "error" if job["failed"] else "ok"
+
+    def _job_io(self, io):
+        return {name: {"id": dataset_id, "src": "hda", "uuid": None} for name, dataset_id in _iteritems(io)}
+
+    def _job_metrics(self, job):
+        runtime = job["end_time"] - job["start_time"]
+        return [{"name": "runtime_seconds", "plugin": "core", "title": "Job Runtime (Wall Clock)",
+                 "value": "{0:.4f} seconds".format(runtime), "raw_value": "{0:.7f}".format(runtime)},
+                {"name": "galaxy_slots", "plugin": "core", "title": "Cores Allocated",
+                 "value": "1", "raw_value": "1.0000000"}]
+
+    def _job_summary(self, job):
+        return {"id": job["id"], "tool_id": job["tool_id"], "tool_version": job["tool_version"],
+                "state": self._job_state(job), "history_id": job["history_id"], "model_class": "Job",
+                "create_time": _isoformat(job["create_time"]),
+                "update_time": _isoformat(min(_time.time(), job["end_time"]))}
+
+    def _dataset_state(self, dataset):
+        return self._job_state(self._jobs[dataset["job_id"]])
+
+    def _dataset_summary(self, dataset):
+        return {"id": dataset["id"], "name": dataset["name"], "hid": dataset["hid"],
+                "history_id": dataset["history_id"], "state": self._dataset_state(dataset),
+                "deleted": dataset["deleted"], "purged": dataset["purged"], "visible": dataset["visible"],
+                "extension": dataset["file_ext"], "type": "file", "history_content_type": "dataset",
+                "url": "/api/histories/{0}/contents/{1}".format(dataset["history_id"], dataset["id"])}
+
+    def _show_dataset(self, dataset):
+        result = self._dataset_summary(dataset)
+        ready = result["state"] == "ok"
+        result.update({"file_ext": dataset["file_ext"], "data_type": dataset["file_ext"],
+                       "file_size": len(dataset["content"]) if ready else 0,
+                       "creating_job": dataset["job_id"], "genome_build": "?", "misc_info": "",
+                       "misc_blurb": "", "annotation": None, "tags": [],
+                       "peek": dataset["content"][:100].decode("utf-8", "replace") if ready else None,
+                       "create_time": _isoformat(dataset["create_time"]),
+                       "model_class": "HistoryDatasetAssociation",
+                       "download_url": "/api/histories/{0}/contents/{1}/display".format(
+                           dataset["history_id"], dataset["id"])})
+        return result
+
+    def _history_summary(self, history):
+        return {"id": history["id"], "name": history["name"], "deleted": history["deleted"],
+                "purged": history["purged"], "tags": [], "annotation": None, "published": False,
+                "create_time": _isoformat(history["create_time"]), "update_time": _isoformat(_time.time()),
+                "model_class": "History", "url": "/api/histories/{0}".format(history["id"])}
+
+    def _show_history(self, history):
+        result = self._history_summary(history)
+        state_ids = {s: [] for s in ("new", "queued", "running", "ok", "error", "paused")}
+        size = 0
+        for dataset_id in history["contents"]:
+            dataset = self._datasets[dataset_id]
+            if not dataset["deleted"]:
+                state_ids[self._dataset_state(dataset)].append(dataset_id)
+                size += len(dataset["content"])
+        pending = any(state_ids[s] for s in ("new", "queued", "running"))
+        result.update({"state_ids": state_ids, "state_details": {s: len(ids) for s, ids in _iteritems(state_ids)},
+                       "state": "running" if pending else "error" if state_ids["error"] else "ok",
+                       "size": size, "nice_size": "{0} bytes".format(size),
+                       "hid_counter": len(history["contents"]) + 1, "user_id": "0" * 16})
+        return result
+
+    def _workflow_summary(self, workflow):
+        return {"id": workflow["id"], "name": workflow["name"], "deleted": workflow["deleted"],
+                "published": False, "owner": "wft4galaxy", "tags": [], "model_class": "StoredWorkflow",
+                "latest_workflow_uuid": workflow["uuid"], "url": "/api/workflows/{0}".format(workflow["id"])}
+
+    def _show_invocation(self, invocation):
+        scheduled = all(self._job_state(self._jobs[s["job_id"]]) in ("ok", "error")
+                        for s in invocation["steps"] if s["job_id"])
+        return {"id": invocation["id"], "workflow_id": invocation["workflow_id"],
+                "history_id": invocation["history_id"], "state": "scheduled", "model_class": "WorkflowInvocation",
+                "steps": invocation["steps"], "inputs": invocation["inputs"],
+                "outputs": {label: {"id": d, "src": "hda"} for label, d in _iteritems(invocation["outputs"])},
+                "output_collections": {}, "create_time": _isoformat(invocation["create_time"]),
+                "update_time": _isoformat(_time.time()), "jobs_completed": scheduled}
+
+
+class _ThreadingHTTPServer(_ThreadingMixIn, _HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _MockGalaxyRequestHandler(_BaseHTTPRequestHandler):
+    """ Translate HTTP requests into calls of the :class:`MockGalaxy` API handlers """
+
+    # keep connections alive (required to test connection pooling)
+    protocol_version = "HTTP/1.1"
+
+    def _handle(self, method):
+        url = _urlparse(self.path)
+        params = {k: v[0] if len(v) == 1 else v
+                  for k, v in _iteritems(_parse_qs(url.query, keep_blank_values=True))}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length > 0 else b""
+        payload = _parse_payload(body, self.headers.get("Content-Type") or "")
+        headers = {k.lower(): v for k, v in self.headers.items()}
+        status_code, content, content_type = self.server.galaxy.handle(method, url.path, params, payload, headers,
+                                                                       received=len(body))
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(content)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        _logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def _route(method, pattern, handler_name):
+    return method, _re.compile("^/api/" + pattern + "/?$"), handler_name
+
+
+_ID = r"(?P<{0}>[^/]+)"
+
+# API endpoints emulated by the mock server: the first matching route is used
+_ROUTES = [
+    _route("GET", "version", "get_version"),
+    _route("GET", "configuration", "get_configuration"),
+    _route("GET", "(?:users/current|whoami)", "get_current_user"),
+    _route("GET", "histories", "list_histories"),
+    _route("POST", "histories", "create_history"),
+    _route("GET", "histories/" + _ID.format("history_id"), "show_history"),
+    _route("PUT", "histories/" + _ID.format("history_id"), "update_history"),
+    _route("DELETE", "histories/" + _ID.format("history_id"), "delete_history"),
+    _route("GET", "histories/" + _ID.format("history_id") + "/contents", "list_history_contents"),
+    _route("GET", "histories/" + _ID.format("history_id") + "/contents/(?:datasets/)?" + _ID.format("dataset_id"),
+           "show_history_dataset"),
+    _route("DELETE", "histories/" + _ID.format("history_id") + "/contents/(?:datasets/)?" + _ID.format("dataset_id"),
+           "delete_history_dataset"),
+    _route("GET", "histories/" + _ID.format("history_id") + "/contents/" + _ID.format("dataset_id") + "/display",
+           "display_history_dataset"),
+    _route("GET", "histories/" + _ID.format("history_id") + "/contents/" + _ID.format("dataset_id") + "/provenance",
+           "show_dataset_provenance"),
+    _route("GET", "datasets/" + _ID.format("dataset_id"), "show_dataset"),
+    _route("GET", "datasets/" + _ID.format("dataset_id") + "/(?:display|download)", "display_dataset"),
+    _route("GET", "tools", "list_tools"),
+    _route("POST", "tools", "run_tool"),
+    _route("GET", "tools/(?P<tool_id>.+?)", "show_tool"),
+    _route("GET", "jobs", "list_jobs"),
+    _route("GET", "jobs/" + _ID.format("job_id"), "show_job"),
+    _route("GET", "workflows", "list_workflows"),
+    _route("POST", "workflows(?:/upload)?", "create_workflow"),
+    _route("GET", "workflows/" + _ID.format("workflow_id"), "show_workflow"),
+    _route("GET", "workflows/" + _ID.format("workflow_id") + "/download", "download_workflow"),
+    _route("DELETE", "workflows/" + _ID.format("workflow_id"), "delete_workflow"),
+    _route("POST", "workflows/" + _ID.format("workflow_id") + "/invocations", "invoke_workflow"),
+    _route("GET", "workflows/" + _ID.format("workflow_id") + "/invocations/" + _ID.format("invocation_id"),
+           "show_invocation"),
+    _route("GET", "invocations/" + _ID.format("invocation_id"), "show_invocation"),
+]
+
+
+def make_synthetic_content(size, key=""):
+    """
+    Generate a deterministic tab-separated text of ``size`` bytes.
+
+    :type size: int
+    :param size: the size (in bytes) of the content
+
+    :type key: str
+    :param key: a string which identifies the content (the same key always generates the same content)
+
+    :rtype: bytes
+    """
+    generator = _random.Random(key)
+    lines, length, row = [], 0, 0
+    while length < size:
+        line = "{0}\t{1}\t{2:.6f}\n".format(row, generator.randint(0, 1 << 20), generator.random())
+        lines.append(line)
+        length += len(line)
+        row += 1
+    return "".join(lines).encode("utf-8")[:size]
+
+
+def _isoformat(timestamp):
+    return _datetime.datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _as_bool(value):
+    if isinstance(value, _basestring):
+        return value.lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+def _input_connections(step):
+    connections = {}
+    for name, connection in _iteritems(step.get("input_connections") or {}):
+        connections[name] = connection[0] if isinstance(connection, list) else connection
+    return connections
+
+
+def _step_label(step):
+    if step.get("label"):
+        return step["label"]
+    inputs = step.get("inputs") or []
+    return inputs[0]["name"] if inputs else step.get("name")
+
+
+def _find_step_input(inputs, step_id, step):
+    for key in (str(step_id), _step_label(step), step.get("uuid")):
+        if key is not None and key in inputs:
+            value = inputs[key]
+            return value[0] if isinstance(value, list) else value
+    return None
+
+
+def _output_dataset_name(step, output_name):
+    for action in (step.get("post_job_actions") or {}).values():
+        if action.get("action_type") == "RenameDatasetAction" and action.get("output_name") == output_name:
+            return action["action_arguments"]["newname"]
+    for workflow_output in step.get("workflow_outputs") or []:
+        if workflow_output.get("output_name") == output_name and workflow_output.get("label"):
+            return workflow_output["label"]
+    return None
+
+
+def _parse_payload(body, content_type):
+    if not body:
+        return {}
+    if content_type.startswith("multipart/form-data"):
+        return _parse_multipart(body, content_type)
+    try:
+        payload = _json.loads(body.decode("utf-8"))
+    except ValueError:
+        payload = {k: v[0] for k, v in _iteritems(_parse_qs(body.decode("utf-8")))}
+    return payload if isinstance(payload, dict) else {}
+
+
+def _parse_multipart(body, content_type):
+    """
+    Parse a ``multipart/form-data`` body: files are returned as dictionaries
+    with the ``filename`` and ``content`` keys; the other fields as strings.
+    """
+    m = _re.search(r'boundary="?([^";]+)"?', content_type)
+    if m is None:
+        raise MockGalaxyError(400, "Invalid multipart request")
+    fields = {}
+    for part in body.split(b"--" + m.group(1).encode("utf-8")):
+        if b"\r\n\r\n" not in part:
+            continue
+        headers, content = part.split(b"\r\n\r\n", 1)
+        if content.endswith(b"\r\n"):
+            content = content[:-2]
+        headers = headers.decode("utf-8")
+        name = _re.search(r'name="([^"]*)"', headers)
+        if name is None:
+            continue
+        filename = _re.search(r'filename="([^"]*)"', headers)
+        if filename is not None:
+            fields[name.group(1)] = {"filename": filename.group(1), "content": content}
+        else:
+            value = content.decode("utf-8")
+            try:
+                value = _json.loads(value) if value[:1] in ("{", "[") else value
+            except ValueError:
+                pass
+            fields[name.group(1)] = value
+    return fields
@@ -0,0 +1,78 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+
+def prune_workflow(workflow_graph, output_names):
+    """
+    Remove from a workflow definition all the steps which don't contribute to the ``output_names``,
+    i.e., the steps which are not in the upstream closure of the steps producing them.
+    The remaining steps are renumbered preserving their order.
+
+    :type workflow_graph: :class:`wft4galaxy.core.WorkflowGraph`
+    :param workflow_graph: the graph of the workflow (not modified)
+
+    :type output_names: list
+    :param output_names: the names of the outputs to preserve
+
+    :rtype: tuple
+    :return: a pair (<PRUNED_DEFINITION>, <STEP_MAP>) where <STEP_MAP> maps the ID of every preserved step
+        to its new ID; ``(None, None)`` if some of the ``output_names`` cannot be mapped to a step
+    """
+    output_steps, unmatched = workflow_graph.find_output_steps(output_names)
+    if unmatched:
+        _logger.warning("Unable to prune the workflow: no step produces the output(s) %s", ", ".join(unmatched))
+        return None, None
+    kept = sorted(workflow_graph.upstream(output_steps))
+    step_map = {old_id: new_id for new_id, old_id in enumerate(kept)}
+    pruned = workflow_graph.get_definition()
+    steps = pruned["steps"]
+    pruned["steps"] = {}
+    for old_id in kept:
+        step = steps[str(old_id)]
+        step["id"] = step_map[old_id]
+        for connection in (step.get("input_connections") or {}).values():
+            for c in (connection if isinstance(connection, list) else [connection]):
+                c["id"] = step_map[int(c["id"])]
+        pruned["steps"][str(step_map[old_id])] = step
+    _logger.debug("Pruned workflow: %d of %d steps preserved", len(kept), len(steps))
+    return pruned, step_map
+
+
+def get_removed_inputs(workflow_graph, step_map):
+    """
+    :rtype: set
+    :return: the labels of the workflow inputs removed by :func:`prune_workflow`
+    """
+    return set(label for label, step_id in _iteritems(workflow_graph.input_steps) if step_id not in step_map)
+
+
+def remap_params(params, step_map):
+    """
+    Update the step parameters of a workflow test to refer to the steps of the pruned workflow:
+    the parameters of removed steps are dropped, while the ones identified by a tool ID are preserved.
+
+    :type params: dict
+    :param params: map <STEP_ID_OR_TOOL_ID>:<PARAMS>
+
+    :type step_map: dict
+    :param step_map: the step map returned by :func:`prune_workflow`
+
+    :rtype: dict
+    :return: the updated step parameters
+    """
+    remapped = {}
+    for step, step_params in _iteritems(params or {}):
+        try:
+            step_id = int(step)
+        except (TypeError, ValueError):
+            remapped[step] = step_params
+            continue
+        if step_id in step_map:
+            remapped[step_map[step_id]] = step_params
+    return remapped
@@ -8,7 +8,9 @@ import time as _time
 import shutil as _shutil
 import logging as _logging
 import unittest as _unittest
+import threading as _threading
 from uuid import uuid1 as _uuid1
+from multiprocessing.pool import ThreadPool as _ThreadPool
 
 try:
     from StringIO import StringIO as _StringIO
@@ -22,6 +24,12 @@ from xmlrunner.result import _XMLTestResult
 # wft4galaxy dependencies
 import wft4galaxy.core as _core
 from wft4galaxy import common as _common
+from wft4galaxy import metrics as _metrics
+from wft4galaxy import pruning as _pruning
+from wft4galaxy import sharding as _sharding
+from wft4galaxy import loadtest as _loadtest
+from wft4galaxy import journal as _journal
+from wft4galaxy import incremental as _incremental
 from wft4galaxy import comparators as _comparators
 
 # the encoding name needs to be one of
@@ -49,6 +57,16 @@ _SUPPORTED_REPORT_FORMATS = {
     "xunit": "xml"
 }
 
+# states of Galaxy datasets whose job is not terminated yet
+_PENDING_DATASET_STATES = frozenset(["new", "upload", "queued", "running", "setting_metadata"])
+# terminal states of datasets which cannot be downloaded or compared
+# (``paused``: a job upstream failed; ``deferred``: the dataset has not been materialized)
+_ERROR_DATASET_STATES = frozenset(["error", "failed_metadata", "paused", "deferred"])
+# states of workflow invocations not scheduled yet
+_PENDING_INVOCATION_STATES = frozenset(["new", "ready"])
+# states of workflow invocations which will not be scheduled
+_FAILED_INVOCATION_STATES = frozenset(["failed", "cancelled", "cancelling"])
+
 
 class WorkflowTestsRunner():
     """
@@ -57,6 +75,7 @@ class WorkflowTestsRunner():
 
     def __init__(self, galaxy_url=None, galaxy_api_key=None,
                  max_retries=None, retry_delay=None, polling_interval=None,
+                 max_request_rate=None, max_active_jobs=None, history_pool_size=None,
                  output_folder='.', stream=_sys.stderr,
                  descriptions=True, verbosity=1, elapsed_times=True):
         self.galaxy_api_key = galaxy_api_key
@@ -64,7 +83,10 @@ class WorkflowTestsRunner():
         # create Galaxy instance
         self._galaxy_instance = _common.get_galaxy_instance(galaxy_url, galaxy_api_key,
                                                             max_retries=max_retries, retry_delay=retry_delay,
-                                                            polling_interval=polling_interval)
+                                                            polling_interval=polling_interval,
+                                                            max_request_rate=max_request_rate,
+                                                            max_active_jobs=max_active_jobs,
+                                                            history_pool_size=history_pool_size)
 
         # create WorkflowLoader
         self._workflow_loader = _common.WorkflowLoader.get_instance(self._galaxy_instance)
@@ -79,7 +101,8 @@ class WorkflowTestsRunner():
 
     def _setup(self, test, output_folder=None, verbosity=2,
                disable_assertions=None, disable_cleanup=None, enable_logger=None, enable_debug=None,
-               max_retries=None, retry_delay=None, polling_interval=None):
+               max_retries=None, retry_delay=None, polling_interval=None,
+               max_request_rate=None, max_active_jobs=None, history_pool_size=None):
         """ Update runner configuration accordingly to the test configuration"""
 
         if enable_logger is not None:
@@ -96,6 +119,9 @@ class WorkflowTestsRunner():
         self._galaxy_instance.retry_delay = retry_delay or getattr(test, "retry_delay", None) or _common.RETRY_DELAY
         self._galaxy_instance.polling_interval = polling_interval \
                                                  or getattr(test, "polling_interval", None) or _common.POLLING_INTERVAL
+        self._galaxy_instance.max_request_rate = max_request_rate or getattr(test, "max_request_rate", None)
+        self._galaxy_instance.max_active_jobs = max_active_jobs or getattr(test, "max_active_jobs", None)
+        self._galaxy_instance.history_pool_size = history_pool_size or getattr(test, "history_pool_size", None)
 
         # update verbosity level
         self._runner.verbosity = verbosity
@@ -109,15 +135,30 @@ class WorkflowTestsRunner():
             _common.LoggerManager.configure_logging(_logging.DEBUG if test.enable_debug else _logging.INFO)
 
     def _make_wrappers(self, test, filter=None, output_folder=None,
-                       disable_assertions=None, disable_cleanup=None, enable_logger=None, enable_debug=None):
-
+                       disable_assertions=None, disable_cleanup=None, enable_logger=None, enable_debug=None,
+                       metrics_baseline=None, timing_db=None, shard=None, result_cache=None, journal=None):
+
+        if isinstance(test, _core.WorkflowTestCase) and test.matrix:
+            # a parameter sweep is run as a suite of its cases
+            suite = _core.WorkflowTestSuite(output_folder=test.output_folder,
+                                            enable_logger=test.enable_logger, enable_debug=test.enable_debug,
+                                            disable_cleanup=test.disable_cleanup,
+                                            disable_assertions=test.disable_assertions,
+                                            reuse_cached_jobs=bool(test.reuse_cached_jobs),
+                                            prune_workflow=bool(test.prune_workflow))
+            suite.add_workflow_test(test)
+            test = suite
         if isinstance(test, _core.WorkflowTestCase):
-            return WorkflowTestCaseRunner(self._galaxy_instance, self._workflow_loader, test)
+            return WorkflowTestCaseRunner(self._galaxy_instance, self._workflow_loader, test,
+                                          metrics_baseline=metrics_baseline, result_cache=result_cache,
+                                          journal=journal)
         elif isinstance(test, _core.WorkflowTestSuite):
             return WorkflowTestSuiteRunner(self._galaxy_instance, self._workflow_loader, test, filter,
                                            # output_folder=output_folder,
                                            disable_assertions=disable_assertions, disable_cleanup=disable_cleanup,
-                                           enable_logger=enable_logger, enable_debug=enable_debug)
+                                           enable_logger=enable_logger, enable_debug=enable_debug,
+                                           metrics_baseline=metrics_baseline, timing_db=timing_db, shard=shard,
+                                           result_cache=result_cache, journal=journal)
         else:
             raise UnsupportedTestCaseException("{} not supported".format(test.__class__.name))
 
@@ -125,7 +166,9 @@ class WorkflowTestsRunner():
             output_folder=None, output_suffix=None,
             report_format=None, report_filename=None,
             disable_assertions=None, disable_cleanup=None, enable_logger=None, enable_debug=None,
-            max_retries=None, retry_delay=None, polling_interval=None):
+            max_retries=None, retry_delay=None, polling_interval=None,
+            max_request_rate=None, max_active_jobs=None, metrics_baseline=None, timing_db=None, shard=None,
+            result_cache=None, history_pool_size=None, journal=None):
 
         """ Run a single test case or a suite of test cases. """
 
@@ -136,13 +179,17 @@ class WorkflowTestsRunner():
         self._setup(test, output_folder=output_folder, verbosity=verbosity,
                     disable_assertions=disable_assertions, disable_cleanup=disable_cleanup,
                     enable_logger=enable_logger, enable_debug=enable_debug,
-                    max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval)
+                    max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+                    max_request_rate=max_request_rate, max_active_jobs=max_active_jobs,
+                    history_pool_size=history_pool_size)
 
         # prepare wrappers
         self._logger.debug("Creating unittest wrappers...")
         test_wrapper = self._make_wrappers(test, filter, output_folder=output_folder,
                                            disable_assertions=disable_assertions, disable_cleanup=disable_cleanup,
-                                           enable_logger=enable_logger, enable_debug=enable_debug)
+                                           enable_logger=enable_logger, enable_debug=enable_debug,
+                                           metrics_baseline=metrics_baseline, timing_db=timing_db, shard=shard,
+                                           result_cache=result_cache, journal=journal)
         self._logger.debug("Creating unittest wrappers: done")
 
         # run tests
@@ -151,9 +198,10 @@ class WorkflowTestsRunner():
             if report_filename and \
                     not _os.path.isabs(report_filename) and not report_filename.startswith("./"):
                 report_filename = _os.path.join(output_folder, report_filename)
-            result = self._runner.run(test_wrapper,
-                                      report_format=report_format,
-                                      report_filename=report_filename)
+            with _common.Tracer.get_instance().span("run", key=str(test_wrapper), category="runner"):
+                result = self._runner.run(test_wrapper,
+                                          report_format=report_format,
+                                          report_filename=report_filename)
 
             test_result = test_wrapper.test_result
             if isinstance(test_wrapper, WorkflowTestSuiteRunner):
@@ -170,10 +218,51 @@ class WorkflowTestsRunner():
         finally:
             if not test.disable_cleanup:
                 test_wrapper.cleanup(test.output_folder)
+                # delete the pooled histories all together
+                self._galaxy_instance.history_pool.close()
+                # wait for the queued deletions
+                self._galaxy_instance.cleanup_queue.drain()
+            response_cache = _common.ConnectionManager.get_instance().response_cache
+            if response_cache is not None:
+                self._logger.debug("Response cache stats: %r", response_cache.stats)
+            if metrics_baseline is not None and metrics_baseline.update and metrics_baseline.filename:
+                metrics_baseline.save()
+            if result_cache is not None and result_cache.filename:
+                result_cache.save()
+            if timing_db is not None:
+                runners = test_wrapper._workflow_runners \
+                    if isinstance(test_wrapper, WorkflowTestSuiteRunner) else [test_wrapper]
+                timing_db.record_run({r.worflow_test_name: r.test_result for r in runners})
 
         # build and return the result wrapper
         return test_result
 
+    def run_load_test(self, test, repeat, concurrency=_loadtest.DEFAULT_CONCURRENCY,
+                      disable_cleanup=None, enable_logger=None, enable_debug=None,
+                      max_retries=None, retry_delay=None, polling_interval=None,
+                      max_request_rate=None, max_active_jobs=None):
+
+        """ Invoke the workflow of a single test case many times concurrently
+        (see :meth:`WorkflowTestCaseRunner.run_load_test`). """
+
+        if not isinstance(test, _core.WorkflowTestCase):
+            raise UnsupportedTestCaseException("Load tests require a single workflow test case")
+
+        # deepcopy to avoid side effects
+        test = _copy.deepcopy(test)
+
+        # update configuration
+        self._setup(test, disable_cleanup=disable_cleanup, enable_logger=enable_logger, enable_debug=enable_debug,
+                    max_retries=max_retries, retry_delay=retry_delay, polling_interval=polling_interval,
+                    max_request_rate=max_request_rate, max_active_jobs=max_active_jobs)
+
+        test_runner = WorkflowTestCaseRunner(self._galaxy_instance, self._workflow_loader, test)
+        try:
+            with _common.Tracer.get_instance().span("load_test", key=test.name, category="runner"):
+                return test_runner.run_load_test(repeat, concurrency, disable_cleanup=test.disable_cleanup)
+        finally:
+            self._galaxy_instance.cleanup_queue.drain()
+
 
 class _WorkflowTestResultReporterImpl(_core.WorkflowTestReportGenerator):
     """ Concrete class which implements the `generate_report` method."""
@@ -357,6 +446,8 @@ class _ExtendedXMLTestResult(_XMLTestResult):
             testsuite = _XMLTestResult._report_testsuite(
                 suite_name, tests, doc, parentElement, self.properties
             )
+            self._report_properties(testsuite, doc)
+            self._report_shard(testsuite, doc)
             xml_content = doc.toprettyxml(
                 indent='\t',
                 encoding=_UTF8
@@ -365,13 +456,70 @@ class _ExtendedXMLTestResult(_XMLTestResult):
         # Assume that test_runner.output is a stream
         stream.write(xml_content)
 
+    def _report_shard(self, testsuite, doc):
+        """
+        Add to `testsuite` the ``<property>`` elements identifying the shard of the test suite
+        and the digest of its partition, checked when the reports of the shards are merged
+        (see :func:`wft4galaxy.sharding.merge_xunit_reports`).
+        """
+        shard = getattr(self.test, "shard", None)
+        if shard is None:
+            return
+        properties = doc.createElement("properties")
+        for name, value in ((_sharding.SHARD_PROPERTY, str(shard)),
+                            (_sharding.PARTITION_DIGEST_PROPERTY, self.test.partition_digest)):
+            prop = doc.createElement("property")
+            prop.setAttribute("name", name)
+            prop.setAttribute("value", value)
+            properties.appendChild(prop)
+        testsuite.insertBefore(properties, testsuite.firstChild)
+
+    def _report_properties(self, testsuite, doc):
+        """
+        Add to the `testcase` elements of `testsuite` a list of ``<property>`` elements reporting
+        the timings of the test phases (``time.<PHASE_LABEL>``), the tracked job metrics
+        (``job.<STEP>.<METRIC>``), the job metrics which exceed their baseline (``regression.<STEP>.<METRIC>``)
+        the exceeded performance budgets (``violation.<BUDGET>.<SUBJECT>``) and the steps served
+        by the Galaxy job cache (``cached_steps``).
+        """
+        runners = self.test._workflow_runners \
+            if isinstance(self.test, WorkflowTestSuiteRunner) else [self.test]
+        test_results = {"test_" + r.worflow_test_name: r.test_result
+                        for r in runners if getattr(r, "test_result", None) is not None}
+        for testcase in testsuite.getElementsByTagName("testcase"):
+            test_result = test_results.get(testcase.getAttribute("name"))
+            if test_result is None:
+                continue
+            values = [("time.{0}".format(label), "{0:.3f}".format(duration))
+                      for label, duration in _iteritems(test_result.get_timings())]
+            for step, job in _iteritems(test_result.job_metrics):
+                values.extend([("job.{0}.{1}".format(step, metric), "{0:g}".format(job["metrics"][metric]))
+                               for metric in _metrics.TRACKED_METRICS if metric in job["metrics"]])
+            values.extend([("regression.{0}.{1}".format(r.step, r.metric),
+                            "{0:g} (baseline {1:g}, +{2:.1f}%)".format(r.value, r.baseline, r.increase))
+                           for r in test_result.metric_regressions])
+            values.extend([("violation.{0}.{1}".format(v.budget, v.subject), "{0:g} > {1:g}".format(v.value, v.limit))
+                           for v in test_result.budget_violations])
+            if test_result.cached_steps:
+                values.append(("cached_steps", ",".join(test_result.cached_steps)))
+            if not values:
+                continue
+            properties = doc.createElement("properties")
+            for name, value in values:
+                prop = doc.createElement("property")
+                prop.setAttribute("name", name)
+                prop.setAttribute("value", value)
+                properties.appendChild(prop)
+            testcase.insertBefore(properties, testcase.firstChild)
+
 
 class WorkflowTestCaseRunner(_unittest.TestCase):
     """
     Class responsible for launching a workflow test.
     """
 
-    def __init__(self, galaxy_instance, workflow_loader, workflow_test_config, test_suite_runner=None):
+    def __init__(self, galaxy_instance, workflow_loader, workflow_test_config, test_suite_runner=None,
+                 metrics_baseline=None, result_cache=None, parameter_sweep=None, journal=None):
         self._galaxy_instance = galaxy_instance
         self._workflow_loader = workflow_loader
         self._workflow_test_config = workflow_test_config
@@ -383,8 +531,17 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         self._test_cases = {}
         self._uuid = None
         self._galaxy_workflow = None
+        self._step_map = None
+        self._removed_inputs = set()
         self._file_handler = None
+        self._span_recorder = None
+        self._metrics_baseline = metrics_baseline
+        self._result_cache = result_cache
+        self._parameter_sweep = parameter_sweep
+        self._journal = journal
         self.test_result = None
+        if parameter_sweep is not None:
+            parameter_sweep.add_runner(self)
 
         setattr(self, "test_" + workflow_test_config.name, self.run_test)
         super(WorkflowTestCaseRunner, self).__init__("test_" + workflow_test_config.name)
@@ -435,12 +592,60 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         :return: a :class:`bioblend.galaxy.objects.wrappers.Workflow` instance
         """
         if not self._galaxy_workflow:
-            self._galaxy_workflow = self._workflow_loader.load_workflow(
-                self._workflow_test_config,
+            pruned_definition = None
+            if self._workflow_test_config.prune_workflow:
+                pruned_definition = self._prune_workflow()
+            if self._parameter_sweep is not None:
+                # the cases of a parameter sweep share the same imported workflow
+                self._galaxy_workflow = self._parameter_sweep.get_workflow(
+                    lambda: self._import_workflow(pruned_definition))
+            else:
+                self._galaxy_workflow = self._import_workflow(pruned_definition)
+        return self._galaxy_workflow
+
+    def _import_workflow(self, pruned_definition=None):
+        if pruned_definition is not None:
+            return self._workflow_loader.load_workflow_definition(
+                pruned_definition,
                 workflow_name_prefix=_core.WorkflowTestCase.DEFAULT_WORKFLOW_NAME_PREFIX,
-                workflow_name_suffix=self.uuid
+                workflow_name_suffix=self.uuid,
+                filename=self._workflow_test_config.filename
             )
-        return self._galaxy_workflow
+        return self._workflow_loader.load_workflow(
+            self._workflow_test_config,
+            workflow_name_prefix=_core.WorkflowTestCase.DEFAULT_WORKFLOW_NAME_PREFIX,
+            workflow_name_suffix=self.uuid
+        )
+
+    def _prune_workflow(self):
+        """
+        Remove from the workflow definition the steps not needed to produce the expected outputs.
+
+        :rtype: dict
+        :return: the pruned workflow definition; ``None`` if the workflow cannot be pruned
+        """
+        graph = self._workflow_test_config.workflow_graph
+        pruned_definition, step_map = _pruning.prune_workflow(graph, list(self._workflow_test_config.expected_outputs))
+        if pruned_definition is not None:
+            self._step_map = step_map
+            self._removed_inputs = _pruning.get_removed_inputs(graph, step_map)
+            _logger.info("Workflow of test '%s' pruned to %d of %d steps (unused inputs: %s)",
+                         self.worflow_test_name, len(step_map), len(graph.steps),
+                         ", ".join(sorted(self._removed_inputs)) or "none")
+        return pruned_definition
+
+    def _adapt_to_pruned_workflow(self, inputs, params):
+        """
+        Drop the inputs which the pruned workflow doesn't use and renumber the steps of the ``params``
+        (no-op if the workflow hasn't been pruned).
+
+        :rtype: tuple
+        :return: the pair (<INPUTS>, <PARAMS>) to use with the imported workflow
+        """
+        if self._step_map is None:
+            return inputs, params
+        return {label: config for label, config in _iteritems(inputs) if label not in self._removed_inputs}, \
+            _pruning.remap_params(params, self._step_map)
 
     def run_test(self, base_path=None, inputs=None, params=None, expected_outputs=None,
                  output_folder=None, disable_assertions=None, disable_cleanup=None,
@@ -473,8 +678,39 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         # set basepath
         base_path = self._base_path if not base_path else base_path
 
-        # load workflow
-        workflow = self.get_galaxy_workflow()
+        # let Galaxy reuse the outputs of equivalent jobs
+        reuse_cached_jobs = bool(self._workflow_test_config.reuse_cached_jobs)
+
+        # collect the timings of the test phases
+        spans = self._span_recorder = _common.SpanRecorder()
+        test_span = _common.TimingSpan("workflow_test", key=self.worflow_test_name, category="test")
+        max_wall_time = self._workflow_test_config.max_wall_time
+        deadline = test_span.start_time + max_wall_time if max_wall_time else None
+
+        # skip the test if it already passed with the same fingerprint
+        fingerprint = None
+        if inputs is None and params is None and expected_outputs is None:
+            fingerprint = self._get_fingerprint()
+        if fingerprint is not None and self._result_cache.is_passed(self.worflow_test_name, fingerprint):
+            return self._report_cached_pass(fingerprint, test_span, output_folder, disable_assertions)
+
+        # report the result of the test completed by the interrupted run which is being resumed
+        journal_fingerprint = self._get_journal_fingerprint() if self._journal is not None else None
+        if self._journal is not None and self._journal.resume \
+                and self._journal.is_completed(self.worflow_test_name, journal_fingerprint):
+            return self._report_resumed_result(test_span, output_folder, disable_assertions, journal_fingerprint)
+
+        # look up the invocation scheduled by the interrupted run which is being resumed
+        reattached = None
+        if self._journal is not None and self._journal.resume:
+            reattached = self._reattach(journal_fingerprint)
+            if reattached is None and self._journal.attach_only:
+                # invocations are never submitted again when attaching to them
+                return self._report_not_attached(test_span, output_folder, disable_assertions)
+
+        # load workflow (the one of the reattached invocation, if it still exists)
+        with spans.span("import_workflow"):
+            workflow = self.get_galaxy_workflow()
 
         # output folder
         if output_folder is None:
@@ -506,6 +742,15 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
             params = self._workflow_test_config.params
             _logger.debug("Using default params")
 
+        # check that the params refer to workflow steps or tools
+        unknown_params = self._workflow_test_config.workflow_graph.find_unknown_params(params)
+        if unknown_params:
+            _logger.warning("The params of the steps %s don't match any step or tool of the workflow",
+                            ", ".join([str(p) for p in unknown_params]))
+
+        # refer to the steps and inputs of the pruned workflow
+        uploaded_inputs, params = self._adapt_to_pruned_workflow(inputs, params)
+
         # check expected_output_map
         if expected_outputs is None:
             if len(self._workflow_test_config.expected_outputs) > 0:
@@ -529,38 +774,56 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
 
         # check tools
         errors = []
-        missing_tools = self.find_missing_tools()
+        budget_violations = []
+        with spans.span("check_tools"):
+            missing_tools = self.find_missing_tools()
         if len(missing_tools) == 0:
 
             try:
 
-                # create a new history for the current test
-                history = self._galaxy_instance.histories.create(
-                    "-".join([_core.WorkflowTestCase.DEFAULT_HISTORY_NAME_PREFIX,
-                              self._workflow_test_config.name.replace(" ", ""), test_uuid]))
-                _logger.info("Create a history '%s' (id: %r)", history.name, history.id)
-
-                # upload input data to the current history
-                # and generate the datamap INPUT --> DATASET
-                datamap = {}
-                for label, config in _iteritems(inputs):
-                    datamap[label] = []
-                    for filename in config["file"]:
-                        dataset_filename = filename if _os.path.isabs(filename) else _os.path.join(base_path, filename)
-                        if config["type"]:
-                            datamap[label].append(
-                                history.upload_dataset(dataset_filename, file_type=config["type"]))
-                        else:
-                            datamap[label].append(history.upload_dataset(dataset_filename))
-
-                # run the workflow
-                _logger.debug("About to launch workflow.")
-                _logger.debug("history: %r", history)
-                _logger.debug("datamap: %r", datamap)
-                _logger.debug("params: %r", params)
-                _logger.info("Workflow '%s' (id: %s) running ...", workflow.name, workflow.id)
-                outputs, output_history = workflow.run(datamap, history, params=params, wait=True,
-                                                       polling_interval=self._galaxy_instance.polling_interval)
+                if self._parameter_sweep is not None:
+                    # the invocations of all the cases of the parameter sweep are launched together
+                    _logger.info("Workflow '%s' (id: %s) running with %r ...",
+                                 workflow.name, workflow.id, self._workflow_test_config.matrix_values)
+                    with spans.span("schedule_workflow"):
+                        outputs, output_history = self._parameter_sweep.get_invocation(self)
+                elif reattached is not None:
+                    # wait for the invocation scheduled by the interrupted run
+                    outputs, output_history = reattached
+                else:
+                    # create a new history for the current test
+                    with spans.span("create_history"):
+                        history = self._create_history()
+
+                    # upload input data to the current history
+                    # and generate the datamap INPUT --> DATASET
+                    datamap = self._upload_inputs(history, uploaded_inputs, base_path)
+
+                    # wait for the Galaxy job queue to accept a new invocation
+                    admission_weight = _count_tool_steps(workflow)
+                    self._galaxy_instance.admission_controller.wait(
+                        timeout=deadline - _time.time() if deadline is not None else None, weight=admission_weight)
+
+                    # run the workflow
+                    _logger.debug("About to launch workflow.")
+                    _logger.debug("history: %r", history)
+                    _logger.debug("datamap: %r", datamap)
+                    _logger.debug("params: %r", params)
+                    _logger.info("Workflow '%s' (id: %s) running ...", workflow.name, workflow.id)
+                    outputs = None
+                    try:
+                        with spans.span("schedule_workflow"):
+                            outputs, output_history = _run_workflow(self._galaxy_instance, workflow, datamap,
+                                                                    history, params=params,
+                                                                    use_cached_job=reuse_cached_jobs)
+                    finally:
+                        # the admission is held until the jobs of the invocation are visible
+                        self._galaxy_instance.admission_controller.release(admission_weight, datasets=outputs)
+                if self._journal is not None and reattached is None:
+                    self._journal.set_scheduled(self.worflow_test_name, workflow.id, output_history.id,
+                                                [o.id for o in outputs], fingerprint=journal_fingerprint)
+                with spans.span("wait_jobs"):
+                    self._wait_for_datasets(outputs, self._galaxy_instance.polling_interval, deadline=deadline)
                 _logger.info("Workflow '%s' (id: %s) executed", workflow.name, workflow.id)
 
                 # check outputs
@@ -569,15 +832,47 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
                 # instantiate the result object
                 test_result = _core.WorkflowTestResult(test_uuid, workflow, inputs, outputs, output_history,
                                                        expected_outputs, missing_tools, results, output_file_map,
-                                                       output_folder)
+                                                       output_folder, spans=spans.spans)
                 if test_result.failed():
                     error_msg = "The actual output{0} {2} differ{1} from the expected one{0}." \
                         .format("" if len(test_result.failed_outputs) == 1 else "s",
                                 "" if len(test_result.failed_outputs) > 1 else "s",
                                 ", ".join(["'{0}'".format(n) for n in test_result.failed_outputs]))
 
+                # check the job metrics against the baseline
+                if self._metrics_baseline is not None or self._workflow_test_config.max_step_runtime is not None \
+                        or reuse_cached_jobs:
+                    self._check_job_metrics(test_result, output_history)
+                    test_result.cached_steps = [step for step, job in _iteritems(test_result.job_metrics)
+                                                if job.get("cached")]
+                    if reuse_cached_jobs:
+                        _logger.info("Workflow steps served by the Galaxy job cache: %s",
+                                     ", ".join(test_result.cached_steps) or "none")
+                performance_errors = []
+                if test_result.metric_regressions \
+                        and self._metrics_baseline is not None and self._metrics_baseline.fail_on_regression:
+                    performance_errors.append("Job metrics exceed the baseline: {0}".format(
+                        "; ".join([str(r) for r in test_result.metric_regressions])))
+
+                # check the performance budgets
+                test_result.budget_violations = self._check_budgets(test_result, test_span.start_time)
+                if test_result.budget_violations:
+                    performance_errors.append("Performance budget exceeded: {0}".format(
+                        "; ".join([str(v) for v in test_result.budget_violations])))
+                for performance_error in performance_errors:
+                    test_result.errors.append(performance_error)
+                    _logger.debug(performance_error)
+                    error_msg = " ".join([error_msg, performance_error]) if error_msg else performance_error
+
             except RuntimeError as e:
-                error_msg = "Runtime error: {0}".format(e.message)
+                if deadline is not None and _time.time() >= deadline:
+                    # the test has been aborted because its wall-time budget expired
+                    budget_violations.append(_metrics.BudgetViolation("max_wall_time", self.worflow_test_name,
+                                                                      _time.time() - test_span.start_time,
+                                                                      max_wall_time))
+                    error_msg = "Performance budget exceeded: {0}".format(budget_violations[-1])
+                else:
+                    error_msg = "Runtime error: {0}".format(e)
                 errors.append(error_msg)
                 _logger.debug(error_msg)
 
@@ -590,7 +885,8 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         # instantiate the result object
         if not test_result:
             test_result = _core.WorkflowTestResult(test_uuid, workflow, inputs, [], None,
-                                                   expected_outputs, missing_tools, {}, {}, output_folder, errors)
+                                                   expected_outputs, missing_tools, {}, {}, output_folder, errors,
+                                                   spans=spans.spans, budget_violations=budget_violations)
 
         # store result
         self._test_cases[test_uuid] = test_result
@@ -601,13 +897,34 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
 
         # cleanup
         if not disable_cleanup:
-            self.cleanup(output_folder)
+            with spans.span("cleanup"):
+                self.cleanup(output_folder)
+        _logger.debug("Timings of workflow test '%s': %r", self.worflow_test_name, spans.spans)
+
+        # remember the fingerprint of passed tests
+        if fingerprint is not None:
+            if test_result.passed():
+                self._result_cache.set_passed(self.worflow_test_name, fingerprint)
+            else:
+                self._result_cache.remove(self.worflow_test_name)
 
         # disable file logger
         if self._file_handler is not None:
             _common.LoggerManager.remove_file_handler(self._file_handler, not disable_cleanup)
             self._file_handler = None
 
+        # trace the whole test
+        test_span.end_time = _time.time()
+        test_result.duration = test_span.duration
+        if error_msg:
+            test_span.attributes["error"] = error_msg
+        _common.Tracer.get_instance().add(test_span)
+
+        # checkpoint the result
+        if self._journal is not None:
+            self._journal.set_completed(self.worflow_test_name, test_result, error_msg,
+                                        fingerprint=journal_fingerprint)
+
         # raise error message
         if error_msg:
             if not disable_assertions:
@@ -615,6 +932,276 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
 
         return test_result
 
+    def _get_fingerprint(self):
+        """
+        Compute the fingerprint of the workflow test (see :func:`wft4galaxy.incremental.fingerprint`).
+
+        :rtype: str
+        :return: the fingerprint; ``None`` if there is no result cache or the fingerprint cannot be computed
+        """
+        if self._result_cache is None:
+            return None
+        try:
+            with self._span_recorder.span("fingerprint"):
+                return _incremental.fingerprint(self._workflow_test_config,
+                                                self._result_cache.get_tool_inventory(self._galaxy_instance),
+                                                metrics_baseline=self._metrics_baseline)
+        except Exception as e:
+            _logger.warning("Unable to compute the fingerprint of workflow test '%s': %s", self.worflow_test_name, e)
+            return None
+
+    def _get_journal_fingerprint(self):
+        """
+        Compute the fingerprint of the configuration of the workflow test which identifies
+        its checkpoints in the journal (i.e., the fingerprint of the test without the installed tools,
+        whose inventory is not required to resume a run).
+
+        :rtype: str
+        :return: the fingerprint; ``None`` if it cannot be computed
+        """
+        try:
+            return _incremental.fingerprint(self._workflow_test_config, {}, metrics_baseline=self._metrics_baseline)
+        except Exception as e:
+            _logger.debug("Unable to compute the fingerprint of workflow test '%s': %s", self.worflow_test_name, e)
+            return None
+
+    def _report_cached_pass(self, fingerprint, test_span, output_folder, disable_assertions):
+        """
+        Report the workflow test as passed without running it, since its last passed run had the same fingerprint.
+        """
+        config = self._workflow_test_config
+        _logger.info("Workflow test '%s' not executed: it already passed with the same fingerprint (%s)",
+                     self.worflow_test_name, fingerprint)
+        test_result = _core.WorkflowTestResult(self.uuid, None, config.inputs, [], None, config.expected_outputs,
+                                               [], {}, {}, output_folder or config.output_folder,
+                                               spans=self._span_recorder.spans)
+        test_result.cached = True
+        self._test_cases[test_result.test_id] = test_result
+        if self._test_suite_runner:
+            self._test_suite_runner._add_test_result(test_result)
+        self.test_result = test_result
+
+        test_span.end_time = _time.time()
+        test_span.attributes["cached"] = True
+        _common.Tracer.get_instance().add(test_span)
+
+        if not disable_assertions:
+            raise _unittest.SkipTest("cached-pass")
+        return test_result
+
+    def _report_resumed_result(self, test_span, output_folder, disable_assertions, fingerprint=None):
+        """
+        Report the result of the workflow test recorded by the interrupted run which is being resumed,
+        without running the test again.
+        """
+        entry = self._journal.get(self.worflow_test_name, fingerprint)
+        test_result = self._journal.get_result(self.worflow_test_name, self.uuid, self._workflow_test_config,
+                                               output_folder, fingerprint=fingerprint)
+        test_result.spans = self._span_recorder.spans
+        _logger.info("Workflow test '%s' not executed: it %s in the interrupted run",
+                     self.worflow_test_name, "passed" if test_result.passed() else "failed")
+        self._test_cases[test_result.test_id] = test_result
+        if self._test_suite_runner:
+            self._test_suite_runner._add_test_result(test_result)
+        self.test_result = test_result
+
+        test_span.end_time = _time.time()
+        test_span.attributes["resumed"] = True
+        _common.Tracer.get_instance().add(test_span)
+
+        if test_result.failed() and not disable_assertions:
+            raise AssertionError(entry.get("error_msg") or "; ".join(test_result.errors) or
+                                 "The actual outputs differ from the expected ones.")
+        return test_result
+
+    def _report_not_attached(self, test_span, output_folder, disable_assertions):
+        """
+        Report the failure of a workflow test whose invocation, scheduled by the interrupted run,
+        cannot be attached to.
+        """
+        config = self._workflow_test_config
+        error_msg = "No invocation of the interrupted run to attach to"
+        test_result = _core.WorkflowTestResult(self.uuid, None, config.inputs, [], None, config.expected_outputs,
+                                               [], {}, {}, output_folder or config.output_folder, [error_msg],
+                                               spans=self._span_recorder.spans)
+        self._test_cases[test_result.test_id] = test_result
+        if self._test_suite_runner:
+            self._test_suite_runner._add_test_result(test_result)
+        self.test_result = test_result
+
+        test_span.end_time = _time.time()
+        test_span.attributes["error"] = error_msg
+        _common.Tracer.get_instance().add(test_span)
+
+        if not disable_assertions:
+            raise AssertionError(error_msg)
+        return test_result
+
+    def _reattach(self, fingerprint=None):
+        """
+        Look up the invocation of the workflow test scheduled by the interrupted run which is being resumed.
+        The workflow of the invocation, if it still exists, becomes the workflow of this runner
+        (and it is deleted by :meth:`cleanup`).
+
+        :rtype: tuple
+        :return: the pair (<OUTPUTS>, <HISTORY>) of the invocation; ``None`` if the run didn't schedule
+            the workflow test (with the same ``fingerprint``) or its history no longer exists
+        """
+        entry = self._journal.get(self.worflow_test_name, fingerprint)
+        if entry is None or entry.get("state") != _journal.RunJournal.SCHEDULED or self._parameter_sweep is not None:
+            return None
+        try:
+            history = self._galaxy_instance.histories.get(entry["history_id"])
+            if history.deleted:
+                raise RuntimeError("the history has been deleted")
+            outputs = [history.get_dataset(dataset_id) for dataset_id in entry["output_ids"]]
+        except Exception as e:
+            _logger.warning("Unable to reattach workflow test '%s' to the history %s: %s",
+                            self.worflow_test_name, entry["history_id"], e)
+            return None
+        try:
+            self._galaxy_workflow = self._galaxy_instance.workflows.get(entry["workflow_id"])
+        except Exception as e:
+            _logger.debug("The workflow %s of the interrupted run is not available: %s", entry["workflow_id"], e)
+        _logger.info("Workflow test '%s' reattached to the history '%s' (id: %s) of the interrupted run",
+                     self.worflow_test_name, history.name, history.id)
+        return outputs, history
+
+    def run_load_test(self, repeat, concurrency=_loadtest.DEFAULT_CONCURRENCY, disable_cleanup=None):
+        """
+        Invoke the workflow of the test ``repeat`` times, at most ``concurrency`` at a time, to measure
+        how the Galaxy server behaves under load. The workflow is imported and the inputs are uploaded once:
+        all the invocations share them (and the history where their outputs are stored).
+        An invocation fails if Galaxy doesn't accept it or if any of its outputs ends in error state;
+        outputs are not compared with the expected ones.
+
+        :type repeat: int
+        :param repeat: the number of invocations
+
+        :type concurrency: int
+        :param concurrency: the max number of concurrent invocations
+
+        :rtype: :class:`wft4galaxy.loadtest.LoadTestResult`
+        :return: throughput, latencies and errors of the invocations
+        """
+        if disable_cleanup is None:
+            disable_cleanup = self._disable_cleanup
+        polling_interval = self._galaxy_instance.polling_interval
+        params = self._workflow_test_config.params
+        spans = self._span_recorder = _common.SpanRecorder(category="loadtest")
+
+        with spans.span("import_workflow"):
+            workflow = self.get_galaxy_workflow()
+        history = None
+        try:
+            with spans.span("check_tools"):
+                missing_tools = self.find_missing_tools()
+            if len(missing_tools) > 0:
+                raise RuntimeError("Some workflow tools are not available in Galaxy: {0}".format(
+                    ", ".join(["{0} (ver. {1})".format(t[0], t[1]) for t in missing_tools])))
+
+            # prepare the inputs shared by all the invocations
+            with spans.span("create_history"):
+                history = self._create_history()
+            inputs, params = self._adapt_to_pruned_workflow(self._workflow_test_config.inputs, params)
+            datamap = self._upload_inputs(history, inputs, self._base_path)
+            with spans.span("wait_inputs"):
+                self._wait_for_datasets([d for datasets in datamap.values() for d in datasets], polling_interval)
+
+            admission_weight = _count_tool_steps(workflow)
+
+            def invoke(index):
+                start_time = _time.time()
+                scheduling = completion = error = None
+                try:
+                    # the admission control is part of the load generator, not of the measured latency
+                    self._galaxy_instance.admission_controller.wait(weight=admission_weight)
+                    start_time = _time.time()
+                    outputs = None
+                    try:
+                        with spans.span("schedule_workflow", key=index):
+                            outputs, output_history = workflow.run(datamap, history, params=params, wait=False)
+                    finally:
+                        self._galaxy_instance.admission_controller.release(admission_weight, datasets=outputs)
+                    scheduling = _time.time() - start_time
+                    with spans.span("wait_jobs", key=index):
+                        self._wait_for_datasets(outputs, polling_interval)
+                    completion = _time.time() - start_time
+                except Exception as e:
+                    error = str(e) or e.__class__.__name__
+                    _logger.debug("Invocation %d of workflow '%s' failed: %s", index, workflow.name, error)
+                return _loadtest.Invocation(index, start_time, scheduling, completion, error)
+
+            _logger.info("Load test of workflow '%s' (id: %s): %d invocations (concurrency: %d) ...",
+                         workflow.name, workflow.id, repeat, concurrency)
+            _common.ConnectionManager.get_instance().ensure_pool_size(concurrency)
+            pool = _ThreadPool(max(1, min(concurrency, repeat)))
+            start_time = _time.time()
+            try:
+                invocations = list(pool.imap_unordered(invoke, range(repeat)))
+            finally:
+                pool.close()
+                pool.join()
+            result = _loadtest.LoadTestResult(self.worflow_test_name, repeat, concurrency,
+                                              invocations, _time.time() - start_time)
+            _logger.info("Load test of workflow '%s' (id: %s): done in %.2fs (errors: %d)",
+                         workflow.name, workflow.id, result.duration, len(result.errors))
+        finally:
+            if not disable_cleanup:
+                with spans.span("cleanup"):
+                    if history is not None:
+                        self._delete_history(history)
+                    self._workflow_loader.unload_workflow(workflow.id)
+                    self._galaxy_workflow = None
+        return result
+
+    def _create_history(self):
+        """
+        Create a new history for the workflow test (or lease one from the history pool, if enabled).
+
+        :rtype: :class:`bioblend.galaxy.objects.wrappers.History`
+        """
+        name = "-".join([_core.WorkflowTestCase.DEFAULT_HISTORY_NAME_PREFIX,
+                         self._workflow_test_config.name.replace(" ", ""), self.uuid])
+        history_pool = self._galaxy_instance.history_pool
+        if history_pool.enabled:
+            history = history_pool.lease(name)
+            _logger.info("Leased the history '%s' (id: %r)", history.name, history.id)
+        else:
+            history = self._galaxy_instance.histories.create(name)
+            _logger.info("Create a history '%s' (id: %r)", history.name, history.id)
+        return history
+
+    def _delete_history(self, history):
+        """
+        Delete a history created by :meth:`_create_history` (or return it to the history pool, if enabled):
+        the deletion is queued to the cleanup queue of the Galaxy instance.
+        """
+        history_pool = self._galaxy_instance.history_pool
+        if history_pool.enabled:
+            history_pool.release(history)
+        else:
+            self._galaxy_instance.cleanup_queue.delete_history(history.id)
+
+    def _upload_inputs(self, history, inputs, base_path):
+        """
+        Upload the input datasets of the workflow test to ``history``.
+
+        :rtype: dict
+        :return: the datamap <INPUT_LABEL>:<LIST_OF_DATASETS>
+        """
+        datamap = {}
+        for label, config in _iteritems(inputs):
+            datamap[label] = []
+            for filename in config["file"]:
+                dataset_filename = filename if _os.path.isabs(filename) else _os.path.join(base_path, filename)
+                with self._span_recorder.span("upload_input", key=label, filename=dataset_filename):
+                    if config["type"]:
+                        datamap[label].append(history.upload_dataset(dataset_filename, file_type=config["type"]))
+                    else:
+                        datamap[label].append(history.upload_dataset(dataset_filename))
+        return datamap
+
     def find_missing_tools(self, workflow=None):
         """
         Find tools required by the workflow to test and not installed on the configured Galaxy server.
@@ -641,6 +1228,84 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         _logger.debug("Checking required tools: DONE")
         return missing_tools
 
+    def _check_job_metrics(self, test_result, history):
+        """
+        Collect the metrics of the jobs of the workflow test, attach them to ``test_result``
+        and compare them with the configured :class:`wft4galaxy.metrics.MetricsBaseline`.
+        """
+        try:
+            with self._span_recorder.span("collect_job_metrics"):
+                # the cases of a parameter sweep share their history: only the jobs of the case are collected
+                output_ids = [o.id for o in test_result.outputs or []] \
+                    if self._parameter_sweep is not None else None
+                job_metrics = _metrics.collect_job_metrics(
+                    self._galaxy_instance, history.id,
+                    exclude_job_ids=self._galaxy_instance.history_pool.get_previous_jobs(history.id),
+                    output_ids=output_ids)
+        except Exception as e:
+            _logger.warning("Unable to collect the job metrics of workflow test '%s': %s", self.worflow_test_name, e)
+            return
+        test_result.job_metrics = job_metrics
+        if self._metrics_baseline is not None:
+            test_result.metric_regressions = self._metrics_baseline.compare(self.worflow_test_name, job_metrics)
+            for regression in test_result.metric_regressions:
+                _logger.warning("Job metric regression: %s", regression)
+            if self._metrics_baseline.update:
+                self._metrics_baseline.set(self.worflow_test_name, job_metrics)
+
+    def _check_budgets(self, test_result, start_time):
+        """
+        Check the performance budgets of the workflow test
+        (i.e., ``max_wall_time``, ``max_step_runtime`` and ``max_output_size``).
+
+        :rtype: list
+        :return: the list of :class:`wft4galaxy.metrics.BudgetViolation`
+        """
+        config = self._workflow_test_config
+        violations = []
+        wall_time = _time.time() - start_time
+        if config.max_wall_time is not None and wall_time > config.max_wall_time:
+            violations.append(_metrics.BudgetViolation("max_wall_time", self.worflow_test_name,
+                                                       wall_time, config.max_wall_time))
+        if config.max_step_runtime is not None:
+            violations.extend(_metrics.check_step_runtimes(config.max_step_runtime, test_result.job_metrics))
+        if config.max_output_size is not None:
+            violations.extend(_metrics.check_output_sizes(config.max_output_size, test_result.output_file_map))
+        return violations
+
+    def _wait_for_datasets(self, datasets, polling_interval, deadline=None):
+        """
+        Wait until the jobs producing the given datasets are terminated.
+
+        :type datasets: list
+        :param datasets: list of :class:`bioblend.galaxy.objects.wrappers.HistoryDatasetAssociation`
+
+        :type polling_interval: float
+        :param polling_interval: seconds between two consecutive checks of the dataset states
+
+        :type deadline: float
+        :param deadline: optional time (seconds since the epoch) after which waiting is aborted with a `RuntimeError`
+
+        :raises RuntimeError: if any dataset is (or ends) in an error state
+        """
+        for dataset in datasets:
+            _check_dataset_state(dataset)
+        pending = [d for d in datasets if d.state in _PENDING_DATASET_STATES]
+        while pending:
+            if deadline is not None:
+                remaining = deadline - _time.time()
+                if remaining <= 0:
+                    raise RuntimeError("Timeout expired while waiting for {0} dataset(s) to be ready"
+                                       .format(len(pending)))
+                _time.sleep(min(polling_interval, remaining))
+            else:
+                _time.sleep(polling_interval)
+            for dataset in list(pending):
+                dataset.refresh()
+                _check_dataset_state(dataset)
+                if dataset.state not in _PENDING_DATASET_STATES:
+                    pending.remove(dataset)
+
     def _check_outputs(self, base_path, actual_outputs, expected_output_map, output_folder):
         """
         Private method responsible for comparing actual to current outputs
@@ -660,12 +1325,14 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         if not _os.path.isdir(output_folder):
             _os.makedirs(output_folder)
 
+        spans = self._span_recorder or _common.SpanRecorder()
         _logger.info("Checking test output: ...")
         for output in actual_outputs:
             if output.name in expected_output_map:
                 _logger.debug("Checking OUTPUT '%s' ...", output.name)
                 output_filename = _os.path.join(output_folder, output.name)
-                with open(output_filename, "wb") as out_file:
+                with open(output_filename, "wb") as out_file, \
+                        spans.span("download_output", key=output.name, dataset_id=output.id):
                     output.download(out_file)
                     output_file_map[output.name] = {"dataset": output, "filename": output_filename}
                     _logger.debug(
@@ -679,7 +1346,9 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
                 if comparator:
                     expected_output_filename = config["file"] if _os.path.isabs(config["file"]) \
                         else _os.path.join(base_path, config["file"])
-                    result = comparator(output_filename, expected_output_filename)
+                    with spans.span("compare_output", key=output.name, category="comparator",
+                                    comparator=comparator_fn or "base_comparator"):
+                        result = comparator(output_filename, expected_output_filename)
                     _logger.debug(
                         "Output '{0}' {1} the expected: dataset '{2}', actual-output '{3}', expected-output '{4}'"
                             .format(output.name, "is equal to" if result else "differs from",
@@ -697,12 +1366,16 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
         """
         _logger.debug("Cleanup of workflow test '%s'...", self._uuid)
         for test_uuid, test_result in _iteritems(self._test_cases):
-            if test_result.output_history:
-                self._galaxy_instance.histories.delete(test_result.output_history.id)
+            if test_result.output_history and self._parameter_sweep is None:
+                self._delete_history(test_result.output_history)
             self.cleanup_output_folder(test_result)
         if self._galaxy_workflow:
-            self._workflow_loader.unload_workflow(self._galaxy_workflow.id)
+            if self._parameter_sweep is None:
+                self._workflow_loader.unload_workflow(self._galaxy_workflow.id)
             self._galaxy_workflow = None
+        if self._parameter_sweep is not None:
+            # the shared workflow and history are removed by the last case of the parameter sweep
+            self._parameter_sweep.release(self)
         _logger.debug("Cleanup of workflow test '%s': DONE", self._uuid)
         if output_folder and _os.path.exists(output_folder):
             _shutil.rmtree(output_folder)
@@ -721,13 +1394,167 @@ class WorkflowTestCaseRunner(_unittest.TestCase):
                     _logger.debug("Deleted output file '%s'.", output_map["filename"])
 
 
+class _ParameterSweep(object):
+    """
+    Resources shared by the cases of a parameter sweep (see :meth:`wft4galaxy.core.WorkflowTestCase.expand_matrix`):
+    the workflow is imported and the inputs are uploaded only once and, when the first case runs,
+    the workflow is invoked concurrently with the params of every case.
+    Each case then waits for and checks its own outputs.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.runners = []
+        self._lock = _threading.RLock()
+        self._workflow = None
+        self._workflow_loader = None
+        self._history = None
+        self._invocations = None
+        self._released = set()
+
+    def add_runner(self, runner):
+        self.runners.append(runner)
+
+    def get_workflow(self, import_workflow):
+        """
+        Return the workflow shared by the cases, imported by calling ``import_workflow`` the first time.
+        """
+        with self._lock:
+            if self._workflow is None:
+                self._workflow = import_workflow()
+            return self._workflow
+
+    def get_invocation(self, runner):
+        """
+        Return the output datasets and the output history of the workflow invocation of the case
+        associated to ``runner``, launching the invocations of all the cases if needed.
+
+        :rtype: tuple
+        """
+        with self._lock:
+            if self._invocations is None:
+                try:
+                    self._invocations = self._invoke_all(runner)
+                except Exception as e:
+                    _logger.debug("Parameter sweep '%s' failed: %s", self.name, e)
+                    error = RuntimeError("Parameter sweep failed: {0}".format(e))
+                    self._invocations = {r.worflow_test_name: error for r in self.runners}
+        result = self._invocations[runner.worflow_test_name]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _invoke_all(self, first_runner):
+        galaxy_instance = first_runner._galaxy_instance
+        self._workflow_loader = first_runner._workflow_loader
+        config = first_runner.workflow_test_config
+        workflow = first_runner.get_galaxy_workflow()
+        if first_runner._span_recorder is None:
+            first_runner._span_recorder = _common.SpanRecorder()
+        with first_runner._span_recorder.span("create_history"):
+            self._history = first_runner._create_history()
+        inputs, _ = first_runner._adapt_to_pruned_workflow(config.inputs, {})
+        datamap = first_runner._upload_inputs(self._history, inputs, config.base_path)
+        for runner in self.runners:
+            # share the imported workflow (the lock is held by the current thread)
+            runner.get_galaxy_workflow()
+
+        admission_weight = _count_tool_steps(workflow)
+
+        def invoke(runner):
+            try:
+                _, params = runner._adapt_to_pruned_workflow({}, runner.workflow_test_config.params)
+                # the cases are admitted as the jobs of the previous ones leave room in the job queue
+                galaxy_instance.admission_controller.wait(weight=admission_weight)
+                outputs = None
+                try:
+                    outputs, history = _run_workflow(
+                        galaxy_instance, workflow, datamap, self._history, params=params,
+                        use_cached_job=bool(runner.workflow_test_config.reuse_cached_jobs))
+                    return runner.worflow_test_name, (outputs, history)
+                finally:
+                    galaxy_instance.admission_controller.release(admission_weight, datasets=outputs)
+            except Exception as e:
+                _logger.debug("Invocation of the case '%s' failed: %s", runner.worflow_test_name, e)
+                return runner.worflow_test_name, RuntimeError("Invocation failed: {0}".format(e))
+
+        _logger.info("Parameter sweep '%s': launching %d invocations of workflow '%s' (id: %s) ...",
+                     self.name, len(self.runners), workflow.name, workflow.id)
+        _common.ConnectionManager.get_instance().ensure_pool_size(len(self.runners))
+        pool = _ThreadPool(max(1, len(self.runners)))
+        try:
+            return dict(pool.map(invoke, self.runners))
+        finally:
+            pool.close()
+            pool.join()
+
+    def release(self, runner):
+        """
+        Release the shared resources on behalf of the case associated to ``runner``:
+        they are removed from Galaxy once all the cases have released them.
+        """
+        with self._lock:
+            self._released.add(runner.worflow_test_name)
+            if len(self._released) < len(self.runners):
+                return
+            if self._history is not None:
+                runner._delete_history(self._history)
+                self._history = None
+            if self._workflow is not None:
+                (self._workflow_loader or runner._workflow_loader).unload_workflow(self._workflow.id)
+                self._workflow = None
+
+
+def _count_tool_steps(workflow):
+    """ Return the number of tool steps of ``workflow`` (at least 1), i.e., the jobs of every invocation. """
+    return max(1, len([s for s in workflow.steps.values() if getattr(s, "type", None) == "tool"]))
+
+
+def _check_dataset_state(dataset):
+    """ Raise a `RuntimeError` if ``dataset`` is in one of the ``_ERROR_DATASET_STATES``. """
+    if dataset.state in _ERROR_DATASET_STATES:
+        raise RuntimeError("Dataset '{0}' (id: {1}) is in '{2}' state".format(dataset.name, dataset.id, dataset.state))
+
+
+def _run_workflow(galaxy_instance, workflow, datamap, history, params=None, use_cached_job=False):
+    """
+    Invoke ``workflow`` on the datasets of ``datamap`` (without waiting for its outputs).
+    If ``use_cached_job`` is ``True``, Galaxy is allowed to reuse the outputs of equivalent jobs.
+
+    :rtype: tuple
+    :return: the list of output datasets and the output history
+    """
+    if not use_cached_job:
+        return workflow.run(datamap, history, params=params, wait=False)
+    # `Workflow.run` doesn't support `use_cached_job`: invoke the workflow through the invocation API
+    gi = galaxy_instance.gi
+    invocation = gi.workflows.invoke_workflow(workflow.id, inputs=workflow.convert_input_map(datamap),
+                                              params=params, history_id=history.id, use_cached_job=True)
+    # the invocation is scheduled asynchronously: its jobs are known once it leaves the `new` state
+    while invocation.get("state") in _PENDING_INVOCATION_STATES:
+        _time.sleep(galaxy_instance.polling_interval)
+        invocation = gi.workflows.show_invocation(workflow.id, invocation["id"])
+    if invocation.get("state") in _FAILED_INVOCATION_STATES:
+        raise RuntimeError("Invocation {0} of workflow '{1}' is in '{2}' state".format(
+            invocation["id"], workflow.name, invocation["state"]))
+    # the outputs of all the steps, like those returned by `Workflow.run`
+    output_ids = []
+    for step in sorted(invocation.get("steps") or [], key=lambda s: s.get("order_index")):
+        if step.get("job_id"):
+            outputs = gi.jobs.show_job(step["job_id"]).get("outputs") or {}
+            output_ids.extend(o["id"] for _, o in sorted(_iteritems(outputs)) if o.get("src", "hda") == "hda")
+    output_history = galaxy_instance.histories.get(invocation.get("history_id") or history.id)
+    return [output_history.get_dataset(dataset_id) for dataset_id in output_ids], output_history
+
+
 class WorkflowTestSuiteRunner(_unittest.TestSuite):
     """
     Represent a test suite.
     """
 
     def __init__(self, galaxy_instance, workflow_loader, suite, filter=None, output_folder=".",
-                 enable_logger=None, enable_debug=None, disable_cleanup=None, disable_assertions=None):
+                 enable_logger=None, enable_debug=None, disable_cleanup=None, disable_assertions=None,
+                 metrics_baseline=None, timing_db=None, shard=None, result_cache=None, journal=None):
 
         """
         Create an instance of :class:`WorkflowTestSuite`.
@@ -748,6 +1575,9 @@ class WorkflowTestSuiteRunner(_unittest.TestSuite):
         self._workflow_runners = []
         self._workflow_test_results = []
         self._galaxy_instance = None
+        self._metrics_baseline = metrics_baseline
+        self._result_cache = result_cache
+        self._journal = journal
 
         # log file handler
         self._file_handler = None
@@ -764,13 +1594,34 @@ class WorkflowTestSuiteRunner(_unittest.TestSuite):
         _update_config(self, output_folder=output_folder, enable_logger=enable_logger, enable_debug=enable_debug,
                        disable_cleanup=disable_cleanup, disable_assertions=disable_assertions)
 
-        for test_config in suite.workflow_tests.values():
+        test_configs = suite.workflow_tests
+        test_names = [name for name in test_configs if not filter or len(filter) == 0 or name in filter]
+        # select the tests of the shard
+        self.shard = shard
+        self.partition_digest = None
+        if shard is not None:
+            durations = _sharding.get_durations(test_names, shard, timing_db=timing_db)
+            self.partition_digest = _sharding.partition_digest(test_names, shard.total, durations)
+            test_names = _sharding.select_shard(test_names, shard, durations=durations)
+            _logger.info("Workflow tests of shard %s: %s", shard, ", ".join(test_names))
+        # schedule the longest tests first
+        if timing_db is not None:
+            test_names = timing_db.order_tests(test_names)
+        _logger.debug("Order of workflow tests: %r", test_names)
+        for test_config in [test_configs[name] for name in test_names]:
             test_config.disable_assertions = False
-            if not filter or len(filter) == 0 or test_config.name in filter:
-                runner = self._create_test_runner(test_config,
+            if test_config.reuse_cached_jobs is None:
+                test_config.reuse_cached_jobs = suite.reuse_cached_jobs
+            if test_config.prune_workflow is None:
+                test_config.prune_workflow = suite.prune_workflow
+            # expand parameter sweeps into one test per combination of parameter values
+            parameter_sweep = _ParameterSweep(test_config.name) if test_config.matrix else None
+            for case_config in test_config.expand_matrix():
+                runner = self._create_test_runner(case_config,
                                                   enable_logger=enable_logger, enable_debug=enable_debug,
                                                   disable_cleanup=disable_cleanup,
-                                                  disable_assertions=disable_assertions)
+                                                  disable_assertions=disable_assertions,
+                                                  parameter_sweep=parameter_sweep)
                 self.addTest(runner)
 
     @property
@@ -806,7 +1657,8 @@ class WorkflowTestSuiteRunner(_unittest.TestSuite):
         self._workflow_test_results.append(test_result)
 
     def _create_test_runner(self, workflow_test_config,
-                            enable_logger=None, enable_debug=None, disable_cleanup=None, disable_assertions=None):
+                            enable_logger=None, enable_debug=None, disable_cleanup=None, disable_assertions=None,
+                            parameter_sweep=None):
         """
         Private method which creates a test runner associated to this suite.
 
@@ -821,7 +1673,9 @@ class WorkflowTestSuiteRunner(_unittest.TestSuite):
                        enable_logger=enable_logger, enable_debug=enable_debug,
                        disable_cleanup=disable_cleanup, disable_assertions=disable_assertions)
         # create a new runner instance
-        runner = WorkflowTestCaseRunner(self.galaxy_instance, self.workflow_loader, workflow_test_config, self)
+        runner = WorkflowTestCaseRunner(self.galaxy_instance, self.workflow_loader, workflow_test_config, self,
+                                        metrics_baseline=self._metrics_baseline, result_cache=self._result_cache,
+                                        parameter_sweep=parameter_sweep, journal=self._journal)
         self._workflow_runners.append(runner)
         return runner
 
@@ -902,19 +1756,22 @@ def _update_config(config, enable_logger=None, output_folder=None,
         config.output = output_folder
 
 
-def cleanup_test_workflows(galaxy_url=None, galaxy_api_key=None):
+def cleanup_test_workflows(galaxy_url=None, galaxy_api_key=None, timeout=_common.CLEANUP_DRAIN_TIMEOUT):
     _logger.debug("Cleaning workflow library ...")
     galaxy_instance = _common.get_galaxy_instance(galaxy_url, galaxy_api_key)
-    workflow_loader = _common.WorkflowLoader.get_instance(galaxy_instance)
     wflist = galaxy_instance.workflows.list()
     workflows = [w for w in wflist if _core.WorkflowTestCase.DEFAULT_WORKFLOW_NAME_PREFIX in w.name]
     for wf in workflows:
-        workflow_loader.unload_workflow(wf.id)
+        galaxy_instance.cleanup_queue.delete_workflow(wf.id)
+    return len(workflows) - len(galaxy_instance.cleanup_queue.drain(timeout))
 
 
-def cleanup_test_workflow_data(galaxy_url=None, galaxy_api_key=None):
+def cleanup_test_workflow_data(galaxy_url=None, galaxy_api_key=None, purge=False,
+                               timeout=_common.CLEANUP_DRAIN_TIMEOUT):
     _logger.debug("Cleaning saved histories ...")
     galaxy_instance = _common.get_galaxy_instance(galaxy_url, galaxy_api_key)
     hslist = galaxy_instance.histories.list()
-    for history in [h for h in hslist if _core.WorkflowTestCase.DEFAULT_HISTORY_NAME_PREFIX in h.name]:
-        galaxy_instance.histories.delete(history.id)
+    histories = [h for h in hslist if _core.WorkflowTestCase.DEFAULT_HISTORY_NAME_PREFIX in h.name]
+    for history in histories:
+        galaxy_instance.cleanup_queue.delete_history(history.id, purge=purge)
+    return len(histories) - len(galaxy_instance.cleanup_queue.drain(timeout))
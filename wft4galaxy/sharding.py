@@ -0,0 +1,221 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import re as _re
+import json as _json
+import hashlib as _hashlib
+from collections import namedtuple as _namedtuple
+from xml.dom.minidom import parse as _parse_xml
+from xml.dom.minidom import Document as _Document
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# attributes of the xUnit `testsuite` elements which are summed up when reports are merged
+_XUNIT_COUNTERS = ("tests", "failures", "errors", "skipped")
+
+# names of the xUnit properties which identify the shard of a report and the partition it belongs to
+SHARD_PROPERTY = "shard"
+PARTITION_DIGEST_PROPERTY = "shard.partition_digest"
+
+
+class Shard(_namedtuple("Shard", ["index", "total", "balanced"])):
+    """
+    A slice of a test suite: the ``index``-th (1-based) of ``total`` disjoint slices.
+    If ``balanced`` is ``True``, tests are distributed according to their historical durations
+    (see :class:`wft4galaxy.timings.TimingDatabase`); otherwise, tests sorted by name are dealt out
+    round-robin.
+    """
+
+    def __new__(cls, index, total, balanced=False):
+        if total < 1 or not 1 <= index <= total:
+            raise ValueError("Invalid shard {0}/{1}".format(index, total))
+        return super(Shard, cls).__new__(cls, index, total, balanced)
+
+    def __str__(self):
+        return "{0}/{1}".format(self.index, self.total)
+
+
+def parse_shard(value, balanced=False):
+    """
+    Parse a shard given as ``INDEX/TOTAL`` (e.g., ``2/4``).
+
+    :rtype: :class:`Shard`
+    """
+    if isinstance(value, Shard):
+        return value
+    m = _re.match(r"^\s*(\d+)\s*/\s*(\d+)\s*$", str(value))
+    if m is None:
+        raise ValueError("Invalid shard '{0}': expected INDEX/TOTAL".format(value))
+    return Shard(int(m.group(1)), int(m.group(2)), balanced)
+
+
+def partition(tests, total, durations=None):
+    """
+    Split ``tests`` into ``total`` disjoint lists. The result depends only on the test names
+    (and on their durations, if given), not on their order.
+
+    :type tests: list
+    :param tests: list of test names
+
+    :type total: int
+    :param total: number of partitions
+
+    :type durations: dict
+    :param durations: optional map <TEST_NAME>:<EXPECTED_DURATION> used to balance the partitions
+        (unknown durations are assumed to be the median of the known ones)
+
+    :rtype: list
+    :return: a list of ``total`` lists of test names
+    """
+    partitions = [[] for _ in range(total)]
+    names = sorted(set(tests))
+    if durations is None:
+        for i, name in enumerate(names):
+            partitions[i % total].append(name)
+        return partitions
+    known = sorted(d for d in (durations.get(n) for n in names) if d is not None)
+    default = known[len(known) // 2] if known else 1.0
+    loads = [0.0] * total
+    # longest processing time first: every test goes to the least loaded partition
+    for name in sorted(names, key=lambda n: (-(durations.get(n) if durations.get(n) is not None else default), n)):
+        i = loads.index(min(loads))
+        partitions[i].append(name)
+        loads[i] += durations.get(name) if durations.get(name) is not None else default
+    _logger.debug("Expected durations of the shards: %r", loads)
+    return partitions
+
+
+def get_durations(tests, shard, timing_db=None):
+    """
+    Return the durations used to partition ``tests`` into the shards of ``shard.total``:
+    ``None`` unless the shard is balanced.
+
+    :type timing_db: :class:`wft4galaxy.timings.TimingDatabase`
+    :param timing_db: the database of test durations, required by balanced shards
+
+    :rtype: dict
+    :return: map <TEST_NAME>:<EXPECTED_DURATION>
+    """
+    shard = parse_shard(shard)
+    if not shard.balanced:
+        return None
+    if timing_db is None:
+        _logger.warning("No timing database available: shard %s cannot be balanced by durations", shard)
+        return None
+    return {t: timing_db.expected_duration(t) for t in tests}
+
+
+def partition_digest(tests, total, durations=None):
+    """
+    Return a digest of the inputs of :func:`partition` (test names, number of partitions and durations):
+    shards whose digests differ may overlap or miss some tests.
+
+    :rtype: str
+    """
+    names = sorted(set(tests))
+    description = [total, names, [durations.get(n) for n in names] if durations is not None else None]
+    return _hashlib.sha256(_json.dumps(description).encode("utf-8")).hexdigest()
+
+
+def select_shard(tests, shard, timing_db=None, durations=None):
+    """
+    Return the tests of ``tests`` which belong to ``shard``, in their original order.
+
+    :type tests: list
+    :param tests: list of test names
+
+    :type shard: :class:`Shard` or str
+    :param shard: the shard (or its ``INDEX/TOTAL`` representation)
+
+    :type timing_db: :class:`wft4galaxy.timings.TimingDatabase`
+    :param timing_db: the database of test durations, required by balanced shards
+
+    :type durations: dict
+    :param durations: the durations returned by :func:`get_durations` (read from ``timing_db`` if not given)
+
+    :rtype: list
+    """
+    shard = parse_shard(shard)
+    if durations is None:
+        durations = get_durations(tests, shard, timing_db)
+    selected = set(partition(tests, shard.total, durations)[shard.index - 1])
+    return [t for t in tests if t in selected]
+
+
+def merge_xunit_reports(filenames, output_filename):
+    """
+    Merge the xUnit reports of several shards into a single report,
+    whose root ``testsuites`` element contains all the ``testsuite`` elements of the merged reports.
+    Reports of shards of different partitions (see :func:`partition_digest`) or reporting
+    the same test more than once are rejected.
+
+    :type filenames: list
+    :param filenames: the paths of the xUnit reports to merge
+
+    :type output_filename: str
+    :param output_filename: the path of the merged report
+
+    :rtype: dict
+    :return: the totals of the merged report (tests, failures, errors, skipped, time)
+    """
+    doc = _Document()
+    root = doc.createElement("testsuites")
+    doc.appendChild(root)
+    totals = dict.fromkeys(_XUNIT_COUNTERS, 0)
+    totals["time"] = 0.0
+    digests = {}
+    testcases = {}
+    for filename in filenames:
+        report = _parse_xml(filename)
+        element = report.documentElement
+        _strip_whitespace(element)
+        suites = [element] if element.tagName == "testsuite" else element.getElementsByTagName("testsuite")
+        for suite in suites:
+            digests.setdefault(_get_suite_property(suite, PARTITION_DIGEST_PROPERTY), filename)
+            if len(digests) > 1:
+                raise ValueError("Reports {0} belong to shards of different partitions".format(
+                    ", ".join(sorted(set(digests.values())))))
+            for testcase in suite.getElementsByTagName("testcase"):
+                key = (testcase.getAttribute("classname"), testcase.getAttribute("name"))
+                if key in testcases:
+                    raise ValueError("Test '{0}' reported by both {1} and {2}".format(
+                        key[1], testcases[key], filename))
+                testcases[key] = filename
+            for counter in _XUNIT_COUNTERS:
+                totals[counter] += int(suite.getAttribute(counter) or 0)
+            totals["time"] += float(suite.getAttribute("time") or 0)
+            root.appendChild(doc.importNode(suite, True))
+    for name, value in _iteritems(totals):
+        root.setAttribute(name, "{0:.3f}".format(value) if name == "time" else str(value))
+    with open(output_filename, "wb") as f:
+        f.write(doc.toprettyxml(indent="\t", encoding="UTF-8"))
+    _logger.debug("Merged %d xUnit reports into %s: %r", len(filenames), output_filename, totals)
+    return totals
+
+
+def _get_suite_property(suite, name):
+    # the properties of the `testsuite` element (not those of its `testcase` elements)
+    for child in suite.childNodes:
+        if child.nodeType == child.ELEMENT_NODE and child.tagName == "properties":
+            for prop in child.getElementsByTagName("property"):
+                if prop.getAttribute("name") == name:
+                    return prop.getAttribute("value")
+    return None
+
+
+def _strip_whitespace(node):
+    # drop the indentation of the parsed reports, which is regenerated when the merged report is written
+    for child in list(node.childNodes):
+        if child.nodeType == child.TEXT_NODE and not child.data.strip():
+            node.removeChild(child)
+        elif child.nodeType == child.ELEMENT_NODE:
+            _strip_whitespace(child)
+
+
+def is_sqlite_file(filename):
+    with open(filename, "rb") as f:
+        return f.read(16) == b"SQLite format 3\x00"
@@ -0,0 +1,207 @@
+from __future__ import print_function
+from future.utils import iteritems as _iteritems
+
+import os as _os
+import time as _time
+import sqlite3 as _sqlite3
+import threading as _threading
+from collections import OrderedDict as _OrderedDict
+
+# wft4galaxy dependencies
+import wft4galaxy.common as _common
+
+# set logger
+_logger = _common.LoggerManager.get_logger(__name__)
+
+# default name of the timing database (relative to the output folder)
+DEFAULT_FILENAME = "wft4galaxy-timings.sqlite"
+
+# default number of recent runs used to estimate the duration of a test
+DEFAULT_HISTORY = 5
+
+
+def _median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+class TimingDatabase(object):
+    """
+    SQLite store of the durations of the workflow tests (with their phase breakdown) measured by every run.
+    It is used to estimate the duration of the next runs (e.g., to schedule longest tests first)
+    and to report trends (see ``wft4galaxy-stats``).
+    """
+
+    def __init__(self, filename, history=DEFAULT_HISTORY):
+        """
+        Create a new instance of this class.
+
+        :type filename: str
+        :param filename: the path of the SQLite database (created if it doesn't exist)
+
+        :type history: int
+        :param history: number of recent runs of a test used to estimate its duration
+        """
+        self.filename = filename
+        self.history = history
+        self._lock = _threading.RLock()
+        _common.makedirs(_os.path.dirname(_os.path.abspath(filename)))
+        self._db = _sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, timestamp REAL, label TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tests ("
+                         "run_id INTEGER, test TEXT, status TEXT, duration REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS phases ("
+                         "run_id INTEGER, test TEXT, phase TEXT, duration REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tests_test ON tests (test, run_id)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS phases_test ON phases (test, run_id)")
+        self._db.commit()
+
+    def record_run(self, test_results, label=None, timestamp=None):
+        """
+        Store the durations of the workflow tests executed by a run.
+
+        :type test_results: dict
+        :param test_results: map <TEST_NAME>:<WorkflowTestResult>
+
+        :type label: str
+        :param label: an optional label of the run (e.g., a commit ID)
+
+        :rtype: int
+        :return: the ID of the run
+        """
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO runs (timestamp, label) VALUES (?, ?)",
+                                      (timestamp or _time.time(), label))
+            run_id = cursor.lastrowid
+            for test, result in _iteritems(test_results):
+                if result is None or result.duration is None:
+                    continue
+                self._db.execute("INSERT INTO tests VALUES (?, ?, ?, ?)",
+                                 (run_id, test, "passed" if result.passed() else "failed", result.duration))
+                phases = _OrderedDict()
+                for span in result.spans:
+                    if span.duration is not None:
+                        phases[span.name] = phases.get(span.name, 0.0) + span.duration
+                self._db.executemany("INSERT INTO phases VALUES (?, ?, ?, ?)",
+                                     [(run_id, test, p, d) for p, d in _iteritems(phases)])
+            self._db.commit()
+        _logger.debug("Timings of run %d stored in %s", run_id, self.filename)
+        return run_id
+
+    def import_runs(self, filename):
+        """
+        Copy into this database the runs recorded in another timing database
+        (e.g., the ones of the shards of a test suite).
+
+        :type filename: str
+        :param filename: the path of the timing database to import
+
+        :rtype: int
+        :return: the number of imported runs
+        """
+        other = _sqlite3.connect(filename)
+        try:
+            runs = other.execute("SELECT id, timestamp, label FROM runs ORDER BY timestamp, id").fetchall()
+            with self._lock:
+                for run_id, timestamp, label in runs:
+                    new_id = self._db.execute("INSERT INTO runs (timestamp, label) VALUES (?, ?)",
+                                              (timestamp, label)).lastrowid
+                    self._db.executemany("INSERT INTO tests VALUES (?, ?, ?, ?)",
+                                         [(new_id,) + r[1:] for r in other.execute(
+                                             "SELECT * FROM tests WHERE run_id = ?", (run_id,)).fetchall()])
+                    self._db.executemany("INSERT INTO phases VALUES (?, ?, ?, ?)",
+                                         [(new_id,) + r[1:] for r in other.execute(
+                                             "SELECT * FROM phases WHERE run_id = ?", (run_id,)).fetchall()])
+                self._db.commit()
+        finally:
+            other.close()
+        return len(runs)
+
+    def get_durations(self, test, limit=None, passed_only=False):
+        """
+        Return the durations of the most recent runs of ``test``, from the oldest to the newest.
+
+        :rtype: list
+        """
+        query = "SELECT duration FROM tests WHERE test = ?" + (" AND status = 'passed'" if passed_only else "") + \
+                " ORDER BY run_id DESC" + (" LIMIT {0:d}".format(limit) if limit else "")
+        with self._lock:
+            return [r[0] for r in reversed(self._db.execute(query, (test,)).fetchall())]
+
+    def expected_duration(self, test):
+        """
+        Estimate the duration of ``test`` as the median of its last passed runs
+        (or of its last runs, if none of them passed).
+
+        :rtype: float
+        :return: the expected duration (in seconds); ``None`` if the test has never been run
+        """
+        return _median(self.get_durations(test, self.history, passed_only=True)) \
+            or _median(self.get_durations(test, self.history))
+
+    def order_tests(self, tests):
+        """
+        Sort ``tests`` by decreasing expected duration (LPT scheduling).
+        Tests without history come first, in their original order, as they may be the longest ones.
+
+        :type tests: list
+        :param tests: list of test names
+
+        :rtype: list
+        """
+        durations = {t: self.expected_duration(t) for t in tests}
+        unknown = [t for t in tests if durations[t] is None]
+        return unknown + sorted([t for t in tests if durations[t] is not None], key=lambda t: -durations[t])
+
+    def get_stats(self, tests=None, limit=None):
+        """
+        Summarize the durations of the recorded tests, from the slowest to the fastest (by expected duration).
+
+        :type tests: list
+        :param tests: optional list of tests to report (default is all)
+
+        :type limit: int
+        :param limit: max number of reported tests
+
+        :rtype: list
+        :return: a list of dictionaries with keys ``test``, ``runs``, ``failures``, ``last``, ``expected``,
+            ``min``, ``max``, ``trend`` (percent change of the last duration with respect to the previous ones),
+            ``recent`` (durations of the last runs) and ``phases`` (median duration of every phase)
+        """
+        with self._lock:
+            names = tests or [r[0] for r in self._db.execute("SELECT DISTINCT test FROM tests").fetchall()]
+        stats = []
+        for test in names:
+            with self._lock:
+                rows = self._db.execute("SELECT COUNT(*), SUM(status != 'passed'), MIN(duration), MAX(duration) "
+                                        "FROM tests WHERE test = ?", (test,)).fetchone()
+                phase_rows = self._db.execute(
+                    "SELECT phase, duration FROM phases WHERE test = ? AND run_id IN "
+                    "(SELECT run_id FROM tests WHERE test = ? ORDER BY run_id DESC LIMIT ?)",
+                    (test, test, self.history)).fetchall()
+            if not rows[0]:
+                continue
+            recent = self.get_durations(test, self.history)
+            previous = _median(recent[:-1])
+            phases = _OrderedDict()
+            for phase, duration in phase_rows:
+                phases.setdefault(phase, []).append(duration)
+            stats.append({"test": test, "runs": rows[0], "failures": rows[1] or 0, "min": rows[2], "max": rows[3],
+                          "last": recent[-1], "expected": self.expected_duration(test), "recent": recent,
+                          "trend": (recent[-1] - previous) * 100.0 / previous if previous else None,
+                          "phases": _OrderedDict((p, _median(d)) for p, d in
+                                                 sorted(_iteritems(phases), key=lambda x: -_median(x[1])))})
+        stats.sort(key=lambda s: -s["expected"])
+        return stats[:limit] if limit else stats
+
+    def close(self):
+        """
+        Close the SQLite database.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -15,8 +15,10 @@ from .common import DynamicObject as _CommentedMap
 
 # BioBlend dependecies
 from bioblend.galaxy.tools import ToolClient as _ToolClient
+from bioblend.galaxy.objects import wrappers as _wrappers
 
 # wft4galaxy dependencies
+import wft4galaxy.core as _core
 import wft4galaxy.common as _common
 
 # set logger
@@ -113,10 +115,9 @@ def _get_workflow_info(filename, galaxy_url, galaxy_api_key, tool_folder=DEFAULT
     if not _os.path.exists(DEFAULT_TOOLS_FOLDER):
         _os.makedirs(DEFAULT_TOOLS_FOLDER)
 
-    with open(filename) as fp:
-        wf_config = _json.load(fp)
+    graph = _core.WorkflowGraph.load(filename)
 
-    for sid, step in _iteritems(wf_config["steps"]):
+    for sid, step in _iteritems(graph.steps):
         # tool = gi.tools.get()
 
         _logger.debug("Processing step '%s' -- '%s'", sid, step["name"])
@@ -180,7 +181,7 @@ def _get_workflow_info(filename, galaxy_url, galaxy_api_key, tool_folder=DEFAULT
     _logger.debug("Workflow definition loaded from %s file...", filename)
 
     # return loaded info
-    return wf_config, inputs, params, outputs
+    return graph.get_definition(), inputs, params, outputs
 
 
 # XXX:  TODO
@@ -266,14 +267,38 @@ def _process_tool_param_element(input_el, tool_params):
 
 
 class History(object):
-    def __init__(self, history_id, galaxy_url=None, galaxy_api_key=None):
+    """
+    Collect the info of a Galaxy history which are needed to extract the workflow
+    executed to generate it (i.e., datasets, jobs and tools).
+
+    :type history_id: str
+    :param history_id: the ID of the history to process
+
+    :type galaxy_instance: :class:`wft4galaxy.common.GalaxyInstance`
+    :param galaxy_instance: an optional Galaxy instance to reuse
+        (a new one is created from ``galaxy_url`` and ``galaxy_api_key`` if not provided)
+
+    :type tool_cache: dict
+    :param tool_cache: an optional dictionary of tools (indexed by tool ID and version) shared among many histories
+
+    :type job_cache: dict
+    :param job_cache: an optional dictionary of jobs (indexed by job ID) shared among many histories
+    """
+
+    def __init__(self, history_id, galaxy_url=None, galaxy_api_key=None,
+                 galaxy_instance=None, tool_cache=None, job_cache=None):
         super(History, self).__init__()
 
         # configure logger
         self._logger = _common.LoggerManager.get_logger(self)
 
         # set the Galaxy instance
-        self._gi = _common.get_galaxy_instance(galaxy_url, galaxy_api_key)
+        self._gi = galaxy_instance if galaxy_instance is not None \
+            else _common.get_galaxy_instance(galaxy_url, galaxy_api_key)
+
+        # shared caches
+        self._job_cache = job_cache if job_cache is not None else {}
+        self._tool_cache = tool_cache if tool_cache is not None else {}
 
         # set wrapped history
         self._logger.info("Loading history %s info", history_id)
@@ -319,9 +344,12 @@ class History(object):
 
     def _get_job(self, job_id):
         if job_id not in self._jobs:
+            if job_id in self._job_cache:
+                self._jobs[job_id] = self._job_cache[job_id]
+                return self._jobs[job_id]
             try:
                 self._logger.debug("Loading job %s info...", job_id)
-                self._jobs[job_id] = self._gi.jobs.get(job_id, full_details=True)
+                self._jobs[job_id] = self._job_cache[job_id] = self._gi.jobs.get(job_id, full_details=True)
                 self._logger.debug("Loading job %s info: done", job_id)
             except ConnectionError as e:
                 raise TestConfigError("Unable to retrieve job info !")
@@ -331,15 +359,31 @@ class History(object):
     def tools(self):
         return self._tools
 
-    def _get_tool(self, tool_id):
-        if not tool_id in self._tools:
+    def _get_tool(self, tool_id, tool_version=None):
+        key = (tool_id, tool_version)
+        if not key in self._tools:
+            if key in self._tool_cache:
+                self._tools[key] = self._tool_cache[key]
+                return self._tools[key]
             try:
-                self._logger.debug("Loading tool %s info...", tool_id)
-                self._tools[tool_id] = self._gi.tools.get(tool_id, io_details=True)
+                self._logger.debug("Loading tool %s (version %s) info...", tool_id, tool_version)
+                self._tools[key] = self._tool_cache[key] = self._load_tool(tool_id, tool_version)
                 self._logger.debug("Loading tool %s info: done", tool_id)
             except ConnectionError as e:
                 raise TestConfigError("Unable to retrieve tool info !")
-        return self._tools[tool_id]
+        return self._tools[key]
+
+    def _load_tool(self, tool_id, tool_version=None):
+        # `ToolClient.show_tool` doesn't support `tool_version`: the details of a given version
+        # of a tool don't change, so they can be kept by the response cache (see `wft4galaxy.cache`)
+        if not tool_version:
+            return self._gi.tools.get(tool_id, io_details=True)
+        response = self._gi.gi.make_get_request("/".join((self._gi.gi.url, "tools", tool_id)),
+                                                params={"io_details": True, "tool_version": tool_version})
+        if response.status_code != 200:
+            raise ConnectionError("Unexpected HTTP status code: {0}".format(response.status_code),
+                                  body=response.text, status_code=response.status_code)
+        return _wrappers.Tool(response.json(), gi=self._gi)
 
     def _process_history(self):
 
@@ -442,7 +486,7 @@ class History(object):
             # compute and set the job level
             self.processing_job_levels[job_id] = self.compute_processing_job_level(job_id)
             # order inputs
-            tool = self._get_tool(job.wrapped["tool_id"])
+            tool = self._get_tool(job.wrapped["tool_id"], job.wrapped.get("tool_version"))
             ordered_names = [x["name"] for x in tool.wrapped["inputs"]]
             for name in ordered_names:
                 if name in job.wrapped["inputs"]:
@@ -545,7 +589,7 @@ class History(object):
             index = len(wf["steps"])
 
             # get the tool related to the current job
-            tool = self._get_tool(job.wrapped["tool_id"])
+            tool = self._get_tool(job.wrapped["tool_id"], job.wrapped.get("tool_version"))
 
             # compute params
             params = {"__page__": 0, "__rerun_remap_job_id__": None}